@@ -0,0 +1,210 @@
+'''
+Catalog of the challenges in divide21x/challenges, indexed by the features stratified analyses filter on, so they can
+be queried without opening any challenge file:
+
+    date:           'YYYY-MM-DD'
+    idx:            index of the challenge in the set of the date (0 for the challenge of the day)
+    path:           challenge file, relative to the challenges dir ('<year-month>/<day>.json', '<day>_<idx>.json')
+    content_hash:   sha256 of the challenge file
+    static_digits:  digits of the static number of the challenge state
+    digits:         digits of the dynamic number of the challenge state
+    players:        number of players of the challenge state
+    action_type:    'division' or 'digit_change'
+    division:       'good' (the dynamic number is divisible by the digit), 'bad', or None for digit changes
+
+ChallengeMaker records every challenge it writes; rebuild() indexes the ones written before the catalog existed. The
+catalog file is not committed: a new one (e.g. in a fresh checkout) is filled from the challenge files when opened.
+
+    python -m divide21x.challenge_maker.challenge_catalog --division bad --min-digits 10 --min-players 5
+'''
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+from divide21x.simulator.transition_kernel import parse_action
+from divide21x.utils.digits import allow_huge_ints, number_length
+from divide21x.utils.util import YEAR_MONTH, parse_challenge_file_name
+
+
+CATALOG_NAME = 'catalog.sqlite'
+# action types
+DIVISION = 'division'
+DIGIT_CHANGE = 'digit_change'
+# division kinds
+GOOD = 'good'
+BAD = 'bad'
+COLUMNS = ("date", "idx", "path", "content_hash", "static_digits", "digits", "players", "action_type", "division")
+
+
+def challenge_features(challenge):
+    '''
+    difficulty features of a challenge dictionary (as written by ChallengeMaker)
+    '''
+    state = challenge["challenge"]["z"]
+    division, digit, rindex = parse_action(challenge["challenge"]["a"])
+    kind = None
+    if division:
+        kind = GOOD if digit not in (None, 0) and state["d"] % digit == 0 else BAD
+    return {
+        "static_digits": number_length(state["s"]),
+        "digits": number_length(state["d"]),
+        "players": len(state["p"]),
+        "action_type": DIVISION if division else DIGIT_CHANGE,
+        "division": kind
+    }
+
+
+class ChallengeCatalog:
+    '''
+    SQLite catalog of challenges. One connection per instance; writers from several processes wait on each other.
+
+    Args:
+        challenges_dir (str): challenges dir the catalog indexes (the catalog file lives in it).
+    '''
+    def __init__(self, challenges_dir):
+        self.challenges_dir = challenges_dir
+        self.db_path = os.path.join(challenges_dir, CATALOG_NAME)
+        os.makedirs(challenges_dir, exist_ok=True)
+        # default (rollback) journal, so no -wal/-shm files next to it in the challenges dir
+        self.connection = sqlite3.connect(self.db_path, timeout=30)
+        columns = [row[1] for row in self.connection.execute("PRAGMA table_info(challenges)")]
+        # new catalogs, and catalogs from before challenge sets, are (re-)indexed from the files
+        outdated = bool(columns) and tuple(columns) != COLUMNS
+        if outdated:
+            self.connection.execute("DROP TABLE challenges")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS challenges ("
+            "date TEXT NOT NULL, idx INTEGER NOT NULL, path TEXT NOT NULL, content_hash TEXT NOT NULL, static_digits INTEGER NOT NULL, "
+            "digits INTEGER NOT NULL, players INTEGER NOT NULL, action_type TEXT NOT NULL, division TEXT, "
+            "PRIMARY KEY (date, idx))"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS challenges_features ON challenges (action_type, division, digits, players)")
+        self.connection.commit()
+        if outdated or not columns:
+            self.rebuild()
+
+    def record(self, date, index, path, content, challenge):
+        '''
+        adds (or replaces) challenge index of the set of the date.
+
+        Args:
+            path (str): challenge file, relative to the challenges dir.
+            content (bytes|str): the challenge file as written, for the content hash.
+            challenge (dict): the challenge dictionary, for the features.
+        '''
+        if isinstance(content, str):
+            content = content.encode()
+        features = challenge_features(challenge)
+        row = {"date": date, "idx": index, "path": path, "content_hash": hashlib.sha256(content).hexdigest(), **features}
+        self.connection.execute(
+            f"INSERT OR REPLACE INTO challenges ({', '.join(COLUMNS)}) VALUES ({', '.join('?'*len(COLUMNS))})",
+            tuple(row[column] for column in COLUMNS)
+        )
+        self.connection.commit()
+        return row
+
+    def get(self, date, index=0):
+        '''
+        Returns:
+            dict|None: the catalog row of challenge index of the date, or None if there is no such challenge.
+        '''
+        rows = self._select("date = ? AND idx = ?", [str(date), index])
+        return rows[0] if rows else None
+
+    def query(self, action_type=None, division=None, min_digits=None, max_digits=None, min_players=None,
+              max_players=None, start_date=None, end_date=None):
+        '''
+        catalog rows matching every given filter (bounds included), by date and index.
+            e.g. query(division='bad', min_digits=10, min_players=5)
+
+        Returns:
+            list[dict]
+        '''
+        conditions = []
+        parameters = []
+        for column, operator, value in (
+            ("action_type", "=", action_type),
+            ("division", "=", division),
+            ("digits", ">=", min_digits),
+            ("digits", "<=", max_digits),
+            ("players", ">=", min_players),
+            ("players", "<=", max_players),
+            ("date", ">=", start_date),
+            ("date", "<=", end_date),
+        ):
+            if value is not None:
+                conditions.append(f"{column} {operator} ?")
+                parameters.append(str(value) if column == "date" else value)
+        return self._select(" AND ".join(conditions) or "1", parameters)
+
+    def _select(self, where, parameters):
+        cursor = self.connection.execute(f"SELECT {', '.join(COLUMNS)} FROM challenges WHERE {where} ORDER BY date, idx", parameters)
+        return [dict(zip(COLUMNS, row)) for row in cursor.fetchall()]
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM challenges").fetchone()[0]
+
+    def rebuild(self):
+        '''
+        re-indexes every challenge file in the challenges dir (the only operation that opens them), dropping rows
+        whose file is gone.
+
+        Returns:
+            int: number of challenges indexed.
+        '''
+        self.connection.execute("DELETE FROM challenges")
+        self.connection.commit()
+        count = 0
+        for year_month in sorted(os.listdir(self.challenges_dir)):
+            month_dir = os.path.join(self.challenges_dir, year_month)
+            # only the <year-month> dirs (not e.g. the challenge store)
+            if not YEAR_MONTH.fullmatch(year_month) or not os.path.isdir(month_dir):
+                continue
+            for name in sorted(os.listdir(month_dir)):
+                parsed = parse_challenge_file_name(name)
+                if parsed is None:
+                    continue
+                day, index = parsed
+                with open(os.path.join(month_dir, name), 'rb') as f:
+                    content = f.read()
+                with allow_huge_ints():
+                    challenge = json.loads(content)
+                self.record(f"{year_month}-{day:02d}", index, f"{year_month}/{name}", content, challenge)
+                count += 1
+        return count
+
+    def close(self):
+        self.connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the Divide21x challenge catalog.")
+    parser.add_argument("--challenges-dir", default='./divide21x/challenges')
+    parser.add_argument("--rebuild", action="store_true", help="re-index every challenge file first")
+    parser.add_argument("--action-type", choices=[DIVISION, DIGIT_CHANGE])
+    parser.add_argument("--division", choices=[GOOD, BAD])
+    parser.add_argument("--min-digits", type=int)
+    parser.add_argument("--max-digits", type=int)
+    parser.add_argument("--min-players", type=int)
+    parser.add_argument("--max-players", type=int)
+    parser.add_argument("--start-date")
+    parser.add_argument("--end-date")
+    args = parser.parse_args()
+
+    catalog = ChallengeCatalog(args.challenges_dir)
+    try:
+        if args.rebuild:
+            print(f"indexed {catalog.rebuild()} challenges")
+        rows = catalog.query(
+            action_type=args.action_type, division=args.division, min_digits=args.min_digits, max_digits=args.max_digits,
+            min_players=args.min_players, max_players=args.max_players, start_date=args.start_date, end_date=args.end_date
+        )
+    finally:
+        catalog.close()
+    for row in rows:
+        print(json.dumps(row))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,19 @@
+import argparse
 import json
 import os
 import datetime, hashlib, random
-from divide21x.simulator.divide21env_simulator import Divide21EnvSimulator
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+from divide21x.challenge_maker.challenge_catalog import ChallengeCatalog
+from divide21x.challenge_maker.challenge_store import ChallengeStore
+from divide21x.challenge_maker.duplicate_index import DuplicateIndex
+from divide21x.challenge_maker.state_synthesizer import rollout_state, synthesize_state
+from divide21x.simulator.simulator_pool import get_simulator_pool
+from divide21x.simulator.transition_kernel import apply_action
+from divide21x.utils.digits import number_length
 from divide21x.utils.logger import EpisodeLogger
-from divide21x.utils.util import get_utc_date, get_utc_datetime, get_utc_day, get_utc_hour
+from divide21x.utils.util import get_challenge_file_name, get_challenge_id, get_challenges_per_day, get_utc_date, get_utc_datetime, get_utc_day, get_utc_hour
 
 
 BASE_DIR='./divide21x/challenge_maker/logs'
@@ -18,10 +28,38 @@ WARNING = 'warning'
 NOTE = 'note'
 ID = 'id'
 HASH = 'hash'
+REJECTED = 'rejected'
+# challenge state generators
+ROLLOUT = 'rollout'
+SYNTHESIS = 'synthesis'
+# redraws of a challenge that repeats an earlier one, before keeping it anyway
+MAX_ATTEMPTS = 100
 
 
 class ChallengeMaker():
-    def __init__(self):
+    '''
+    Args:
+        generator (str): how the challenge state is drawn: ROLLOUT (the daily benchmark) plays a random game of up to
+            100 actions and picks one of its states; SYNTHESIS builds a state directly in O(digits + players)
+            (see state_synthesizer.py), with the shape below.
+        digits (int|None): SYNTHESIS only, digits of the static number (day of the month + 1 if None).
+        players (int|None): SYNTHESIS only, number of players (drawn between 2 and digits if None).
+        rollout_steps (int): SYNTHESIS only, random actions to play from the synthesized state (a state of that game
+            is then drawn by reservoir sampling); 0 keeps the synthesized state.
+        reject_duplicates (bool): redraw a challenge that is a duplicate or near-duplicate of an earlier one (see
+            duplicate_index.py), from the seed of (id, attempt).
+    '''
+    def __init__(self, generator=ROLLOUT, digits=None, players=None, rollout_steps=0, reject_duplicates=True):
+        if generator not in (ROLLOUT, SYNTHESIS):
+            raise ValueError(f"Unknown challenge generator '{generator}'.")
+        if generator == ROLLOUT and (digits is not None or players is not None or rollout_steps):
+            raise ValueError("The shape of rollout challenges is set by their date.")
+        self.generator = generator
+        self.digits = digits
+        self.players = players
+        self.rollout_steps = rollout_steps
+        self.reject_duplicates = reject_duplicates
+
         # Challenge example 1: digit change
         self.digit_change_example_1_state_1 = {
             "s": 43,
@@ -120,46 +158,122 @@ class ChallengeMaker():
     def get_action(self):
         return self.action
 
-    def make_challenge(self):
+    def make_challenge(self, date=None, index=0):
         """
         Returns the Divide21x challenge of the day.
+
+        Args:
+            date (str|datetime.date|None): day to make the challenge for ('YYYY-MM-DD'), today (UTC) if None.
+                The challenge depends only on the date, so any day can be (re)made at any time.
+            index (int): which challenge of the set of the day (see make_challenges); 0 is the challenge of the day.
         """
+        self._make_challenge(date, index)
+        # log
+        if self.logger.info not in self.logger.episode_log:
+            self.logger.episode_log.append(self.logger.info)
+            
+        self.logger.save_episode()
+
+    def _make_challenge(self, date=None, index=0, candidate=None):
+        '''
+        makes and writes challenge index of the set of the date, and records what happened in self.logger.info
+        (without saving it). candidate is its first draw, (state, action), if it was drawn beforehand.
+        '''
         # Use timezone-aware UTC datetime
-        date = str(get_utc_date())
+        date = str(get_utc_date()) if date is None else _parse_date(date).isoformat()
         year_month = date[:7]
-        day = get_utc_day()
-        day_after = int(day) + 1 # i use day after becuase when i set it to digits it keeps it from being 1, for the first day of the month!
+        day = int(date[8:])
+        challenge_id = get_challenge_id(date, index)
         
         # place challenge in the challenges dir
         challenge_path = os.path.join(CHALLENGES_DIR, year_month)
         os.makedirs(challenge_path, exist_ok=True)
-        challenge_name = str(day) + '.json'
+        challenge_name = get_challenge_file_name(date, index)
         challenge_file = os.path.join(challenge_path, challenge_name)
-        challenge_name_tmp = challenge_name + '.tmp'
+        # unique per process, so concurrent makers of the same day never write into each other's file
+        challenge_name_tmp = f"{challenge_name}.{os.getpid()}.tmp"
         challenge_file_tmp = os.path.join(challenge_path, challenge_name_tmp)
         
         # check if challenge already exists
         if os.path.isfile(challenge_file):
-            message = "Challenge for today has already been created."
+            message = f"Challenge [{challenge_id}] has already been created."
             self.logger.add_info(CHALLENGE, WARNING, message)
-            # log
-            if self.logger.info not in self.logger.episode_log:
-                self.logger.episode_log.append(self.logger.info)
-                
-            self.logger.save_episode()
             return
 
-        # Create a deterministic seed based on the string
-        seed = int(hashlib.sha256(date.encode()).hexdigest(), 16) % (10**8)
-        random.seed(seed)
+        # the first draw is seeded from the challenge id (the date, for the challenge of the day)
+        self.state, self.action = candidate or self._draw_challenge(day, _challenge_seed(challenge_id))
+        duplicate_index = DuplicateIndex(CHALLENGES_DIR) if self.reject_duplicates else None
+        if duplicate_index is not None:
+            # redraw while the challenge repeats one made before it (by date and index, so the challenge of a date
+            #   does not depend on when it is made)
+            for attempt in range(1, MAX_ATTEMPTS + 1):
+                match = duplicate_index.find(self.state, self.action, before=(date, index))
+                if match is None:
+                    break
+                kind, earlier_id, similarity = match
+                message = f"Challenge [{challenge_id}] draw {attempt} is a {kind} of [{earlier_id}] ({similarity:.2f}), redrawing."
+                self.logger.add_info(CHALLENGE, REJECTED, message)
+                if attempt == MAX_ATTEMPTS:
+                    message = f"Challenge [{challenge_id}] still repeats an earlier one after {MAX_ATTEMPTS} draws, keeping it."
+                    self.logger.add_info(CHALLENGE, CRITICAL, message)
+                    break
+                self.state, self.action = self._draw_challenge(day, _challenge_seed(challenge_id, attempt))
+        
+        # store it (the examples are kept once, the challenge under the canonical hash of its z and a), then make
+        #   the challenge file, a view derived from the store
+        #   (numbers past Python's int <-> str digit limit are written in full)
+        challenge_store = ChallengeStore(CHALLENGES_DIR)
+        self.challenge_id = challenge_id
+        self.challenge_hash = challenge_store.put(challenge_id, self.state, self.action, self._build_examples())
+        # the ground truth o, computed once and sealed apart from what models are sent
+        challenge_store.put_answer(date, index)
+        content = challenge_store.render(self.challenge_hash)
+        with open(challenge_file_tmp, 'w') as tmp_file:
+            tmp_file.write(content)
+        os.replace(challenge_file_tmp, challenge_file)
+        # index it in the challenge catalog and the duplicate index
+        catalog = ChallengeCatalog(CHALLENGES_DIR)
+        try:
+            catalog.record(date, index, f"{year_month}/{challenge_name}", content, challenge_store.load(self.challenge_hash))
+        finally:
+            catalog.close()
+        if duplicate_index is not None:
+            duplicate_index.add(date, index, self.state, self.action)
+            duplicate_index.close()
+        
+        message = f"Challenge [{challenge_id}] has been created."
+        self.logger.add_info(CHALLENGE, NOTE, message)
+        self.logger.add_info(CHALLENGE, ID, self.challenge_id)
+        self.logger.add_info(CHALLENGE, HASH, self.challenge_hash)
+        self.logger.add_info(CHALLENGE, STATE, self.state)
+        self.logger.add_info(CHALLENGE, ACTION, self.action)
+
+    def _draw_challenge(self, day, seed):
+        '''
+        draws the state and action of a challenge of the given day of the month from the seed, with the generator
+        '''
+        if self.generator == ROLLOUT:
+            # the base env draws from the global random module, so seed it for this date only and put it back afterwards
+            with _seeded_random(seed):
+                return self._draw_rollout_challenge(day, seed)
+        return self._draw_synthesized_challenge(day, seed)
+
+    def _draw_rollout_challenge(self, day, seed):
+        '''
+        draws the state and action of the challenge of the given day of the month from the (already seeded) global
+        random module, by playing a random game
+        '''
+        day_after = day + 1 # i use day after becuase when i set it to digits it keeps it from being 1, for the first day of the month!
 
         #   get player number between 2 and day_after
         players = random.randint(2, day_after)
         #   set state
-        divide21env_simulator = Divide21EnvSimulator(digits=day_after, players=players)
-        obs, info = divide21env_simulator.reset(seed=seed)
+        with get_simulator_pool().checkout(digits=day_after, players=players) as divide21env_simulator:
+            obs, info = divide21env_simulator.reset(seed=seed)
+            obs = divide21env_simulator._decode_state(obs)
         
         #   play for at least 100 actions - this prevents the initial state from always being given
+        #       (the transitions go through the transition kernel, which works directly on the decoded state)
         state_collection = []
         for i in range(100):
             # create action
@@ -170,36 +284,38 @@ class ChallengeMaker():
                 "r": int(random.randint(0, day_after-1)) if not division else None
             }
             # apply action
-            obs, reward, done, trunc, info = divide21env_simulator.step(action)
-            obs = divide21env_simulator._decode_state(obs)
+            obs, reward, done = apply_action(obs, action)
             state_collection.append(obs)
             # update day_after
-            day_after = len(str(obs["d"]))
-            if done or trunc:
+            day_after = number_length(obs["d"])
+            if done:
                 # do not append the final state
                 state_collection.pop()
                 break
             
         selected = random.randint(0, len(state_collection)-1)
-        self.state = state_collection[selected]
+        state = state_collection[selected]
         #   set action
-        division = bool(random.randint(0, 1))
-        rindex = int(random.randint(0, day_after-1)) if not division else None
-        digit = None
-        if division:
-            digit = int(random.randint(2, 9))
-        else:
-            available_digits_list = self.state["a"][rindex]
-            digit = available_digits_list[random.randint(0, len(available_digits_list)-1)]
-        
-        self.action = {
-            "v": division,
-            "g": digit,
-            "r": rindex
-        }
-        
-        # build the challenge dict
-        # (1) examples
+        return state, _draw_action(random, state, day_after)
+
+    def _draw_synthesized_challenge(self, day, seed):
+        '''
+        draws the state and action of the challenge of the given day of the month from its own random.Random(seed),
+        building the state directly (see state_synthesizer.py) with the targeted shape
+        '''
+        rng = random.Random(seed)
+        static_digits = self.digits if self.digits is not None else day + 1
+        players = self.players if self.players is not None else rng.randint(2, static_digits)
+        state = synthesize_state(rng, static_digits, players)
+        if self.rollout_steps:
+            # a state reached by actual play from the synthesized one, if the game goes on after the first action
+            state = rollout_state(rng, state, self.rollout_steps) or state
+        return state, _draw_action(rng, state, number_length(state["d"]))
+
+    def _build_examples(self):
+        '''
+        the solved examples shared by every challenge
+        '''
         challenge = {}
         challenge["example_1"] = {
             "z": self.digit_change_example_1_state_1,
@@ -221,34 +337,129 @@ class ChallengeMaker():
             "a": self.bad_division_example_action,
             "o": self.bad_division_example_state_2,
         }
-        # (2) challenge
-        challenge["challenge"] = {
-            "z": self.state,
-            "a": self.action
-        }
-        # make the challenge file
-        with open(challenge_file_tmp, 'w') as tmp_file:
-            json.dump(challenge, tmp_file, indent=4)
-        os.rename(challenge_file_tmp, challenge_file)
-        
-        # log a unique challenge ID and hash
-        self.challenge_id = date
-        to_hash = self.challenge_id + str(challenge)
-        self.challenge_hash = hashlib.sha256(to_hash.encode()).hexdigest()
-        
-        message = f"Challenge for today [{date}] has been created."
-        self.logger.add_info(CHALLENGE, NOTE, message)
-        self.logger.add_info(CHALLENGE, ID, self.challenge_id)
-        self.logger.add_info(CHALLENGE, HASH, self.challenge_hash)
-        self.logger.add_info(CHALLENGE, STATE, self.state)
-        self.logger.add_info(CHALLENGE, ACTION, self.action)
-        
-        # log
-        if self.logger.info not in self.logger.episode_log:
-            self.logger.episode_log.append(self.logger.info)
-            
-        self.logger.save_episode()
+        return challenge
+
+
+def _draw_action(rng, state, digits):
+    '''
+    random challenge action for the state: a division by 2-9, or a change to one of the available digits of a rindex
+    below digits
+    '''
+    division = bool(rng.randint(0, 1))
+    rindex = int(rng.randint(0, digits-1)) if not division else None
+    digit = None
+    if division:
+        digit = int(rng.randint(2, 9))
+    else:
+        available_digits_list = state["a"][rindex]
+        digit = available_digits_list[rng.randint(0, len(available_digits_list)-1)]
+    
+    return {
+        "v": division,
+        "g": digit,
+        "r": rindex
+    }
+
+
+def _challenge_seed(challenge_id, attempt=0):
+    '''
+    deterministic seed of a draw of the challenge with the id: its first draw is seeded from the id alone (the date,
+    for the challenge of the day), redraws from the id and the attempt
+    '''
+    seed_string = challenge_id if attempt == 0 else f"{challenge_id}/{attempt}"
+    return int(hashlib.sha256(seed_string.encode()).hexdigest(), 16) % (10**8)
+
+
+def _parse_date(date):
+    if isinstance(date, datetime.datetime):
+        return date.date()
+    if isinstance(date, datetime.date):
+        return date
+    return datetime.date.fromisoformat(str(date))
+
+
+@contextmanager
+def _seeded_random(seed):
+    '''
+    seeds the global random module inside the block and restores its previous state afterwards
+    '''
+    state = random.getstate()
+    random.seed(seed)
+    try:
+        yield
+    finally:
+        random.setstate(state)
+
+
+def _draw_challenge_of_date(task, **kwargs):
+    '''
+    process pool task: the first draw of one challenge, (date, index), or None if it already exists
+    '''
+    date, index = task
+    if os.path.isfile(os.path.join(CHALLENGES_DIR, date[:7], get_challenge_file_name(date, index))):
+        return None
+    return ChallengeMaker(**kwargs)._draw_challenge(int(date[8:]), _challenge_seed(get_challenge_id(date, index)))
+
+
+def make_challenges(start_date, end_date, workers=None, size=None, **kwargs):
+    '''
+    makes the set of challenges of every date from start_date to end_date (both included, 'YYYY-MM-DD' or
+    datetime.date), identical to the ones make_challenge() makes on each of those days; challenges that already
+    exist are skipped.
+
+    Args:
+        workers (int|None): processes to spread the challenges over (os.cpu_count() if None); 1 runs them in this
+            process.
+        size (int|None): challenges per day, each seeded from (date, index); get_challenges_per_day() if None.
+        **kwargs: passed on to ChallengeMaker (e.g. generator=SYNTHESIS).
+
+    Returns:
+        list[str]: the dates, in order.
+    '''
+    start_date, end_date = _parse_date(start_date), _parse_date(end_date)
+    if end_date < start_date:
+        raise ValueError("end_date must not be before start_date.")
+    dates = [(start_date + datetime.timedelta(days=n)).isoformat() for n in range((end_date - start_date).days + 1)]
+    size = get_challenges_per_day() if size is None else size
+    tasks = [(date, index) for date in dates for index in range(size)]
+    workers = workers or os.cpu_count() or 1
+    # the draws (the costly part) are spread over the workers; the challenges are then checked for duplicates and
+    #   written in order by this process, so each one is checked against every challenge before it
+    if workers == 1 or len(tasks) == 1:
+        candidates = [_draw_challenge_of_date(task, **kwargs) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as executor:
+            candidates = list(executor.map(partial(_draw_challenge_of_date, **kwargs), tasks, chunksize=max(1, len(tasks) // (4*workers))))
+    infos = []
+    for (date, index), candidate in zip(tasks, candidates):
+        challenge_maker = ChallengeMaker(**kwargs)
+        challenge_maker._make_challenge(date, index, candidate)
+        infos.append(challenge_maker.logger.info)
+    # one episode log for the whole range, written by this process only
+    logger = EpisodeLogger(BASE_DIR)
+    logger.episode_log.extend(infos)
+    logger.save_episode()
+    return dates
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Make the Divide21x challenges of today, or of every day in a date range.")
+    parser.add_argument("--start", help="first date (YYYY-MM-DD) of the range")
+    parser.add_argument("--end", help="last date (YYYY-MM-DD) of the range, the start date if omitted")
+    parser.add_argument("--workers", type=int, default=None, help="processes to use (default: all cores)")
+    parser.add_argument("--size", type=int, default=None, help="challenges per day (default: DIVIDE21X_CHALLENGES_PER_DAY, or 1)")
+    parser.add_argument("--generator", choices=[ROLLOUT, SYNTHESIS], default=ROLLOUT)
+    parser.add_argument("--digits", type=int, default=None, help="synthesis only: digits of the static number")
+    parser.add_argument("--players", type=int, default=None, help="synthesis only: number of players")
+    parser.add_argument("--rollout-steps", type=int, default=0, help="synthesis only: random actions to play from the synthesized state")
+    parser.add_argument("--allow-duplicates", action="store_true", help="keep challenges that repeat an earlier one")
+    args = parser.parse_args()
+
+    kwargs = {"generator": args.generator, "digits": args.digits, "players": args.players, "rollout_steps": args.rollout_steps,
+              "reject_duplicates": not args.allow_duplicates}
+    start = args.start or str(get_utc_date())
+    make_challenges(start, args.end or start, workers=args.workers, size=args.size, **kwargs)
+
 
 if __name__ == "__main__":
-    challenge_maker = ChallengeMaker()
-    challenge_maker.make_challenge()
\ No newline at end of file
+    main()
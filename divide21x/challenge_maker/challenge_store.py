@@ -0,0 +1,398 @@
+'''
+Content-addressed store of challenges, in <challenges dir>/store:
+
+    examples/<key>.json         the solved examples shared by the challenges, stored once (compact JSON)
+    objects/<k[:2]>/<key>.bin   one compact record per distinct challenge (z, a), named after its key
+    refs/<challenge id>         key of the challenge with that id ('YYYY-MM-DD', or 'YYYY-MM-DD_<index>' in a set)
+and, next to the challenge files, in <challenges dir>/<year-month>:
+    <day>[_<index>].answer      sealed ground truth (o) of the challenge, computed once when it is made; only the
+                                grading side reads it, it is never part of what models are sent
+
+The key of a challenge is the sha256 of the canonical encoding of its z (the packed state bytes, see
+divide21x/simulator/state_codec.py) and a, so it does not depend on key types, list order or JSON formatting, and
+the same challenge made on two dates is stored once. It is a content address of the record rather than a fingerprint
+(divide21x/simulator/fingerprint.py): the order of the players is kept, since the record gives z back as it was made,
+and the 32 bytes of the sha256 are what the answer records are checked against.
+
+A record is
+    MAGIC, version (1 byte), examples key (32 bytes), action (int64 v, g, r; r = -1 for None), packed z bytes
+and loading one (for prompting or grading) is a single small read. The <year-month>/<day>.json files are a view
+derived from the store (render()), byte for byte what ChallengeMaker has always written.
+
+The store is generated data and is not committed: the challenge files and their answers are. A checkout without it
+reads the challenges from their files and their ground truth from the sealed answers, so grading and regrading never
+simulate (load_challenge(), load_answer(), and load_ground_truth_state() in divide21x/evaluation/evaluator.py, which
+only falls back to the transition kernel for a challenge without an answer); --import-json rebuilds the store from
+the files, and --seal seals the challenges that have no answer yet.
+
+An answer record is
+    ANSWER_MAGIC, version (1 byte), challenge key (32 bytes), sha256 of the packed o (32 bytes), packed o bytes
+and is checked against both hashes (the challenge key from the store, or from the challenge file) whenever it is read.
+
+    python -m divide21x.challenge_maker.challenge_store --import-json      (challenge files made before the store)
+    python -m divide21x.challenge_maker.challenge_store --seal             (challenges made before their answers)
+'''
+import argparse
+import hashlib
+import json
+import os
+from functools import lru_cache
+import numpy as np
+from divide21x.simulator.state_codec import PackedState
+from divide21x.simulator.transition_kernel import apply_action
+from divide21x.utils.digits import allow_huge_ints
+from divide21x.utils.util import YEAR_MONTH, get_challenge_file_name, get_challenge_id, parse_challenge_file_name
+
+
+STORE_NAME = 'store'
+ANSWER_SUFFIX = '.answer'
+MAGIC = b'D21C'
+ANSWER_MAGIC = b'D21O'
+VERSION = 1
+ACTION_DTYPE = np.int64
+ACTION_SIZE = 3*np.dtype(ACTION_DTYPE).itemsize
+HEADER_SIZE = len(MAGIC) + 1 + 32 + ACTION_SIZE
+
+
+def _encode_action(action):
+    '''
+    canonical bytes of a challenge action; only the form ChallengeMaker writes is accepted, so decoding gives back
+    the exact same dictionary
+    '''
+    if not isinstance(action, dict) or set(action.keys()) != {"v", "g", "r"}:
+        raise ValueError("Action dictionary must have exactly these keys: v, g, r.")
+    division, digit, rindex = action["v"], action["g"], action["r"]
+    if not isinstance(division, bool):
+        raise ValueError("'v' must be a boolean.")
+    if isinstance(digit, bool) or not isinstance(digit, int) or not 0 <= digit <= 9:
+        raise ValueError("'g' must be a digit.")
+    if rindex is not None and (isinstance(rindex, bool) or not isinstance(rindex, int) or rindex < 0):
+        raise ValueError("'r' must be a non-negative integer or None.")
+    return np.array([division, digit, -1 if rindex is None else rindex], dtype=ACTION_DTYPE).tobytes()
+
+
+def _decode_action(data):
+    division, digit, rindex = np.frombuffer(data, dtype=ACTION_DTYPE, count=3).tolist()
+    return {"v": bool(division), "g": digit, "r": None if rindex < 0 else rindex}
+
+
+def encode_challenge(state, action):
+    '''
+    canonical bytes of a challenge's z and a (the same for states that only differ in their key types or list order).
+        Raises ValueError if either cannot be encoded.
+    '''
+    return _encode_action(action) + PackedState.from_state(state).to_bytes()
+
+
+def challenge_key(state, action):
+    '''
+    canonical hash (hex sha256) of a challenge's z and a
+    '''
+    return hashlib.sha256(encode_challenge(state, action)).hexdigest()
+
+
+class ChallengeStore:
+    '''
+    Args:
+        challenges_dir (str): challenges dir the store lives in.
+    '''
+    def __init__(self, challenges_dir):
+        self.challenges_dir = challenges_dir
+        self.root = os.path.join(challenges_dir, STORE_NAME)
+
+    def _write(self, path, data):
+        '''
+        atomic write, skipped if the (content-addressed) file is already there
+        '''
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _object_path(self, key):
+        return os.path.join(self.root, 'objects', key[:2], key + '.bin')
+
+    def _answer_path(self, date, index=0):
+        name = get_challenge_file_name(date, index)[:-len('.json')] + ANSWER_SUFFIX
+        return os.path.join(self.challenges_dir, str(date)[:7], name)
+
+    def _challenge_of(self, date, index=0):
+        '''
+        Returns:
+            tuple(dict, dict, str)|None: z, a and the key of challenge index of the set of the date, from the store or
+                from its challenge file, or None if there is no such challenge.
+        '''
+        key = self.key_of(get_challenge_id(date, index))
+        if key is not None:
+            state, action, examples_key = self.get(key)
+            return state, action, key
+        challenge = load_challenge(self.challenges_dir, date, index)
+        if challenge is None:
+            return None
+        state, action = challenge["challenge"]["z"], challenge["challenge"]["a"]
+        return state, action, challenge_key(state, action)
+
+    def _ref_path(self, challenge_id):
+        return os.path.join(self.root, 'refs', str(challenge_id))
+
+    def put_examples(self, examples):
+        '''
+        stores the shared examples (once), returning their key
+        '''
+        # compact JSON, in order (the JSON view keeps the order of the keys)
+        with allow_huge_ints():
+            data = json.dumps(examples, separators=(",", ":")).encode()
+        key = hashlib.sha256(data).hexdigest()
+        self._write(os.path.join(self.root, 'examples', key + '.json'), data)
+        return key
+
+    def put(self, challenge_id, state, action, examples):
+        '''
+        stores the challenge with that id, e.g. a date (nothing new is written if the same challenge is already stored).
+
+        Returns:
+            str: the challenge key.
+        '''
+        challenge_bytes = encode_challenge(state, action)
+        # the JSON view is rendered from the decoded record, so it must give back the very same state
+        if PackedState.from_bytes(challenge_bytes[ACTION_SIZE:]).to_state() != state:
+            raise ValueError("The state is not in the canonical form (int keys 0..digits-1, sorted digit lists).")
+        key = hashlib.sha256(challenge_bytes).hexdigest()
+        examples_key = self.put_examples(examples)
+        record = MAGIC + bytes([VERSION]) + bytes.fromhex(examples_key) + challenge_bytes
+        self._write(self._object_path(key), record)
+        ref_path = self._ref_path(challenge_id)
+        os.makedirs(os.path.dirname(ref_path), exist_ok=True)
+        tmp_path = f"{ref_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(key)
+        os.replace(tmp_path, ref_path)
+        return key
+
+    def put_answer(self, date, index=0):
+        '''
+        computes the ground truth o of challenge index of the set of the date (with the transition kernel, which
+        reproduces the simulator) and seals it next to its challenge file, once.
+
+        Returns:
+            dict|None: the ground truth o, or None if there is no such challenge.
+        '''
+        challenge = self._challenge_of(date, index)
+        if challenge is None:
+            return None
+        state, action, key = challenge
+        answer, reward, terminated = apply_action(state, action)
+        answer_bytes = PackedState.from_state(answer).to_bytes()
+        record = ANSWER_MAGIC + bytes([VERSION]) + bytes.fromhex(key) + hashlib.sha256(answer_bytes).digest() + answer_bytes
+        self._write(self._answer_path(date, index), record)
+        return answer
+
+    def get_answer(self, date, index=0):
+        '''
+        Returns:
+            dict|None: the sealed ground truth o of challenge index of the set of the date, or None if it has none.
+                Raises ValueError if the record does not match its hashes.
+        '''
+        try:
+            with open(self._answer_path(date, index), 'rb') as f:
+                record = f.read()
+        except FileNotFoundError:
+            return None
+        challenge = self._challenge_of(date, index)
+        offset = len(ANSWER_MAGIC) + 1
+        answer_bytes = record[offset+64:]
+        if (challenge is None or record[:len(ANSWER_MAGIC)] != ANSWER_MAGIC or record[len(ANSWER_MAGIC)] != VERSION
+                or record[offset:offset+32] != bytes.fromhex(challenge[2])
+                or record[offset+32:offset+64] != hashlib.sha256(answer_bytes).digest()):
+            raise ValueError(f"The answer of challenge {get_challenge_id(date, index)} does not match its seal.")
+        return PackedState.from_bytes(answer_bytes).to_state()
+
+    def _challenge_files(self):
+        '''
+        (date, index, name, year_month) of every challenge file of the challenges dir, in order
+        '''
+        for year_month in sorted(os.listdir(self.challenges_dir)):
+            if not YEAR_MONTH.fullmatch(year_month):
+                continue
+            for name in sorted(os.listdir(os.path.join(self.challenges_dir, year_month))):
+                parsed = parse_challenge_file_name(name)
+                if parsed is not None:
+                    day, index = parsed
+                    yield f"{year_month}-{day:02d}", index, name, year_month
+
+    def seal_all(self):
+        '''
+        computes the answers the challenges (of the store, or of the challenge files) do not have yet.
+
+        Returns:
+            int: number of answers sealed.
+        '''
+        challenges = {(date, index) for date, index, name, year_month in self._challenge_files()}
+        refs_dir = os.path.join(self.root, 'refs')
+        for challenge_id in os.listdir(refs_dir) if os.path.isdir(refs_dir) else []:
+            date, _, index = challenge_id.partition('_')
+            challenges.add((date, int(index or 0)))
+        count = 0
+        for date, index in sorted(challenges):
+            if not os.path.exists(self._answer_path(date, index)):
+                self.put_answer(date, index)
+                count += 1
+        return count
+
+    def key_of(self, challenge_id):
+        '''
+        Returns:
+            str|None: key of the challenge with that id (e.g. a date), or None if the store has none.
+        '''
+        try:
+            with open(self._ref_path(challenge_id)) as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            return None
+
+    def get(self, key):
+        '''
+        Returns:
+            tuple(dict, dict, str): z, a and the key of the examples of the challenge.
+        '''
+        with open(self._object_path(key), 'rb') as f:
+            record = f.read()
+        if record[:len(MAGIC)] != MAGIC or record[len(MAGIC)] != VERSION:
+            raise ValueError(f"Challenge record {key} is not in a known format.")
+        offset = len(MAGIC) + 1
+        examples_key = record[offset:offset+32].hex()
+        action = _decode_action(record[offset+32:HEADER_SIZE])
+        state = PackedState.from_bytes(record[HEADER_SIZE:]).to_state()
+        return state, action, examples_key
+
+    def get_examples(self, examples_key):
+        with allow_huge_ints():
+            return json.loads(_read_examples(self.root, examples_key))
+
+    def load(self, key):
+        '''
+        the challenge dictionary (examples and challenge, as in the JSON files) of a key
+        '''
+        state, action, examples_key = self.get(key)
+        challenge = self.get_examples(examples_key)
+        challenge["challenge"] = {"z": state, "a": action}
+        return challenge
+
+    def render(self, key):
+        '''
+        the JSON file of the challenge (the derived view)
+        '''
+        with allow_huge_ints():
+            return json.dumps(self.load(key), indent=4)
+
+    def import_json(self, challenge_id, path):
+        '''
+        stores a challenge JSON file written before the store existed, checking the store renders it back exactly.
+
+        Returns:
+            str: the challenge key.
+        '''
+        with open(path) as f:
+            content = f.read()
+        with allow_huge_ints():
+            data = json.loads(content)
+        state = data["challenge"]["z"]
+        state = {**state, "a": {int(rindex): digit_list for rindex, digit_list in state["a"].items()}}
+        examples = {name: value for name, value in data.items() if name != "challenge"}
+        key = self.put(challenge_id, state, data["challenge"]["a"], examples)
+        if self.render(key) != content:
+            raise ValueError(f"{path} is not rendered back exactly from the store.")
+        return key
+
+
+    def import_all(self):
+        '''
+        imports every challenge file of the challenges dir that the store does not have yet.
+
+        Returns:
+            int: number of challenges imported.
+        '''
+        count = 0
+        for date, index, name, year_month in self._challenge_files():
+            challenge_id = get_challenge_id(date, index)
+            if self.key_of(challenge_id) is None:
+                self.import_json(challenge_id, os.path.join(self.challenges_dir, year_month, name))
+                count += 1
+        return count
+
+
+@lru_cache(maxsize=16)
+def _read_examples(root, examples_key):
+    '''
+    the shared examples, read once per process (they never change under a key)
+    '''
+    with open(os.path.join(root, 'examples', examples_key + '.json'), 'rb') as f:
+        return f.read()
+
+
+def load_answer(challenges_dir, date, index=0):
+    '''
+    the sealed ground truth o of challenge index of the set of the date.
+
+    Returns:
+        dict|None: None if it has no sealed answer (e.g. the challenge was made before the answers were sealed).
+    '''
+    return ChallengeStore(challenges_dir).get_answer(date, index)
+
+
+def load_challenge(challenges_dir, date, index=0):
+    '''
+    the challenge dictionary of challenge index of the set of the date, from the store, or from its JSON file if it
+    predates the store.
+
+    Returns:
+        dict|None: None if there is no such challenge.
+    '''
+    challenge_store = ChallengeStore(challenges_dir)
+    key = challenge_store.key_of(get_challenge_id(date, index))
+    if key is not None:
+        return challenge_store.load(key)
+    challenge_file = os.path.join(challenges_dir, str(date)[:7], get_challenge_file_name(date, index))
+    if not os.path.exists(challenge_file):
+        return None
+    with open(challenge_file, 'r') as f, allow_huge_ints():
+        return json.load(f)
+
+
+def get_challenge_set_size(challenges_dir, date):
+    '''
+    number of challenges in the set of the date (their indexes are 0 to size-1), 0 if it has none
+    '''
+    challenge_store = ChallengeStore(challenges_dir)
+    size = 0
+    while (challenge_store.key_of(get_challenge_id(date, size)) is not None
+           or os.path.exists(os.path.join(challenges_dir, str(date)[:7], get_challenge_file_name(date, size)))):
+        size += 1
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Divide21x challenge store.")
+    parser.add_argument("--challenges-dir", default='./divide21x/challenges')
+    parser.add_argument("--import-json", action="store_true", help="import the challenge files the store does not have yet")
+    parser.add_argument("--seal", action="store_true", help="compute the answers the challenges do not have yet")
+    parser.add_argument("--render", metavar="ID", help="print the JSON view of a challenge (YYYY-MM-DD or YYYY-MM-DD_<index>)")
+    args = parser.parse_args()
+
+    challenge_store = ChallengeStore(args.challenges_dir)
+    if args.import_json:
+        print(f"imported {challenge_store.import_all()} challenges")
+    if args.seal:
+        print(f"sealed {challenge_store.seal_all()} answers")
+    if args.render:
+        key = challenge_store.key_of(args.render)
+        if key is None:
+            parser.error(f"no challenge for {args.render} in the store")
+        print(challenge_store.render(key), end="")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+'''
+Index of the challenges in divide21x/challenges for duplicate and near-duplicate detection, so ChallengeMaker can
+reject a challenge that repeats (or trivially relates to) an earlier one, with a few indexed lookups whatever the
+length of the history.
+
+For every challenge it keeps
+    state fingerprint:  fingerprint of z that ignores 'a' key types, digit list order, and the order and ids of the
+                        players (only their scores, m flags and who plays next count): the ANONYMOUS_PLAYERS view of
+                        divide21x/simulator/fingerprint.py
+    pair fingerprint:   the same, with a
+    signature:          MinHash signature of the set of features of the challenge:
+                            (rindex, digit) of every digit of d, (rindex, mask) of every rindex of a, the multiset of
+                            player scores, the score of the player to play, and the action
+                        split into bands for locality-sensitive hashing, so challenges sharing most of their features
+                        share a band bucket with high probability.
+
+A challenge is a duplicate of an earlier one with the same state fingerprint (and the same action, or a different
+one), and a near-duplicate of one whose signature agrees on at least NEAR_DUPLICATE_THRESHOLD of its values (the
+estimated Jaccard similarity of their features).
+
+    python -m divide21x.challenge_maker.duplicate_index --rebuild --report
+'''
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import numpy as np
+from divide21x.simulator.fingerprint import ANONYMOUS_PLAYERS, fingerprint_pair, fingerprint_state
+from divide21x.simulator.state_codec import ABSENT, PackedState
+from divide21x.simulator.transition_kernel import parse_action
+from divide21x.utils.digits import allow_huge_ints
+from divide21x.utils.util import YEAR_MONTH, get_challenge_id, parse_challenge_file_name
+
+
+INDEX_NAME = 'duplicates.sqlite'
+# version of the fingerprints, an index of another version is rebuilt
+INDEX_VERSION = 2
+PERMUTATIONS = 64
+BANDS = 16
+ROWS = PERMUTATIONS // BANDS
+NEAR_DUPLICATE_THRESHOLD = 0.8
+# kinds of match
+DUPLICATE = 'duplicate'
+SAME_STATE = 'same_state'
+NEAR_DUPLICATE = 'near_duplicate'
+# feature kinds
+DIGIT_FEATURE = 1
+MASK_FEATURE = 2
+SCORE_FEATURE = 3
+TURN_FEATURE = 4
+ACTION_FEATURE = 5
+FIELD_BITS = 28
+FIELD_OFFSET = 1 << (FIELD_BITS - 1)
+
+
+def _mix(values):
+    '''
+    splitmix64 finalizer over a uint64 array (wrapping arithmetic)
+    '''
+    values = values + np.uint64(0x9E3779B97F4A7C15)
+    values = (values ^ (values >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    values = (values ^ (values >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
+
+
+PERMUTATION_SEEDS = _mix(np.arange(1, PERMUTATIONS + 1, dtype=np.uint64))
+
+
+def _players(packed):
+    '''
+    (score, m) of every player, sorted, and the score of the player to play (None if the turn is not a player)
+    '''
+    players = np.stack([packed.scores, packed.turn_flags], axis=1)
+    players = players[np.lexsort((players[:, 1], players[:, 0]))]
+    turn_score = int(packed.scores[packed.t]) if 0 <= packed.t < len(packed.scores) else None
+    return players, turn_score
+
+
+def _encode_action(action):
+    division, digit, rindex = parse_action(action)
+    return np.array([int(bool(division)), -1 if digit is None else digit, -1 if rindex is None else rindex], dtype=np.int64)
+
+
+def state_fingerprint(state):
+    '''
+    order-insensitive fingerprint (hex) of a challenge state
+    '''
+    return fingerprint_state(PackedState.from_state(state), players=ANONYMOUS_PLAYERS).hex()
+
+
+def pair_fingerprint(state, action):
+    '''
+    order-insensitive fingerprint (hex) of a challenge state and action
+    '''
+    return fingerprint_pair(PackedState.from_state(state), action, players=ANONYMOUS_PLAYERS).hex()
+
+
+def _features(state, action):
+    '''
+    features of a challenge as uint64 tokens: kind (8 bits), then two 28-bit fields
+    '''
+    packed = PackedState.from_state(state)
+    players, turn_score = _players(packed)
+    digits = len(packed.d)
+    rindexes = np.arange(digits, dtype=np.int64)
+    present = (packed.a & ABSENT) == 0
+    # the k-th player with a score is its own feature, so repeated scores count
+    scores = players[:, 0]
+    occurrences = np.arange(len(scores)) - np.searchsorted(scores, scores)
+    division, digit, rindex = _encode_action(action).tolist()
+    kinds, first, second = zip(
+        (np.full(digits, DIGIT_FEATURE), rindexes, packed.d[::-1].astype(np.int64)),
+        (np.full(int(present.sum()), MASK_FEATURE), rindexes[present], packed.a[present].astype(np.int64)),
+        (np.full(len(scores), SCORE_FEATURE), scores, occurrences),
+        (np.array([TURN_FEATURE]), np.array([turn_score or 0]), np.array([turn_score is not None])),
+        (np.array([ACTION_FEATURE]), np.array([division*16 + digit + 1]), np.array([rindex])),
+    )
+    kinds, first, second = (np.concatenate(columns).astype(np.int64) for columns in (kinds, first, second))
+    mask = (1 << FIELD_BITS) - 1
+    tokens = (kinds << 2*FIELD_BITS) | (((first + FIELD_OFFSET) & mask) << FIELD_BITS) | ((second + FIELD_OFFSET) & mask)
+    return tokens.view(np.uint64)
+
+
+def challenge_signature(state, action):
+    '''
+    MinHash signature (PERMUTATIONS uint64 values) of the features of a challenge
+    '''
+    tokens = _features(state, action)
+    return _mix(tokens[None, :] ^ PERMUTATION_SEEDS[:, None]).min(axis=1)
+
+
+def signature_similarity(signature1, signature2):
+    '''
+    estimated Jaccard similarity of the features of two challenges
+    '''
+    return float(np.mean(signature1 == signature2))
+
+
+def _band_buckets(signature):
+    return [
+        int.from_bytes(hashlib.blake2b(signature[band*ROWS:(band + 1)*ROWS].tobytes(), digest_size=8).digest(), 'little', signed=True)
+        for band in range(BANDS)
+    ]
+
+
+class DuplicateIndex:
+    '''
+    SQLite index of the fingerprints and signatures of the challenges (the file lives in the challenges dir, next to
+    the catalog). A new index, or one of another INDEX_VERSION, is filled from the challenge files.
+
+    Args:
+        challenges_dir (str): challenges dir the index covers.
+        threshold (float): estimated similarity from which a challenge is a near-duplicate.
+    '''
+    def __init__(self, challenges_dir, threshold=NEAR_DUPLICATE_THRESHOLD):
+        self.challenges_dir = challenges_dir
+        self.threshold = threshold
+        self.db_path = os.path.join(challenges_dir, INDEX_NAME)
+        os.makedirs(challenges_dir, exist_ok=True)
+        # default (rollback) journal, like the catalog
+        self.connection = sqlite3.connect(self.db_path, timeout=30)
+        new = not self.connection.execute("SELECT name FROM sqlite_master WHERE name = 'challenges'").fetchone()
+        outdated = self.connection.execute("PRAGMA user_version").fetchone()[0] != INDEX_VERSION
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS challenges ("
+            "date TEXT NOT NULL, idx INTEGER NOT NULL, state_fingerprint TEXT NOT NULL, pair_fingerprint TEXT NOT NULL, "
+            "signature BLOB NOT NULL, PRIMARY KEY (date, idx))"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS challenges_state ON challenges (state_fingerprint)")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS bands (band INTEGER NOT NULL, bucket INTEGER NOT NULL, date TEXT NOT NULL, idx INTEGER NOT NULL)"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS bands_bucket ON bands (bucket, band)")
+        self.connection.commit()
+        if new or outdated:
+            self.rebuild()
+
+    def add(self, date, index, state, action, commit=True):
+        '''
+        adds (or replaces) challenge index of the set of the date
+        '''
+        signature = challenge_signature(state, action)
+        self.connection.execute("DELETE FROM bands WHERE date = ? AND idx = ?", (date, index))
+        self.connection.execute(
+            "INSERT OR REPLACE INTO challenges VALUES (?, ?, ?, ?, ?)",
+            (date, index, state_fingerprint(state), pair_fingerprint(state, action), signature.tobytes())
+        )
+        self.connection.executemany(
+            "INSERT INTO bands VALUES (?, ?, ?, ?)",
+            [(band, bucket, date, index) for band, bucket in enumerate(_band_buckets(signature))]
+        )
+        if commit:
+            self.connection.commit()
+
+    def find(self, state, action, before=None):
+        '''
+        the earlier challenge the given one repeats, if any: a duplicate first, then the most similar near-duplicate.
+
+        Args:
+            before (tuple(str, int)|None): only consider challenges before this (date, index), so the answer does not
+                depend on the challenges made after it; every challenge if None.
+
+        Returns:
+            tuple(str, str, float)|None: (kind of match, id of the challenge, estimated similarity), or None.
+        '''
+        condition, parameters = "1", []
+        if before is not None:
+            date, index = before
+            condition, parameters = "(date < ? OR (date = ? AND idx < ?))", [date, date, index]
+
+        pair = pair_fingerprint(state, action)
+        row = self.connection.execute(
+            f"SELECT date, idx, pair_fingerprint FROM challenges WHERE state_fingerprint = ? AND {condition} "
+            f"ORDER BY pair_fingerprint = ? DESC, date, idx LIMIT 1", [state_fingerprint(state), *parameters, pair]
+        ).fetchone()
+        if row is not None:
+            return (DUPLICATE if row[2] == pair else SAME_STATE), get_challenge_id(row[0], row[1]), 1.0
+
+        signature = challenge_signature(state, action)
+        buckets = _band_buckets(signature)
+        candidates = self.connection.execute(
+            f"SELECT date, idx, signature FROM challenges WHERE (date, idx) IN ("
+            f"SELECT date, idx FROM bands WHERE {' OR '.join(['(bucket = ? AND band = ?)']*BANDS)}) AND {condition}",
+            [value for band, bucket in enumerate(buckets) for value in (bucket, band)] + parameters
+        ).fetchall()
+        best = None
+        for date, index, other in candidates:
+            similarity = signature_similarity(signature, np.frombuffer(other, dtype=np.uint64))
+            if similarity >= self.threshold and (best is None or similarity > best[2]):
+                best = (NEAR_DUPLICATE, get_challenge_id(date, index), similarity)
+        return best
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM challenges").fetchone()[0]
+
+    def _challenge_files(self):
+        '''
+        (date, index, path) of every challenge file of the challenges dir, in order
+        '''
+        for year_month in sorted(os.listdir(self.challenges_dir)):
+            month_dir = os.path.join(self.challenges_dir, year_month)
+            if not YEAR_MONTH.fullmatch(year_month) or not os.path.isdir(month_dir):
+                continue
+            files = []
+            for name in os.listdir(month_dir):
+                parsed = parse_challenge_file_name(name)
+                if parsed is not None:
+                    files.append((f"{year_month}-{parsed[0]:02d}", parsed[1], os.path.join(month_dir, name)))
+            yield from sorted(files)
+
+    def rebuild(self):
+        '''
+        re-indexes every challenge file in the challenges dir.
+
+        Returns:
+            int: number of challenges indexed.
+        '''
+        self.connection.execute("DELETE FROM challenges")
+        self.connection.execute("DELETE FROM bands")
+        self.connection.commit()
+        count = 0
+        for date, index, path in self._challenge_files():
+            with open(path, 'r') as f, allow_huge_ints():
+                challenge = json.load(f)["challenge"]
+            self.add(date, index, challenge["z"], challenge["a"], commit=False)
+            count += 1
+        self.connection.execute(f"PRAGMA user_version = {INDEX_VERSION}")
+        self.connection.commit()
+        return count
+
+    def report(self):
+        '''
+        every indexed challenge that repeats an earlier one.
+
+        Returns:
+            list[tuple(str, str, str, float)]: (challenge id, kind of match, id of the earlier challenge, similarity).
+        '''
+        matches = []
+        for date, index, path in self._challenge_files():
+            with open(path, 'r') as f, allow_huge_ints():
+                challenge = json.load(f)["challenge"]
+            match = self.find(challenge["z"], challenge["a"], before=(date, index))
+            if match is not None:
+                matches.append((get_challenge_id(date, index), *match))
+        return matches
+
+    def close(self):
+        self.connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Duplicate and near-duplicate index of the Divide21x challenges.")
+    parser.add_argument("--challenges-dir", default='./divide21x/challenges')
+    parser.add_argument("--rebuild", action="store_true", help="re-index every challenge file first")
+    parser.add_argument("--report", action="store_true", help="list the challenges that repeat an earlier one")
+    args = parser.parse_args()
+
+    duplicate_index = DuplicateIndex(args.challenges_dir)
+    try:
+        if args.rebuild:
+            print(f"indexed {duplicate_index.rebuild()} challenges")
+        if args.report:
+            for challenge_id, kind, earlier_id, similarity in duplicate_index.report():
+                print(f"{challenge_id}: {kind} of {earlier_id} ({similarity:.2f})")
+    finally:
+        duplicate_index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+'''
+Constructive synthesis of Divide21 challenge states, in O(digits + players) whatever the length of the game they
+stand for, instead of playing a random rollout and picking one of its states.
+
+A synthesized state is built directly from the invariants every reachable (non-final) state keeps:
+    s:  static number without one-digit divisors (like Divide21Env draws it)
+    d:  dynamic number of at most as many digits as s, other than 0 and 1 (divisions only shrink it, digit changes
+        keep its length)
+    a:  for each rindex of d, a non-empty subset of the digits a digit change could still write there (never the
+        current digit, nor a digit that would give a leading zero or make the number 0 or 1)
+    p:  scores are sums of division outcomes (+digit / -digit), strictly between -max and max score for at least two
+        players (or the only one); players at -max or below are out, down to the -max-8 the rules allow
+    t:  a player who is still in, and the only one with m = 1
+
+rollout_state() plays random actions instead, keeping one uniformly drawn state of the rollout by reservoir sampling,
+for when a state reached by actual play is required.
+All draws go through the given random.Random, so a seed always gives the same state.
+'''
+from divide21x.simulator.transition_kernel import _nonzero_digits, _prohibited_digits, apply_action
+from divide21x.utils.digits import number_length, string_to_int
+
+
+# chance that a player is already out (at -max score or below) in a synthesized state, if the game allows it
+ELIMINATION_RATE = 0.1
+ONE_DIGIT_PRIMES = (2, 3, 5, 7)
+
+
+def _random_number_string(rng, digits):
+    '''
+    decimal string of a random number with exactly this many digits (no leading zero)
+    '''
+    return str(rng.randint(1, 9)) + ''.join(rng.choices('0123456789', k=digits-1))
+
+
+def synthesize_static_number(rng, digits):
+    '''
+    random number with this many digits and no one-digit divisor (as Divide21Env draws the starting number).
+        The last digit rules out 2 and 5 and is picked so the digit sum rules out 3; only 7 needs a redraw.
+    '''
+    if digits < 2:
+        raise ValueError("The static number must have at least 2 digits.")
+    while True:
+        prefix = _random_number_string(rng, digits-1)
+        prefix_sum = sum(int(digit) for digit in prefix)
+        last_digits = [digit for digit in (1, 3, 7, 9) if (prefix_sum + digit) % 3]
+        number = string_to_int(prefix + str(rng.choice(last_digits)))
+        if number % 7:
+            return number
+
+
+def synthesize_available_digits(rng, number_string, keep_rate=None):
+    '''
+    available digits per rindex of the dynamic number: each rindex keeps every digit it could be changed to with
+    probability keep_rate (drawn if None), and always at least one of them.
+    '''
+    digits = len(number_string)
+    nonzero_digits = _nonzero_digits(number_string)
+    keep_rate = rng.random() if keep_rate is None else keep_rate
+    available_digits_per_rindex = {}
+    for rindex in range(digits):
+        current_digit = int(number_string[digits-rindex-1])
+        prohibited = _prohibited_digits(number_string, digits, rindex, nonzero_digits)
+        allowed = [d for d in range(10) if d != current_digit and d not in prohibited]
+        kept = [d for d in allowed if rng.random() < keep_rate]
+        available_digits_per_rindex[rindex] = kept or [rng.choice(allowed)]
+    return available_digits_per_rindex
+
+
+def synthesize_players(rng, players, max_score):
+    '''
+    players and player turn of a game that is not over
+    '''
+    scores = [rng.randint(-max_score+1, max_score-1) for _ in range(players)]
+    if players > 2:
+        # knock some players out, keeping at least two in
+        out = [i for i in range(players) if rng.random() < ELIMINATION_RATE][:players-2]
+        for i in out:
+            scores[i] = rng.randint(-max_score-8, -max_score)
+    player_turn = rng.choice([i for i in range(players) if scores[i] > -max_score])
+    return [{"i": i, "c": c, "m": int(i == player_turn)} for i, c in enumerate(scores)], player_turn
+
+
+def synthesize_state(rng, static_digits, players, digits=None):
+    '''
+    builds a random non-final state of a game with the given shape, in O(static_digits + players).
+
+    Args:
+        rng (random.Random): source of every draw.
+        static_digits (int): digits of the static number (>= 2); the max score is 9*static_digits.
+        players (int): number of players (>= 1).
+        digits (int|None): digits of the dynamic number (1 to static_digits), drawn if None.
+
+    Returns:
+        dict: the state in the decoded (JSON-compatible) form, as the transition kernel returns them.
+    '''
+    if players < 1:
+        raise ValueError("There must be at least 1 player.")
+    static_number = synthesize_static_number(rng, static_digits)
+    digits = rng.randint(1, static_digits) if digits is None else digits
+    if not 1 <= digits <= static_digits:
+        raise ValueError("The dynamic number cannot have more digits than the static number.")
+    # the game is over once the dynamic number is 1 (and it can never be 0)
+    number_string = str(rng.randint(2, 9)) if digits == 1 else _random_number_string(rng, digits)
+    players, player_turn = synthesize_players(rng, players, 9*static_digits)
+    return {
+        "s": static_number,
+        "d": string_to_int(number_string),
+        "a": synthesize_available_digits(rng, number_string),
+        "p": players,
+        "t": player_turn
+    }
+
+
+def random_action(rng, digits):
+    '''
+    random action, drawn like ChallengeMaker draws the rollout actions (divisors 2-9)
+    '''
+    division = bool(rng.randint(0, 1))
+    return {
+        "v": division,
+        "g": rng.randint(2, 9) if division else rng.randint(0, 9),
+        "r": rng.randint(0, digits-1) if not division else None
+    }
+
+
+def rollout_state(rng, state, steps=100):
+    '''
+    plays up to steps random actions from the state, and returns one of the non-final states it went through, each
+    with the same probability. Reservoir sampling keeps a single state at a time, so memory does not grow with steps.
+
+    Returns:
+        dict|None: the drawn state, or None if the first action already ended the game.
+    '''
+    selected = None
+    for seen in range(steps):
+        state, reward, done = apply_action(state, random_action(rng, number_length(state["d"])))
+        if done:
+            break
+        if rng.randint(0, seen) == 0:
+            selected = state
+    return selected
@@ -1,12 +1,17 @@
+import argparse
 import csv
 import gymnasium as gym
 from gymnasium import spaces
 import divide21env
+import divide21x.utils.month_archive as month_archive
 import json
 import os
+from concurrent.futures import ProcessPoolExecutor
+from divide21x.evaluation.evaluator import load_ground_truth_state
 from divide21x.grading.grader import Grader
+from divide21x.utils.digits import allow_huge_ints
 from divide21x.utils.logger import EpisodeLogger
-from divide21x.utils.util import get_llm_registry, get_utc_date, get_utc_day, get_utc_hour
+from divide21x.utils.util import get_llm_registry, get_rubric, get_utc_date, get_utc_day, get_utc_hour
 
 
 BASE_DIR='./divide21x/envs/logs'
@@ -18,6 +23,7 @@ RUN = 'run'
 SCORE = 'score'
 PROXIMITY = 'proximity'
 ANSWER = 'answer'
+RUBRICS = 'rubrics'
 # types
 CRITICAL = 'critical'
 WARNING = 'warning'
@@ -27,14 +33,13 @@ DONE = 'done'
 
 
 class Divide21X(Grader):
-    def __init__(self, action=None, state=None):
-        super().__init__(action, state)
+    def __init__(self, action=None, state=None, date=None, index=0, logger=None, ground_truth_state=None, rubric=None):
+        super().__init__(
+            action, state, date, index, logger if logger is not None else EpisodeLogger(BASE_DIR), ground_truth_state, rubric
+        )
         
         self.proximity = 0
         self.model = None
-        
-        # Logging
-        self.logger = EpisodeLogger(BASE_DIR)
     
     def start(self):
         self.proximity = self.grade_submission2()
@@ -51,29 +56,73 @@ class Divide21X(Grader):
         return self.proximity
     
 
-def handle_averages():
+def get_provider(alias, registry):
+    '''
+    provider of the model alias in the registry (None if it is not registered)
+    '''
+    for entry in registry:
+        if entry['alias'] == alias:
+            return entry['provider']
+    return None
+
+
+def get_providers(registry):
+    '''
+    the provider of every model alias in the registry ({alias: provider}), to look up each row of a leaderboard
+    without scanning the registry
+    '''
+    providers = {}
+    for entry in registry:
+        providers.setdefault(entry['alias'], entry['provider'])
+    return providers
+
+
+def get_root():
+    '''
+    the dir the results and leaderboards dirs (and the month archives) are in
+    '''
+    return os.path.dirname(RESULTS_DIR)
+
+
+def get_leaderboards_path(date, version=None):
+    '''
+    the leaderboards dir of the month of the date, or the one of the rubric version in it
+    '''
+    leaderboards_path = os.path.join(LEADERBOARDS_DIR, date[:7])
+    return leaderboards_path if version is None else os.path.join(leaderboards_path, f'rubric-{version}')
+
+
+def get_scores(value, version=None):
+    '''
+    the proximity and score of a results entry ({proximity, score}), or the ones it got with the rubric version (None
+    if it was not regraded with it)
+    '''
+    return value if version is None else value.get(RUBRICS, {}).get(version)
+
+
+def handle_averages(date=None, version=None):
+    date = str(date or get_utc_date())
+    providers = get_providers(get_llm_registry())
+    leaderboards_path = get_leaderboards_path(date, version)
+    os.makedirs(leaderboards_path, exist_ok=True)
     for metric in [PROXIMITY, SCORE]:
-        date = str(get_utc_date())
-        day = str(get_utc_day())
         metric_data = {}
-        # only consider files in the current month
-        for file in os.listdir(os.path.join(RESULTS_DIR, date[:7])):
-            if not file.endswith('.json'):
-                continue
-            file_path = os.path.join(RESULTS_DIR, date[:7], file)
-            with open(file_path, 'r') as f:
-                data = json.load(f)
-                for alias, value in data.items():
-                    if alias not in metric_data:
-                        metric_data[alias] = []
-                    metric_data[alias].append(value[metric])
+        # only consider the results of the current month (every challenge of every set, loose or archived)
+        for data in month_archive.read_month_results(date[:7], get_root()).values():
+            for alias, value in data.items():
+                scores = get_scores(value, version)
+                if scores is None:
+                    continue
+                if alias not in metric_data:
+                    metric_data[alias] = []
+                metric_data[alias].append(scores[metric])
         
         # sort in descending order
         metric_data = sorted(metric_data.items(), key=lambda x: (sum(x[1]) / len(x[1])), reverse=True)
         metric_data = dict(metric_data)
         
         # write averages to csv
-        average_metric_file = os.path.join(LEADERBOARDS_DIR, date[:7], f'average_{metric}.csv')
+        average_metric_file = os.path.join(leaderboards_path, f'average_{metric}.csv')
         with open(average_metric_file, mode="w", newline="") as f:
             # write header
             header = ["Model", "Provider", f"Average {metric.capitalize()} (%)"]
@@ -86,67 +135,241 @@ def handle_averages():
                     average_metric = average_metric * 100
                 # round to 2 decimal places
                 average_metric = round(average_metric, 2)
-                # get provider
-                provider = None
-                registry = get_llm_registry()
-                for entry in registry:
-                    if entry['alias'] == alias:
-                        provider = entry['provider']
-                        break
                 # write row
-                writer.writerow([alias, provider, average_metric])
+                writer.writerow([alias, providers.get(alias), average_metric])
 
-if __name__ == "__main__":
-    # navigate the results dir
-    date = str(get_utc_date())
-    day = str(get_utc_day())
-    
-    # get the results file
-    data = None
-    file_name = day + '.json'
-    results_path = os.path.join(RESULTS_DIR, date[:7])
-    file = os.path.join(results_path, file_name)
-    # for leaderboard
-    leaderboard_file_name = day + '.csv'
-    leaderboards_path = os.path.join(LEADERBOARDS_DIR, date[:7])
+
+def write_leaderboard(date, graded, version=None):
+    '''
+    writes the leaderboard of the day from the graded results of each challenge of its set ([{alias: {proximity,
+    score}}], in order): the proximity and score of each model for a single challenge, their averages over the set
+    otherwise.
+    '''
+    leaderboard_file_name = str(int(date[8:])) + '.csv'
+    leaderboards_path = get_leaderboards_path(date, version)
     os.makedirs(leaderboards_path, exist_ok=True)
     leaderboard_file = os.path.join(leaderboards_path, leaderboard_file_name)
     
+    providers = get_providers(get_llm_registry())
+    leaderboard_data = []
+    if len(graded) == 1:
+        for key, value in graded[0].items():
+            leaderboard_data.append([key, providers.get(key), value[PROXIMITY], value[SCORE]])
+        header = ["Model", "Provider", "Proximity (%)", "Score (0/1)"]
+    else:
+        # aggregate over the set, per model
+        per_model = {}
+        for data in graded:
+            for key, value in data.items():
+                per_model.setdefault(key, []).append((value[PROXIMITY], value[SCORE]))
+        for key, values in per_model.items():
+            average_proximity = round(sum(proximity for proximity, _ in values) / len(values), 2)
+            average_score = round(sum(score for _, score in values) / len(values) * 100, 2)
+            leaderboard_data.append([key, providers.get(key), average_proximity, average_score, len(values)])
+        header = ["Model", "Provider", "Average Proximity (%)", "Average Score (%)", "Challenges"]
+    
+    # sort leaderboard data by proximity descending
+    leaderboard_data.sort(key=lambda x: x[2],  reverse=True)
+    # create leaderboard csv file
+    with open(leaderboard_file, mode="w", newline="") as f:
+        leaderboard_data.insert(0, header)
+        writer = csv.writer(f)
+        writer.writerows(leaderboard_data)
+
+
+def grade_answer(answer, date=None, index=0):
+    '''
+    inspects, evaluates and grades an answer to challenge index of the set of the date (today by default).
+
+    Returns:
+        tuple: (proximity, score) of the answer.
+    '''
+    divide21x = Divide21X(state=answer, date=date, index=index)
+    divide21x.start()
+    proximity = divide21x.get_proximity()
+    # because Divide21X is deterministic, only 100% proximity (meaning exact match to the correct answer) gets a score of 1
+    score = 1 if proximity == 100 else 0
+    return proximity, score
+
+
+def grade_many(answers, challenge=None, rubric=None, actions=None):
+    '''
+    grades many answers to the same challenge ((date, index), challenge 0 of the set of today by default), like
+    grade_answer() grades each of them. The ground truth and the rubric are loaded once for all of them, and they all
+    log to one logger (one entry per answer), which is saved once for the batch (nothing is read or written per answer).
+
+    Args:
+        rubric (dict|None): rubric to grade with, get_rubric() if None.
+        actions (list|None): the action submitted with each answer, if any.
+
+    Returns:
+        list: (proximity, score) of each answer.
+    '''
+    date, index = challenge or (None, 0)
+    date = str(date or get_utc_date())
+    answers = list(answers)
+    logger = EpisodeLogger(BASE_DIR, deferred=True)
+    ground_truth_state = load_ground_truth_state(date, index)
+    if ground_truth_state is None:
+        message = f"No challenge found!"
+        logger.add_info(ENVIRONMENT, CRITICAL, message)
+        logger.episode_log.append(logger.info)
+        logger.save_episode(force=True)
+        return [(0.0, 0)]*len(answers)
+    
+    rubric = rubric or get_rubric()
+    actions = [None]*len(answers) if actions is None else actions
+    graded = [
+        grade_with_ground_truth(answer, date, index, ground_truth_state, rubric, logger, action)
+        for answer, action in zip(answers, actions)
+    ]
+    logger.save_episode(force=True)
+    return graded
+
+
+def grade_with_ground_truth(answer, date, index, ground_truth_state, rubric, logger, action=None):
+    '''
+    grades an answer (and the action submitted with it, if any) to challenge index of the set of the date like
+    grade_answer(), with its ground truth and the rubric already loaded, into a new entry of the logger (which the
+    caller saves).
+
+    Returns:
+        tuple: (proximity, score).
+    '''
+    # a fresh entry per answer, appended up front so that equal entries of earlier answers are not mistaken for it
+    logger.info = {}
+    logger.episode_log.append(logger.info)
+    if ground_truth_state is None:
+        message = f"No challenge found!"
+        logger.add_info(ENVIRONMENT, CRITICAL, message)
+        return 0.0, 0
+    divide21x = Divide21X(
+        action=action, state=answer, date=date, index=index, logger=logger, ground_truth_state=ground_truth_state,
+        rubric=rubric
+    )
+    divide21x.start()
+    proximity = divide21x.get_proximity()
+    # only 100% proximity (meaning exact match to the correct answer) gets a score of 1
+    return proximity, 1 if proximity == 100 else 0
+
+
+def read_results(file):
+    '''
+    the results of a results file ({alias: {answer, ...}}), None if there are none
+    '''
+    data = None
     if os.path.exists(file):
-        with open(file, 'r') as f:
+        with open(file, 'r') as f, allow_huge_ints():
             data = json.load(f)
-        
-    if data:
-        leaderboard_data = []
-        for key, value in data.items():
-            divide21x = Divide21X(state=value[ANSWER])
-            divide21x.start()
-            # add proximity
-            value[PROXIMITY] = divide21x.get_proximity()
-            # add score
-            #   because Divide21X is deterministic, only 100% proximity (meaning exact match to the correct answer) gets a score of 1
-            value[SCORE] = 1 if value[PROXIMITY] == 100 else 0
-            # for leaderboard
-            provider = None
-            registry = get_llm_registry()
-            for entry in registry:
-                if entry['alias'] == key:
-                    provider = entry['provider']
-                    break
-            leaderboard_data.append([key, provider, value[PROXIMITY], value[SCORE]])
-        
-        # update the file
-        with open(file, 'w') as f:
-            json.dump(data, f, indent=4)
-        
-        # sort leaderboard data by proximity descending
-        leaderboard_data.sort(key=lambda x: x[2],  reverse=True)
-        # create leaderboard csv file
-        with open(leaderboard_file, mode="w", newline="") as f:
-            header = ["Model", "Provider", "Proximity (%)", "Score (0/1)"]
-            leaderboard_data.insert(0, header)
-            writer = csv.writer(f)
-            writer.writerows(leaderboard_data)
+    return data or None
+
+
+def write_results(file, data, graded):
+    '''
+    adds the proximity and score of each answer ([(proximity, score)], in the order of the results) to the results,
+    and writes them to the results file (again, if the results were only in the archive of their month)
+    '''
+    for value, (proximity, score) in zip(data.values(), graded):
+        value[PROXIMITY], value[SCORE] = proximity, score
+    os.makedirs(os.path.dirname(file), exist_ok=True)
+    with open(file, 'w') as f, allow_huge_ints():
+        json.dump(data, f, indent=4)
+
+
+def grade_results(file, date, index=0):
+    '''
+    grades the answers of the results file of challenge index of the set of the date, and adds their proximity and
+    score to it.
+
+    Returns:
+        dict|None: the graded results ({alias: {answer, proximity, score}}), None if there are none.
+    '''
+    data = read_results(file)
+    if not data:
+        return None
+    
+    write_results(file, data, grade_many([value[ANSWER] for value in data.values()], (date, index)))
+    return data
+
+
+def _grade_chunk(task):
+    '''
+    grades a chunk of the answers to a challenge (in a worker process: it reads the challenge, and only writes its log)
+    '''
+    date, index, answers = task
+    return grade_many(answers, (date, index))
+
+
+def grade_day(date=None, workers=1, chunk_size=None):
+    '''
+    grades the results of every challenge of the set of the date (today by default), and writes the leaderboard of the
+    day: the proximity and score of each model for a single challenge, their averages over the set otherwise.
+
+    The answers of all the results files are graded in chunks, spread over a process pool; the chunks come back in
+    order, and only this process writes the results files and the leaderboards.
+
+    Args:
+        workers (int|None): processes to grade the answers with (os.cpu_count() if None); 1 grades them in this
+            process.
+        chunk_size (int|None): answers sent to a worker at a time (by default, enough chunks for 4 per worker, and
+            a chunk per results file when grading in this process).
+
+    Returns:
+        int: number of results files graded.
+    '''
+    date = str(date or get_utc_date())
+    
+    # get the results of the set, in order (from their files, or the archive of a past month)
+    results = []
+    index = 0
+    while True:
+        data = month_archive.read_results(date, index=index, root=get_root())
+        if data is None:
+            break
+        if data:
+            results.append((index, month_archive.get_results_path(date, index, get_root()), data))
+        index += 1
+    
+    # the answers of every file, in chunks
+    workers = workers or os.cpu_count() or 1
+    number_of_answers = sum(len(data) for _, _, data in results)
+    if chunk_size is None:
+        chunk_size = max(1, number_of_answers if workers == 1 else -(-number_of_answers // (4*workers)))
+    tasks = []
+    for index, file, data in results:
+        answers = [value[ANSWER] for value in data.values()]
+        tasks += [(date, index, answers[start:start + chunk_size]) for start in range(0, len(answers), chunk_size)]
+    if workers == 1 or len(tasks) <= 1:
+        graded_chunks = [_grade_chunk(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as executor:
+            graded_chunks = list(executor.map(_grade_chunk, tasks))
+    
+    # write every results file, then the leaderboard (in this process only)
+    graded_answers = iter([graded for graded_chunk in graded_chunks for graded in graded_chunk])
+    graded = []
+    for index, file, data in results:
+        write_results(file, data, [next(graded_answers) for _ in data])
+        graded.append(data)
+    
+    if graded:
+        write_leaderboard(date, graded)
         
         # handle averages
-        handle_averages()
\ No newline at end of file
+        handle_averages(date)
+    return len(graded)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Grade the Divide21x results of a day and write its leaderboard.")
+    parser.add_argument("--date", help="date (YYYY-MM-DD) of the results (today if omitted)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processes to grade with (1 by default: in this process; 0 for all cores)")
+    parser.add_argument("--chunk-size", type=int, default=None, help="answers sent to a worker at a time")
+    args = parser.parse_args()
+
+    grade_day(args.date, workers=args.workers, chunk_size=args.chunk_size)
+
+
+if __name__ == "__main__":
+    main()
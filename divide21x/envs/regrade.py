@@ -0,0 +1,169 @@
+'''
+Regrading of past results with a version of the rubric (divide21x/grading/rubrics/<version>.json), e.g. after its
+weights change.
+
+Every challenge of every day in the range is regraded in one go: its ground truth is loaded once, the answers of all
+the models are inspected with the compiled validator and compared to it in a single batch, and the challenges are
+spread over a process pool (each worker owns the results files of its challenges). The results of a packed month are
+read from its archive when their files were removed (divide21x/utils/month_archive.py), and written back to their
+files, which are then read instead of the archive until the month is packed again. The scores of each answer are
+written next to the originals, in its results entry:
+    {"answer": {...}, "proximity": ..., "score": ..., "rubrics": {"<version>": {"proximity": ..., "score": ...}}}
+and the leaderboards of the days and months in the range are rebuilt for the version, in
+divide21x/leaderboards/<year-month>/rubric-<version>/. With promote, the version's scores also replace the original
+ones, the leaderboards themselves are rebuilt, and the version becomes the current rubric (divide21x/grading/rubric.json
+names it), which the daily grading uses from then on.
+
+    python -m divide21x.envs.regrade --rubric v2 --start 2025-11-19 --end 2025-12-19
+    python -m divide21x.envs.regrade --rubric v2 --start 2025-11-19 --promote
+'''
+import argparse
+import datetime
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import divide21x.envs.divide21x_main as divide21x_main
+import divide21x.utils.month_archive as month_archive
+from divide21x.envs.divide21x_main import ANSWER, PROXIMITY, RUBRICS, SCORE, handle_averages, write_leaderboard
+from divide21x.evaluation.batch_comparison import TOTAL, compare_states_batch
+from divide21x.evaluation.evaluator import load_ground_truth_state
+from divide21x.inspection.schema_validator import STATE, STATE_ACTION_SCHEMA, compile_validator
+from divide21x.utils.digits import allow_huge_ints
+from divide21x.utils.util import get_rubric, get_utc_date, set_rubric_version
+
+
+# the state score of an answer that passes the inspection
+STATE_PASSING_SCORE = 40
+
+
+def _get_dates(start_date, end_date):
+    start_date = datetime.date.fromisoformat(str(start_date))
+    end_date = datetime.date.fromisoformat(str(end_date))
+    if end_date < start_date:
+        raise ValueError("end_date must not be before start_date.")
+    return [(start_date + datetime.timedelta(days=n)).isoformat() for n in range((end_date - start_date).days + 1)]
+
+
+def get_results_files(date):
+    '''
+    the results files of the set of the date, in order ([(index, path)]); a file may only be in the archive of its
+    month, it is written back when it is regraded
+    '''
+    files = []
+    index = 0
+    while month_archive.has_results(date, index, divide21x_main.get_root()):
+        files.append((index, month_archive.get_results_path(date, index, divide21x_main.get_root())))
+        index += 1
+    return files
+
+
+def grade_answers(answers, date, index, rubric):
+    '''
+    grades the answers to challenge index of the set of the date with the rubric, like grade_answer() grades each of
+    them (the ground truth is loaded once for all of them).
+
+    Returns:
+        list: (proximity, score) of each answer.
+    '''
+    validator = compile_validator(STATE_ACTION_SCHEMA)
+    passed = [validator.validate({"action": None, "state": answer})[0][STATE] == STATE_PASSING_SCORE for answer in answers]
+    ground_truth_state = load_ground_truth_state(date, index)
+    if ground_truth_state is None:
+        return [(0.0, 0)]*len(answers)
+    totals = compare_states_batch([answer for answer, ok in zip(answers, passed) if ok], ground_truth_state, rubric)[TOTAL]
+    totals = iter(totals.tolist())
+    graded = []
+    for ok in passed:
+        proximity = round(float(max(0, next(totals))), 2) if ok else 0.0
+        # only 100% proximity (meaning exact match to the correct answer) gets a score of 1
+        graded.append((proximity, 1 if proximity == 100 else 0))
+    return graded
+
+
+def _regrade_results(task, version, rubric, promote=False):
+    '''
+    regrades one results file with the rubric and writes the scores of the version into it.
+
+    Returns:
+        dict: {alias: {proximity, score}} of the version.
+    '''
+    date, index, file = task
+    data = month_archive.read_results(date, index=index, root=divide21x_main.get_root())
+    if not data:
+        return {}
+    aliases = list(data)
+    graded = grade_answers([data[alias].get(ANSWER) for alias in aliases], date, index, rubric)
+    scores = {}
+    for alias, (proximity, score) in zip(aliases, graded):
+        value = data[alias]
+        scores[alias] = {PROXIMITY: proximity, SCORE: score}
+        value.setdefault(RUBRICS, {})[version] = scores[alias]
+        if promote:
+            value[PROXIMITY], value[SCORE] = proximity, score
+    os.makedirs(os.path.dirname(file), exist_ok=True)
+    with open(file, 'w') as f, allow_huge_ints():
+        json.dump(data, f, indent=4)
+    return scores
+
+
+def regrade(start_date, end_date, version, workers=None, promote=False):
+    '''
+    regrades the results of every challenge of every date from start_date to end_date (both included, 'YYYY-MM-DD')
+    with the rubric of the version, and rebuilds the leaderboards of those dates and of their months for it.
+
+    Args:
+        workers (int|None): processes to spread the challenges over (os.cpu_count() if None); 1 runs them in this
+            process.
+        promote (bool): the version's scores also replace the original ones, the leaderboards are rebuilt, and the
+            version becomes the current rubric.
+
+    Returns:
+        int: number of results files regraded.
+    '''
+    rubric = get_rubric(version)
+    if rubric is None:
+        raise ValueError(f"There is no rubric {version}.")
+    dates = _get_dates(start_date, end_date)
+    tasks = [(date, index, file) for date in dates for index, file in get_results_files(date)]
+    workers = workers or os.cpu_count() or 1
+    regrade_results = partial(_regrade_results, version=version, rubric=rubric, promote=promote)
+    if workers == 1 or len(tasks) <= 1:
+        results = [regrade_results(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as executor:
+            results = list(executor.map(regrade_results, tasks, chunksize=max(1, len(tasks) // (4*workers))))
+
+    # the leaderboards of the days, then the averages of their months
+    per_date = {}
+    for (date, _, _), scores in zip(tasks, results):
+        if scores:
+            per_date.setdefault(date, []).append(scores)
+    leaderboard_versions = [version, None] if promote else [version]
+    for leaderboard_version in leaderboard_versions:
+        for date, graded in per_date.items():
+            write_leaderboard(date, graded, leaderboard_version)
+        for date in {date[:7]: date for date in per_date}.values():
+            handle_averages(date, leaderboard_version)
+    if promote:
+        set_rubric_version(version)
+    return len(tasks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Regrade past Divide21x results with a version of the rubric.")
+    parser.add_argument("--rubric", required=True, help="rubric version (divide21x/grading/rubrics/<version>.json)")
+    parser.add_argument("--start", help="first date (YYYY-MM-DD) of the range (today if omitted)")
+    parser.add_argument("--end", help="last date (YYYY-MM-DD) of the range, the start date if omitted")
+    parser.add_argument("--workers", type=int, default=None, help="processes to use (default: all cores)")
+    parser.add_argument("--promote", action="store_true",
+                        help="make the version's scores the scores of the results, and rebuild the leaderboards")
+    args = parser.parse_args()
+
+    start = args.start or str(get_utc_date())
+    count = regrade(start, args.end or start, args.rubric, workers=args.workers, promote=args.promote)
+    print(f"regraded {count} results files with rubric {args.rubric}")
+
+
+if __name__ == "__main__":
+    main()
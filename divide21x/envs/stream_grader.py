@@ -0,0 +1,209 @@
+'''
+Streaming grading of JSONL submissions: one submission per line in, one graded record per line out, so any number of
+samples (or external submitters) can be graded without loading a results file into memory or rewriting it.
+
+A submission is a JSON object with the answer (the predicted state) and, optionally, the challenge it answers:
+    {"model": "GPT-4o", "answer": {...}, "date": "2025-12-19", "index": 0}
+Every field is kept, the graded record adds the proximity and the score:
+    {"model": "GPT-4o", "answer": {...}, "date": "2025-12-19", "index": 0, "proximity": 100.0, "score": 1}
+A line that is not a JSON object, names a challenge that is not a YYYY-MM-DD date and an index, or names one that
+does not exist (or cannot be graded) gives {"line": <line number>, "error": <reason>} instead, and the stream goes on.
+
+Records are read, graded and written one at a time and the output is flushed as it goes, so memory stays bounded
+whatever the size of the input and a slow reader of the output simply slows down the grading. What the submissions
+share is loaded once per stream (the ground truths of the last challenges they answered, and the rubric), and their
+log is saved every LOG_EVERY records rather than once per record.
+
+    python -m divide21x.envs.stream_grader submissions.jsonl -o graded.jsonl
+    cat submissions.jsonl | python -m divide21x.envs.stream_grader --date 2025-12-19 > graded.jsonl
+'''
+import argparse
+import datetime
+import json
+import re
+import sys
+from functools import lru_cache
+import divide21x.envs.divide21x_main as divide21x_main
+from divide21x.envs.divide21x_main import ANSWER, PROXIMITY, SCORE, grade_answer, grade_with_ground_truth
+from divide21x.evaluation.evaluator import load_ground_truth_state
+from divide21x.utils.digits import allow_huge_ints
+from divide21x.utils.logger import EpisodeLogger
+from divide21x.utils.util import get_challenge_id, get_rubric, get_utc_date
+
+
+# record fields
+DATE = 'date'
+INDEX = 'index'
+LINE = 'line'
+ERROR = 'error'
+# graded records between two saves of the log of a stream
+LOG_EVERY = 1000
+# challenges whose ground truth a stream keeps loaded
+GROUND_TRUTHS = 16
+DATE_FORMAT = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+
+class SubmissionGrader:
+    '''
+    grades submissions one at a time like grade_answer(), with what they share loaded once: the rubric and the ground
+    truths of the last GROUND_TRUTHS challenges. They log to one deferred logger, saved every LOG_EVERY submissions
+    and on close().
+    '''
+    def __init__(self):
+        self.logger = EpisodeLogger(divide21x_main.BASE_DIR, deferred=True)
+        self.rubric = get_rubric()
+        self.load_ground_truth_state = lru_cache(maxsize=GROUND_TRUTHS)(load_ground_truth_state)
+
+    def grade(self, answer, date=None, index=0):
+        '''
+        Returns:
+            tuple: (proximity, score) of the answer to challenge index of the set of the date (today by default).
+                Raises ValueError if there is no such challenge.
+        '''
+        date = str(date or get_utc_date())
+        ground_truth_state = self.load_ground_truth_state(date, index)
+        if ground_truth_state is None:
+            raise ValueError(f"no challenge {get_challenge_id(date, index)}")
+        graded = grade_with_ground_truth(answer, date, index, ground_truth_state, self.rubric, self.logger)
+        if len(self.logger.episode_log) >= LOG_EVERY:
+            self.save()
+        return graded
+
+    def save(self):
+        '''
+        saves the log of the submissions graded since the last save
+        '''
+        self.logger.save_episode(force=True)
+        self.logger.episode_log = []
+
+    def close(self):
+        self.save()
+
+
+def check_challenge(submission):
+    '''
+    Returns:
+        str|None: why the challenge the submission names (its optional date and index) cannot be one, or None.
+    '''
+    date = submission.get(DATE)
+    if date is not None:
+        if not isinstance(date, str) or not DATE_FORMAT.fullmatch(date):
+            return "'date' must be a YYYY-MM-DD string"
+        try:
+            datetime.date.fromisoformat(date)
+        except ValueError:
+            return f"'date' is not a date: {date}"
+    index = submission.get(INDEX)
+    if index is not None and (isinstance(index, bool) or not isinstance(index, int) or index < 0):
+        return "'index' must be a non-negative integer"
+    return None
+
+
+def read_submissions(lines):
+    '''
+    parses a JSONL stream lazily, skipping blank lines.
+
+    Yields:
+        tuple: (line number, submission dict or None, error message or None).
+    '''
+    for line_number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            with allow_huge_ints():
+                submission = json.loads(line)
+        except ValueError as e:
+            yield line_number, None, f"invalid JSON: {e}"
+            continue
+        if not isinstance(submission, dict):
+            yield line_number, None, "a submission must be a JSON object"
+            continue
+        error = check_challenge(submission)
+        if error is not None:
+            yield line_number, None, error
+            continue
+        yield line_number, submission, None
+
+
+def grade_submission(submission, date=None, index=0, grader=None):
+    '''
+    grades one submission, against its own challenge if it names one (date and index), the given one otherwise.
+
+    Args:
+        grader (SubmissionGrader|None): grader shared by the submissions of a stream; grade_answer() if None.
+
+    Returns:
+        dict: the submission with its proximity and score.
+    '''
+    grade = grade_answer if grader is None else grader.grade
+    if submission.get(INDEX) is not None:
+        index = submission[INDEX]
+    proximity, score = grade(submission.get(ANSWER), submission.get(DATE) or date, index)
+    return {**submission, PROXIMITY: proximity, SCORE: score}
+
+
+def grade_stream(lines, date=None, index=0):
+    '''
+    grades a JSONL stream of submissions lazily, in order.
+
+    Yields:
+        dict: the graded record of each submission (or the error of each line that is not one, or cannot be graded).
+    '''
+    grader = SubmissionGrader()
+    try:
+        for line_number, submission, error in read_submissions(lines):
+            if error is None:
+                try:
+                    record = grade_submission(submission, date, index, grader)
+                except Exception as e:
+                    error = str(e) or type(e).__name__
+            if error is not None:
+                record = {LINE: line_number, ERROR: error}
+            yield record
+    finally:
+        grader.close()
+
+
+def write_records(records, out, flush_every=1):
+    '''
+    writes records to a stream as JSONL, flushing every flush_every records.
+
+    Returns:
+        int: number of records written.
+    '''
+    count = 0
+    for record in records:
+        with allow_huge_ints():
+            out.write(json.dumps(record, separators=(',', ':')) + '\n')
+        count += 1
+        if count % flush_every == 0:
+            out.flush()
+    out.flush()
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Grade a JSONL stream of Divide21x submissions.")
+    parser.add_argument("input", nargs="?", default="-", help="JSONL file of submissions (stdin if not given or -)")
+    parser.add_argument("-o", "--output", default="-", help="JSONL file of graded records (stdout if not given or -)")
+    parser.add_argument("--date", help="YYYY-MM-DD challenge of the submissions that do not name one (today by default)")
+    parser.add_argument("--index", type=int, default=0, help="challenge of the set of the date (0 by default)")
+    parser.add_argument("--flush-every", type=int, default=1, help="records between flushes of the output")
+    args = parser.parse_args()
+
+    source = sys.stdin if args.input == "-" else open(args.input, "r")
+    sink = sys.stdout if args.output == "-" else open(args.output, "w")
+    try:
+        write_records(grade_stream(source, args.date, args.index), sink, max(1, args.flush_every))
+    except BrokenPipeError:
+        # the reader of the output went away (e.g. `| head`), nothing left to grade for
+        pass
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if sink is not sys.stdout:
+            sink.close()
+
+
+if __name__ == "__main__":
+    main()
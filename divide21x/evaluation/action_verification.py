@@ -0,0 +1,400 @@
+'''
+Batch verification of (z, a, o) triples: does applying action a to state z give state o?
+
+This is what Evaluator.action_generates_state checks for one submission, for many of them at once (e.g. to validate
+synthetic data). The triples are taken in chunks, and the states of each chunk are encoded into flat arrays at once
+(like divide21x/evaluation/batch_comparison.py encodes answers), without packing them one by one:
+    - every z goes into one Divide21BatchSimulator, which applies all the actions in a single vectorized step,
+    - every o is compared to its generated state on the arrays, with the operations (and float roundings) of
+      compare_states(o, generated): the static and dynamic numbers by their digits, the Sørensen–Dice coefficients
+      over 'a' and 'p' by comparing bitmasks and player rows, and the player turn.
+The triples the arrays cannot hold as the kernel and compare_states would read them (odd keys or types, states
+without an 'a' entry for every rindex, a step the batch simulator cannot apply, ...) are verified one at a time, with
+the transition kernel and compare_states' own scoring, so every flag and score is exactly the one the scalar code
+gives.
+
+A triple whose z cannot be simulated (it does not pass inspection) is not verified: (False, 0.0).
+'''
+from itertools import chain
+import numpy as np
+from divide21x.evaluation.batch_comparison import (
+    INT64_MAX, INT64_MIN, PLAYER_VALUES, _NotPlain, _dice, _digit_list_bits, _is_plain, _is_plain_shape
+)
+from divide21x.evaluation.evaluator import STATE_FIELDS, Evaluator
+from divide21x.simulator.batch_simulator import NONE, Divide21BatchSimulator
+from divide21x.simulator.state_codec import DIGIT_BITS, PackedState
+from divide21x.simulator.transition_kernel import apply_action, parse_action
+from divide21x.utils.util import get_rubric
+
+
+# triples verified together (bounds the size of the player comparison arrays)
+CHUNK_SIZE = 8192
+# numbers with more bits than this are left to the scalar code (str() refuses ints past 4300 digits)
+MAX_NUMBER_BITS = 14000
+
+
+def _pack(state):
+    if isinstance(state, PackedState):
+        return state
+    try:
+        return PackedState.from_state(state)
+    except ValueError:
+        return None
+
+
+def _fits(state):
+    '''
+    the checks on a state (on top of _is_plain_shape) that the arrays rely on
+    '''
+    return state["s"].bit_length() <= MAX_NUMBER_BITS and state["d"].bit_length() <= MAX_NUMBER_BITS
+
+
+def _players_fit(state):
+    '''
+    True if the players of a state that passes _is_plain() are int rows that fit in 64 bits
+    '''
+    for player in state["p"]:
+        for value in PLAYER_VALUES(player):
+            if type(value) not in (int, bool) or not INT64_MIN <= value <= INT64_MAX:
+                return False
+    return True
+
+
+def _encode_numbers(numbers):
+    '''
+    digits of non-negative integers by rindex (column 0 is the units digit), zero padded, and their lengths
+    '''
+    strings = list(map(str, numbers))
+    lengths = np.fromiter(map(len, strings), dtype=np.int64, count=len(strings))
+    digits = np.zeros((len(strings), int(lengths.max(initial=1))), dtype=np.int8)
+    flat = np.frombuffer("".join(strings).encode(), dtype=np.uint8).astype(np.int8) - ord("0")
+    # position of each digit from the left, then its rindex
+    starts = np.repeat(np.cumsum(lengths) - lengths, lengths)
+    columns = np.repeat(lengths, lengths) - 1 - (np.arange(len(flat)) - starts)
+    digits[np.repeat(np.arange(len(strings)), lengths), columns] = flat
+    return digits, lengths
+
+
+def _digit_lists_bits(digit_lists):
+    '''
+    the bitmasks of lists of unique digits, -1 for the lists that are not one
+        Raises _NotPlain if some list cannot be hashed (it is not a list of digits either).
+    '''
+    digits = list(chain.from_iterable(digit_lists))
+    try:
+        if set(map(type, digits)) - {int, bool}:
+            raise OverflowError()
+        digits = np.fromiter(digits, dtype=np.int64, count=len(digits))
+    except OverflowError:
+        # lists with odd elements, one at a time
+        try:
+            digit_tuples = list(map(tuple, digit_lists))
+            bits_of = {digit_tuple: _digit_list_bits(digit_tuple) for digit_tuple in set(digit_tuples)}
+        except TypeError:
+            raise _NotPlain()
+        return np.fromiter(map(bits_of.__getitem__, digit_tuples), dtype=np.int64, count=len(digit_tuples))
+    lengths = np.fromiter(map(len, digit_lists), dtype=np.int64, count=len(digit_lists))
+    list_ids = np.repeat(np.arange(len(digit_lists)), lengths)
+    in_range = (digits >= 0) & (digits <= 9)
+    digits = np.where(in_range, digits, 0)
+    # a digit twice in a list, or one that is not a digit
+    invalid = np.zeros(len(digit_lists), dtype=bool)
+    invalid[list_ids[~in_range]] = True
+    counts = np.bincount(list_ids*10 + digits, minlength=10*len(digit_lists)).reshape(-1, 10)
+    invalid |= (counts > 1).any(axis=1)
+    bits = np.bincount(list_ids, weights=1 << digits, minlength=len(digit_lists)).astype(np.int64)
+    bits[invalid] = -1
+    return bits
+
+
+def _encode_states(states):
+    '''
+    the flat arrays of states that all pass _is_plain_shape and _fits, and which of them the arrays hold as their
+    packed form would be (their rindexes are unique and inside the dynamic number, and their digit lists are sets of
+    digits).
+        Raises _NotPlain if some 'a' key, digit list or player cannot go into the arrays.
+    '''
+    n = len(states)
+    static_digits, static_length = _encode_numbers([state["s"] for state in states])
+    dynamic_digits, dynamic_length = _encode_numbers([state["d"] for state in states])
+    key_counts = np.fromiter((len(state["a"]) for state in states), dtype=np.int64, count=n)
+    player_counts = np.fromiter((len(state["p"]) for state in states), dtype=np.int64, count=n)
+    keys = []
+    digit_lists = []
+    players = []
+    for state in states:
+        keys.extend(state["a"])
+        digit_lists.extend(state["a"].values())
+        players.extend(state["p"])
+
+    # (1) 'a' keys into rindexes (int keys as they are, str keys through their canonical string form)
+    key_types = set(map(type, keys))
+    if key_types - {int, str}:
+        raise _NotPlain()
+    if key_types == {int}:
+        try:
+            rindexes = np.fromiter(keys, dtype=np.int64, count=len(keys))
+        except OverflowError:
+            raise _NotPlain()
+        if np.any(rindexes < 0):
+            raise _NotPlain()
+    else:
+        try:
+            strings = np.array(list(map(str, keys)), dtype=str)
+        except ValueError:
+            raise _NotPlain()
+        lengths = np.char.str_len(strings)
+        canonical = np.char.isdigit(strings) & (lengths < 19) & ((lengths == 1) | ~np.char.startswith(strings, "0"))
+        if not canonical.all() or not "".join(strings.tolist()).isascii():
+            raise _NotPlain()
+        rindexes = np.fromiter(map(int, keys), dtype=np.int64, count=len(keys))
+
+    # (2) digit lists into bitmasks (-1 for a list that is not one of unique digits)
+    if set(map(type, digit_lists)) - {list}:
+        raise _NotPlain()
+    bits = _digit_lists_bits(digit_lists)
+
+    # (3) players into rows of (i, c, m) (dictionaries with exactly the keys i, c and m, and 64-bit int values)
+    if set(map(type, players)) - {dict} or set(map(len, players)) - {3}:
+        raise _NotPlain()
+    try:
+        values = list(chain.from_iterable(map(PLAYER_VALUES, players)))
+    except KeyError:
+        raise _NotPlain()
+    if set(map(type, values)) - {int, bool}:
+        raise _NotPlain()
+    try:
+        values = np.fromiter(values, dtype=np.int64, count=len(values)).reshape(-1, 3)
+    except OverflowError:
+        raise _NotPlain()
+
+    # the padded arrays
+    key_rows = np.repeat(np.arange(n), key_counts)
+    valid = np.ones(n, dtype=bool)
+    valid[key_rows[(bits < 0) | (rindexes >= dynamic_length[key_rows])]] = False
+    order = np.lexsort((rindexes, key_rows))
+    repeated = (np.diff(key_rows[order]) == 0) & (np.diff(rindexes[order]) == 0)
+    valid[key_rows[order][1:][repeated]] = False
+    placed = valid[key_rows]
+    present = np.zeros(dynamic_digits.shape, dtype=bool)
+    available_bits = np.zeros(dynamic_digits.shape, dtype=np.int64)
+    present[key_rows[placed], rindexes[placed]] = True
+    available_bits[key_rows[placed], rindexes[placed]] = bits[placed]
+
+    player_rows = np.repeat(np.arange(n), player_counts)
+    player_columns = np.arange(len(player_rows)) - np.repeat(np.cumsum(player_counts) - player_counts, player_counts)
+    player_values = np.zeros((n, int(player_counts.max(initial=1)), 3), dtype=np.int64)
+    player_values[player_rows, player_columns] = values
+
+    t = np.fromiter((state["t"] for state in states), dtype=np.int64, count=n)
+    return {
+        "static_digits": static_digits, "static_length": static_length, "dynamic_digits": dynamic_digits,
+        "dynamic_length": dynamic_length, "present": present, "available_bits": available_bits,
+        "key_counts": key_counts, "players": player_values, "player_counts": player_counts, "t": t, "valid": valid
+    }
+
+
+def _passes_inspection(encoded):
+    '''
+    state_passes_inspection on the encoded states
+    '''
+    players = encoded["players"]
+    player_counts = encoded["player_counts"]
+    in_state = np.arange(players.shape[1]) < player_counts[:, None]
+    ids, scores, turn_flags = players[:, :, 0], players[:, :, 1], players[:, :, 2]
+    score_bound = 9*encoded["static_length"] + 8
+    positive = lambda digits, length: (length > 1) | (digits[:, 0] > 0)
+    return (
+        positive(encoded["static_digits"], encoded["static_length"])
+        & positive(encoded["dynamic_digits"], encoded["dynamic_length"])
+        & (encoded["key_counts"] > 0) & (player_counts > 0)
+        & ((~in_state) | ((ids >= 0) & (ids < player_counts[:, None]))).all(axis=1)
+        & ((~in_state) | (np.abs(scores) <= score_bound[:, None])).all(axis=1)
+        & ((~in_state) | ((turn_flags >= 0) & (turn_flags <= 1))).all(axis=1)
+        & (encoded["t"] >= 0) & (encoded["t"] < player_counts)
+    )
+
+
+def _encode_actions(actions):
+    '''
+    the actions as the arrays Divide21BatchSimulator.step_arrays() takes
+    '''
+    division, digit, rindex = zip(*map(parse_action, actions))
+    as_array = lambda values: np.array([NONE if value is None else value for value in values], dtype=np.int64)
+    # a rindex past int64 is outside every number, like the largest one
+    return as_array(division), as_array(digit), as_array([None if value is None else min(value, INT64_MAX) for value in rindex])
+
+
+def _select(encoded, rows):
+    return {name: array[rows] for name, array in encoded.items()}
+
+
+def _simulate(encoded, actions):
+    '''
+    steps the encoded states (that pass inspection and have an 'a' entry for every rindex) in one batch.
+
+    Returns:
+        Divide21BatchSimulator: the simulator holding the generated states (its failed rows are the ones the step could
+            not be applied to).
+    '''
+    available = (encoded["available_bits"][:, :, None] & DIGIT_BITS) != 0
+    players = encoded["players"]
+    batch_simulator = Divide21BatchSimulator()
+    batch_simulator.load_arrays(
+        encoded["static_digits"], encoded["static_length"], encoded["dynamic_digits"].copy(),
+        encoded["dynamic_length"].copy(), available, players[:, :, 0], players[:, :, 1].copy(), encoded["player_counts"],
+        encoded["t"].copy()
+    )
+    batch_simulator.step_arrays(*_encode_actions(actions))
+    return batch_simulator
+
+
+def _numbers_equal(digits1, length1, digits2, length2):
+    width = max(digits1.shape[1], digits2.shape[1])
+    pad = lambda digits: np.pad(digits, ((0, 0), (0, width - digits.shape[1])))
+    return (length1 == length2) & (pad(digits1) == pad(digits2)).all(axis=1)
+
+
+def _score_generated(encoded, batch_simulator, rubric):
+    '''
+    the points of every field of compare_states(o, generated), for the encoded states o and the states the batch
+    simulator generated
+    '''
+    n = batch_simulator.size
+    points = rubric["state"]
+    scores = {field: np.zeros(n, dtype=np.float64) for field in STATE_FIELDS}
+
+    # (1) static_number, (2) dynamic_number
+    scores["s"][_numbers_equal(
+        encoded["static_digits"], encoded["static_length"], batch_simulator.static_digits, batch_simulator.static_length
+    )] = points["s"]
+    scores["d"][_numbers_equal(
+        encoded["dynamic_digits"], encoded["dynamic_length"], batch_simulator.dynamic_digits, batch_simulator.dynamic_length
+    )] = points["d"]
+
+    # (3) available_digits_per_rindex (the generated states have an entry for every rindex)
+    generated_bits = (batch_simulator.available * DIGIT_BITS.astype(np.int64)).sum(axis=2)
+    width = min(encoded["available_bits"].shape[1], generated_bits.shape[1])
+    in_generated = np.arange(width) < batch_simulator.dynamic_length[:, None]
+    matching = (
+        encoded["present"][:, :width] & in_generated & (encoded["available_bits"][:, :width] == generated_bits[:, :width])
+    ).sum(axis=1)
+    scores["a"] = _dice(matching, encoded["key_counts"], batch_simulator.dynamic_length)*points["a"]
+
+    # (4) players: the players of o that are players of the generated state (m is whether it is their turn)
+    generated_players = np.stack([
+        batch_simulator.player_ids, batch_simulator.scores,
+        (np.arange(batch_simulator.scores.shape[1]) == batch_simulator.player_turn[:, None]).astype(np.int64)
+    ], axis=2)
+    generated_in_state = np.arange(generated_players.shape[1]) < batch_simulator.number_of_players[:, None]
+    players = encoded["players"]
+    in_state = np.arange(players.shape[1]) < encoded["player_counts"][:, None]
+    found = ((players[:, :, None, :] == generated_players[:, None, :, :]).all(axis=3) & generated_in_state[:, None, :]).any(axis=2)
+    matching = (found & in_state).sum(axis=1)
+    scores["p"] = _dice(matching, encoded["player_counts"], batch_simulator.number_of_players)*points["p"]
+
+    # (5) player_turn
+    scores["t"][encoded["t"] == batch_simulator.player_turn] = points["t"]
+    return scores
+
+
+def _generate_state(state, action):
+    '''
+    the state the transition kernel generates, or None if the state cannot be simulated
+    '''
+    if isinstance(state, PackedState):
+        state = state.to_state()
+    try:
+        generated_state, reward, terminated = apply_action(state, action)
+    except (ValueError, IndexError, KeyError, TypeError):
+        return None
+    return PackedState.from_state(generated_state)
+
+
+def _verify_one(state, action, generated_state, rubric):
+    '''
+    the unrounded similarity score of compare_states(generated_state, kernel(state, action)), 0 if the state cannot be
+    simulated
+    '''
+    generated = _generate_state(state, action)
+    if generated is None or not isinstance(generated_state, (dict, PackedState)):
+        return 0
+    packed = _pack(generated_state)
+    if packed is not None:
+        return sum(Evaluator.packed_state_field_scores(packed, generated, rubric).values())
+    if generated_state.keys() != generated.to_state().keys():
+        return 0
+    return sum(Evaluator._state_dict_field_scores(generated_state, generated.to_state(), rubric).values())
+
+
+def _encode_plain(states, rows):
+    '''
+    encodes the states of the rows that pass _is_plain_shape and _fits (only the ones that also pass _is_plain, if
+    some of them cannot go into the arrays).
+
+    Returns:
+        tuple(np.ndarray, dict): the rows encoded and their arrays.
+    '''
+    rows = [row for row in rows if _is_plain_shape(states[row]) and _fits(states[row])]
+    try:
+        return np.array(rows, dtype=np.int64), _encode_states([states[row] for row in rows])
+    except _NotPlain:
+        rows = [row for row in rows if _is_plain(states[row]) and _players_fit(states[row])]
+        return np.array(rows, dtype=np.int64), _encode_states([states[row] for row in rows])
+
+
+def _verify_chunk(triples, rubric):
+    '''
+    the unrounded similarity scores of a chunk of triples
+    '''
+    n = len(triples)
+    states = [z for z, a, o in triples]
+    actions = [a for z, a, o in triples]
+    generated_states = [o for z, a, o in triples]
+    total = np.zeros(n, dtype=np.float64)
+    fast = np.zeros(n, dtype=bool)
+
+    # the triples whose z the batch simulator can hold, and whose o the arrays can hold
+    rows, encoded_states = _encode_plain(states, range(n))
+    simulated = (
+        encoded_states["valid"] & (encoded_states["key_counts"] == encoded_states["dynamic_length"])
+        & _passes_inspection(encoded_states)
+    )
+    rows, encoded_states = rows[simulated], _select(encoded_states, simulated)
+    generated_rows, encoded_generated = _encode_plain(generated_states, rows.tolist())
+    keep = np.isin(rows, generated_rows[encoded_generated["valid"]])
+    rows, encoded_states = rows[keep], _select(encoded_states, keep)
+    encoded_generated = _select(encoded_generated, np.isin(generated_rows, rows))
+    if len(rows):
+        batch_simulator = _simulate(encoded_states, [actions[row] for row in rows.tolist()])
+        scores = _score_generated(encoded_generated, batch_simulator, rubric)
+        # the fields add up in the same order as in compare_states
+        for field in STATE_FIELDS:
+            total[rows] = total[rows] + scores[field]
+        # the rows the step failed for are left to the kernel
+        fast[rows[~batch_simulator.failed]] = True
+
+    # the others, one at a time
+    for row in np.flatnonzero(~fast).tolist():
+        total[row] = _verify_one(states[row], actions[row], generated_states[row], rubric)
+    return total
+
+
+def verify_actions(triples, rubric=None):
+    '''
+    checks whether each action generates its state, like Evaluator.action_generates_state does for one of them.
+        triples:    (z, a, o) triples: the state the action is applied to, the action and the state it should give
+                    (states as dictionaries or PackedState)
+        rubric:     the rubric to score the states with (get_rubric() by default)
+
+    Returns:
+        tuple(np.ndarray, np.ndarray): whether o is the generated state (bool), and its similarity score to it
+            (0-100, rounded to 2 decimals like compare_states), for each triple.
+    '''
+    rubric = rubric or get_rubric()
+    triples = list(triples)
+    totals = [
+        _verify_chunk(triples[start:start + CHUNK_SIZE], rubric).tolist() for start in range(0, len(triples), CHUNK_SIZE)
+    ]
+    similarity = np.array([round(value, 2) for value in chain.from_iterable(totals)], dtype=np.float64)
+    return similarity == 100.0, similarity
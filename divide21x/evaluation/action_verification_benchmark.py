@@ -0,0 +1,73 @@
+'''
+Throughput of verify_actions(), in triples/sec, on synthetic (z, a, o) triples whose o is the state the kernel gives,
+against verifying them one at a time (the transition kernel and compare_states).
+
+    python -m divide21x.evaluation.action_verification_benchmark --triples 100000 --static-digits 12 --players 4
+'''
+import argparse
+import random
+import time
+from divide21x.challenge_maker.state_synthesizer import synthesize_state
+from divide21x.evaluation.action_verification import verify_actions
+from divide21x.evaluation.evaluator import Evaluator
+from divide21x.simulator.transition_kernel import apply_action
+
+
+def make_triples(count, static_digits, players, seed=23):
+    '''
+    Returns:
+        list: count (z, a, o) triples, o being the state the kernel gives for (z, a).
+    '''
+    rng = random.Random(seed)
+    triples = []
+    while len(triples) < count:
+        state = synthesize_state(rng, static_digits, players)
+        division = rng.random() < 0.5
+        action = {"v": division, "g": rng.randint(0, 9), "r": None if division else rng.randint(0, len(state["a"]) - 1)}
+        try:
+            next_state = apply_action(state, action)[0]
+        except ValueError:
+            continue
+        triples.append((state, action, next_state))
+    return triples
+
+
+def measure(triples):
+    '''
+    Returns:
+        float: triples verified per second by verify_actions().
+    '''
+    start = time.perf_counter()
+    verify_actions(triples)
+    return len(triples)/(time.perf_counter() - start)
+
+
+def measure_one_at_a_time(triples):
+    '''
+    Returns:
+        float: triples verified per second with the kernel and compare_states, one at a time.
+    '''
+    evaluator = Evaluator()
+    start = time.perf_counter()
+    for state, action, next_state in triples:
+        evaluator.compare_states(next_state, apply_action(state, action)[0])
+    return len(triples)/(time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="verify_actions() throughput vs. verifying triples one at a time.")
+    parser.add_argument("--triples", type=int, default=100000)
+    parser.add_argument("--static-digits", type=int, default=12)
+    parser.add_argument("--players", type=int, default=4)
+    parser.add_argument("--one-at-a-time", type=int, default=5000, help="triples verified one at a time")
+    args = parser.parse_args()
+
+    triples = make_triples(args.triples, args.static_digits, args.players)
+    print(f"{'mode':<12} {'triples':>8} {'triples/sec':>12}")
+    print(f"{'batch':<12} {len(triples):>8} {measure(triples):>12.0f}")
+    sample = triples[:args.one_at_a_time]
+    print(f"{'one-by-one':<12} {len(sample):>8} {measure_one_at_a_time(sample):>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+'''
+Vectorized Evaluator.compare_states for many answers against one ground truth (e.g. every model, or every sample of
+a model, answering the same challenge).
+
+The answers are encoded into flat arrays once:
+    s, d, t:    whether each answer has the static number, the dynamic number and the player turn of the truth
+    a:          one (answer, rindex, digits bitmask) entry per key of each 'a' dictionary
+    p:          one (answer, in the truth) entry per player
+and every field is scored for all of them with NumPy: the Sørensen–Dice coefficients over 'a' and 'p' become a
+comparison against the truth and a count per answer, instead of sorting digit lists and an O(n²) membership test over
+the players of each answer. Digit lists are turned into bitmasks once per distinct list, and players are looked up in
+a set of the players of the truth.
+
+The answers the arrays cannot hold as compare_states would read them (wrong keys or types, repeated rindexes or
+digits, rindexes outside the dynamic number, ...) are scored by the scalar code itself, so every score is exactly the
+one compare_states gives.
+'''
+from operator import itemgetter
+import numpy as np
+from divide21x.evaluation.evaluator import STATE_FIELDS, Evaluator
+from divide21x.simulator.state_codec import ABSENT, PackedState
+from divide21x.simulator.transition_kernel import STATE_KEYS
+from divide21x.utils.digits import number_length
+from divide21x.utils.util import get_rubric
+
+
+TOTAL = 'total'
+INT64_MIN = -(1 << 63)
+INT64_MAX = (1 << 63) - 1
+PLAYER_VALUES = itemgetter("i", "c", "m")
+
+
+class _NotPlain(Exception):
+    '''
+    raised when the flat arrays cannot hold some answer of the batch
+    '''
+
+
+def _is_canonical_key(key):
+    '''
+    True for the int keys and the canonical ASCII string keys of 'a' that fit in 64 bits
+    '''
+    key = str(key) if type(key) is int else key
+    return type(key) is str and key.isascii() and key.isdigit() and len(key) < 19 and (key == "0" or key[0] != "0")
+
+
+def _is_plain_shape(answer):
+    '''
+    the checks on the top level of an answer that _encode relies on
+    '''
+    if type(answer) is not dict or answer.keys() != STATE_KEYS:
+        return False
+    s, d, t = answer["s"], answer["d"], answer["t"]
+    return (
+        type(s) is int and type(d) is int and s >= 0 and d >= 0 and type(t) in (int, bool) and INT64_MIN <= t <= INT64_MAX
+        and type(answer["a"]) is dict and type(answer["p"]) is list
+    )
+
+
+def _is_plain(answer):
+    '''
+    True if the flat arrays can hold the answer (its digits and rindexes may still be out of range, which is checked
+    on the arrays)
+    '''
+    if not _is_plain_shape(answer):
+        return False
+    try:
+        for key, digit_list in answer["a"].items():
+            if not _is_canonical_key(key) or type(digit_list) is not list:
+                return False
+            hash(tuple(digit_list))
+        for player in answer["p"]:
+            if type(player) is not dict or len(player) != 3:
+                return False
+            hash(PLAYER_VALUES(player))
+    except (KeyError, TypeError, ValueError):
+        return False
+    return True
+
+
+def _digit_list_bits(digits):
+    '''
+    the bitmask of a list of unique digits, -1 if it is not one
+    '''
+    bits = 0
+    for digit in digits:
+        if type(digit) not in (int, bool) or not 0 <= digit <= 9 or bits & (1 << digit):
+            return -1
+        bits |= 1 << digit
+    return bits
+
+
+def _encode(answers, truth, truth_players):
+    '''
+    the flat arrays of answers that all pass _is_plain_shape.
+        Raises _NotPlain if some 'a' key, digit list or player cannot go into the arrays.
+    '''
+    n = len(answers)
+    truth_s, truth_d, truth_t = truth["s"], truth["d"], truth["t"]
+    s_equal = np.fromiter((answer["s"] == truth_s for answer in answers), dtype=bool, count=n)
+    d_equal = np.fromiter((answer["d"] == truth_d for answer in answers), dtype=bool, count=n)
+    t_equal = np.fromiter((answer["t"] == truth_t for answer in answers), dtype=bool, count=n)
+    d_lengths = np.fromiter((number_length(answer["d"]) for answer in answers), dtype=np.int64, count=n)
+    key_counts = np.fromiter((len(answer["a"]) for answer in answers), dtype=np.int64, count=n)
+    player_counts = np.fromiter((len(answer["p"]) for answer in answers), dtype=np.int64, count=n)
+    keys = []
+    digit_lists = []
+    players = []
+    for answer in answers:
+        keys.extend(answer["a"])
+        digit_lists.extend(answer["a"].values())
+        players.extend(answer["p"])
+
+    # (1) 'a' keys into rindexes (through their string form, which is canonical for int keys)
+    if set(map(type, keys)) - {int, str}:
+        raise _NotPlain()
+    try:
+        strings = np.array(list(map(str, keys)), dtype=str)
+    except ValueError:
+        raise _NotPlain()
+    lengths = np.char.str_len(strings)
+    canonical = np.char.isdigit(strings) & (lengths < 19) & ((lengths == 1) | ~np.char.startswith(strings, "0"))
+    if not canonical.all() or not "".join(strings.tolist()).isascii():
+        raise _NotPlain()
+    rindexes = np.fromiter(map(int, keys), dtype=np.int64, count=len(keys))
+
+    # (2) digit lists into bitmasks (-1 for a list that is not one of unique digits)
+    if set(map(type, digit_lists)) - {list}:
+        raise _NotPlain()
+    try:
+        digit_tuples = list(map(tuple, digit_lists))
+        bits_of = {digits: _digit_list_bits(digits) for digits in set(digit_tuples)}
+    except TypeError:
+        raise _NotPlain()
+    bits = np.fromiter(map(bits_of.__getitem__, digit_tuples), dtype=np.int64, count=len(digit_tuples))
+
+    # (3) players into whether they are players of the truth (dictionaries with 3 keys, i, c and m among them)
+    if set(map(type, players)) - {dict} or set(map(len, players)) - {3}:
+        raise _NotPlain()
+    try:
+        in_truth = np.fromiter(
+            map(truth_players.__contains__, map(PLAYER_VALUES, players)), dtype=bool, count=len(players)
+        )
+    except (KeyError, TypeError):
+        raise _NotPlain()
+
+    return {
+        "s_equal": s_equal, "d_equal": d_equal, "t_equal": t_equal, "d_lengths": d_lengths, "key_counts": key_counts,
+        "rindexes": rindexes, "bits": bits, "player_counts": player_counts, "in_truth": in_truth
+    }
+
+
+def _dice(matching, length1, length2):
+    '''
+    the Sørensen–Dice coefficient times the length penalty, with the operations (and float roundings) of compare_states
+    '''
+    total = (length1 + length2).astype(np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        similarity_match = (2*matching).astype(np.float64)/total
+        length_penalty = 1 - (np.abs(length1 - length2).astype(np.float64)/total)
+    return similarity_match*length_penalty
+
+
+def _score_encoded(encoded, packed_truth, rubric):
+    '''
+    the points of every field of the encoded answers, and which of them the arrays cannot score (to be scored by the
+    scalar code)
+    '''
+    n = len(encoded["s_equal"])
+    points = rubric["state"]
+    scores = {field: np.zeros(n, dtype=np.float64) for field in STATE_FIELDS}
+
+    # (1) static_number, (2) dynamic_number
+    scores["s"][encoded["s_equal"]] = points["s"]
+    scores["d"][encoded["d_equal"]] = points["d"]
+
+    # (3) available_digits_per_rindex
+    key_rows = np.repeat(np.arange(n), encoded["key_counts"])
+    rindexes = encoded["rindexes"]
+    bits = encoded["bits"]
+    # digit lists that are not sets of digits, rindexes outside d, and repeated rindexes (e.g. 0 and "0")
+    invalid = np.zeros(n, dtype=bool)
+    invalid[key_rows[(bits < 0) | (rindexes >= encoded["d_lengths"][key_rows])]] = True
+    order = np.lexsort((rindexes, key_rows))
+    repeated = (np.diff(key_rows[order]) == 0) & (np.diff(rindexes[order]) == 0)
+    invalid[key_rows[order][1:][repeated]] = True
+    truth_a = packed_truth.a.astype(np.int64)
+    in_truth = rindexes < len(truth_a)
+    matching_keys = in_truth & (truth_a[np.where(in_truth, rindexes, 0)] == bits)
+    matching = np.bincount(key_rows, weights=matching_keys, minlength=n).astype(np.int64)
+    truth_length = int(np.sum(packed_truth.a != ABSENT))
+    # no rindex on either side: compare_states divides by zero
+    invalid |= encoded["key_counts"] + truth_length == 0
+    scores["a"] = _dice(matching, encoded["key_counts"], truth_length)*points["a"]
+
+    # (4) players: the players of each answer that are in the truth
+    player_rows = np.repeat(np.arange(n), encoded["player_counts"])
+    matching = np.bincount(player_rows, weights=encoded["in_truth"], minlength=n).astype(np.int64)
+    truth_length = len(packed_truth.ids)
+    has_players = encoded["player_counts"] + truth_length > 0
+    scores["p"] = np.where(has_players, _dice(matching, encoded["player_counts"], truth_length), 0)*points["p"]
+
+    # (5) player_turn
+    scores["t"][encoded["t_equal"]] = points["t"]
+    return scores, invalid
+
+
+def _scalar_field_scores(answer, truth, packed_truth, rubric):
+    '''
+    the points of every field of one answer, as compare_states computes them
+    '''
+    if not isinstance(answer, (dict, PackedState)) or (isinstance(answer, dict) and set(answer.keys()) != STATE_KEYS):
+        return dict.fromkeys(STATE_FIELDS, 0)
+    packed = Evaluator._pack_state(answer)
+    if packed is not None and packed_truth is not None:
+        return Evaluator.packed_state_field_scores(packed, packed_truth, rubric)
+    return Evaluator._state_dict_field_scores(answer, truth, rubric)
+
+
+def compare_states_batch(answers, truth, rubric=None):
+    '''
+    compares every answer to the truth, like Evaluator.compare_states(answer, truth) does one of them.
+        answers:    states in the JSON dictionary form (None, or anything that is not a state dictionary, scores 0)
+        truth:      the ground truth state (dictionary or PackedState)
+        rubric:     the rubric to score with (get_rubric() by default)
+
+    Returns:
+        dict: {field: unrounded points of each answer} for the fields in STATE_FIELDS, and
+            {TOTAL: similarity score of each answer}, rounded to 2 decimals like compare_states, as float64 arrays.
+    '''
+    rubric = rubric or get_rubric()
+    answers = list(answers)
+    n = len(answers)
+    if isinstance(truth, PackedState):
+        packed_truth, truth = truth, truth.to_state()
+    else:
+        packed_truth = Evaluator._pack_state(truth)
+    scores = {field: np.zeros(n, dtype=np.float64) for field in STATE_FIELDS}
+
+    # the answers the arrays can score
+    fast = np.zeros(n, dtype=bool)
+    if packed_truth is not None:
+        truth_players = set(zip(packed_truth.ids.tolist(), packed_truth.scores.tolist(), packed_truth.turn_flags.tolist()))
+        rows = [row for row, answer in enumerate(answers) if _is_plain_shape(answer)]
+        try:
+            encoded = _encode([answers[row] for row in rows], truth, truth_players)
+        except _NotPlain:
+            rows = [row for row in rows if _is_plain(answers[row])]
+            encoded = _encode([answers[row] for row in rows], truth, truth_players)
+        rows = np.array(rows, dtype=np.int64)
+        fast_scores, invalid = _score_encoded(encoded, packed_truth, rubric)
+        rows = rows[~invalid]
+        for field in STATE_FIELDS:
+            scores[field][rows] = fast_scores[field][~invalid]
+        fast[rows] = True
+
+    # the others, one at a time
+    for row in np.flatnonzero(~fast).tolist():
+        for field, value in _scalar_field_scores(answers[row], truth, packed_truth, rubric).items():
+            scores[field][row] = value
+
+    # the fields add up in the same order as in compare_states, then the total is rounded like it
+    total = np.zeros(n, dtype=np.float64)
+    for field in STATE_FIELDS:
+        total = total + scores[field]
+    scores[TOTAL] = np.array([round(value, 2) for value in total.tolist()], dtype=np.float64)
+    return scores
@@ -5,8 +5,11 @@ from gymnasium import spaces
 import divide21env
 from divide21env.envs.divide21_env import Divide21Env
 from divide21x.challenge_maker.challenge_maker import ChallengeMaker
+from divide21x.challenge_maker.challenge_store import load_answer, load_challenge
 from divide21x.inspection.inspector import Inspector
-from divide21x.simulator.divide21env_simulator import Divide21EnvSimulator
+from divide21x.simulator.simulator_pool import get_simulator_pool
+from divide21x.simulator.transition_cache import get_transition_cache
+from divide21x.simulator.state_codec import ABSENT, PackedState
 import numpy as np
 import math
 from divide21x.utils.logger import EpisodeLogger
@@ -30,21 +33,52 @@ NOTE = 'note'
 SCORE = 'score'
 EQUIVALENT = 'equivalent'
 DEDUCTION_POINTS = 'deduction_points'
+# fields of a state, in the order their points add up
+STATE_FIELDS = ('s', 'd', 'a', 'p', 't')
+
+
+def load_ground_truth_state(date, index=0):
+    '''
+    the state the challenge index of the set of the date leads to (None if there is no such challenge)
+    '''
+    # the ground truth sealed when the challenge was made (no simulation)
+    ground_truth_state = load_answer(CHALLENGES_DIR, date, index)
+    if ground_truth_state is None:
+        # get challenge state and action
+        #   a single small read from the challenge store (or the challenge file, for challenges that predate it)
+        data = load_challenge(CHALLENGES_DIR, date, index)
+        if data is None:
+            return None
+        challenge_state = data["challenge"]["z"]
+        challenge_action = data["challenge"]["a"]
+        
+        # generate state from the action given in the challenge (the same for every model, so it is cached)
+        ground_truth_state, reward, terminated = get_transition_cache().apply_action(challenge_state, challenge_action)
+    return ground_truth_state
+
 
 class Evaluator(Inspector):
-    def __init__(self, action=None, state=None):
-        super().__init__(action, state)
-        self.inspect_all()
+    def __init__(self, action=None, state=None, date=None, index=0, logger=None, ground_truth_state=None, rubric=None):
+        # challenge graded against: index of the set of the date (the challenge of today by default)
+        self.date = date
+        self.index = index
+        # shared by the submissions of a batch: the state the challenge leads to (loaded when needed if None), and the
+        # rubric (get_rubric() if None)
+        self.ground_truth_state = ground_truth_state
+        self.rubric = rubric
+        super().__init__(action, state, logger if logger is not None else EpisodeLogger(BASE_DIR))
         
         self.generated_state = None
         self.points_to_deduct = 0
         self.ground_truth_action_score = 0
         self.ground_truth_state_score = 0
-        
-        # Logging
-        self.logger = EpisodeLogger(BASE_DIR)
+        # the submission is evaluated once, when it is first graded
+        self.evaluated = False
         
     def evaluate(self):
+        if self.evaluated:
+            return
+        self.evaluated = True
         # check inspection results
         if self.action_passed() and self.state_passed():
             # check if action implies/generates state
@@ -125,7 +159,7 @@ class Evaluator(Inspector):
         a2 = normalize(action2)
 
         # --- Comparison ---
-        rubric = get_rubric()
+        rubric = self.rubric or get_rubric()
         total_score = 0
 
         # (1) division
@@ -199,7 +233,7 @@ class Evaluator(Inspector):
         
         # --- Early shape check ---
         expected_keys = {"s", "d", "a", "p", "t"}
-        if set(state1.keys()) != expected_keys or set(state2.keys()) != expected_keys:
+        if any(not isinstance(state, PackedState) and set(state.keys()) != expected_keys for state in (state1, state2)):
             message = f"State dictionary must have exactly these keys: {', '.join(expected_keys)}."
             self.logger.add_info(STATE_COMPARISON, CRITICAL, message)
             # log
@@ -207,16 +241,121 @@ class Evaluator(Inspector):
                 self.logger.episode_log.append(self.logger.info)
             return (False, 0.0)
 
-        rubric = get_rubric()
-        total_score = 0
+        rubric = self.rubric or get_rubric()
+
+        # compare the packed forms when both states have one (same score, without normalizing any list)
+        packed1 = self._pack_state(state1)
+        packed2 = self._pack_state(state2)
+        if packed1 is not None and packed2 is not None:
+            total_score = self.compare_packed_states(packed1, packed2, rubric)
+        else:
+            total_score = self._compare_state_dicts(state1, state2, rubric)
+
+        # --- Compute result ---
+        similarity_score = round(total_score, 2)
+        equivalent = similarity_score == 100.0
+        
+        self.logger.add_info(STATE_COMPARISON, EQUIVALENT, equivalent)
+        self.logger.add_info(STATE_COMPARISON, SCORE, similarity_score)
+
+        # log
+        if self.logger.info not in self.logger.episode_log:
+            self.logger.episode_log.append(self.logger.info)
+                
+        return equivalent, similarity_score
+
+    @staticmethod
+    def _pack_state(state):
+        '''
+        returns the packed form of the state, or None if it cannot be packed (then it is compared as a dictionary)
+        '''
+        if isinstance(state, PackedState):
+            return state
+        try:
+            return PackedState.from_state(state)
+        except ValueError:
+            return None
+
+    @staticmethod
+    def compare_packed_states(packed1, packed2, rubric):
+        '''
+        the unrounded similarity score of compare_states, computed on the packed forms of both states
+        '''
+        return sum(Evaluator.packed_state_field_scores(packed1, packed2, rubric).values())
+
+    @staticmethod
+    def packed_state_field_scores(packed1, packed2, rubric):
+        '''
+        the unrounded points of each field of the state (in STATE_FIELDS order), computed on the packed forms
+        '''
+        # states that are the same (up to the order of their players) get every point, without scoring each field
+        if packed1.canonical_bytes() == packed2.canonical_bytes() and np.any(packed1.a != ABSENT):
+            field_scores = {field: rubric["state"][field] for field in STATE_FIELDS}
+            field_scores["a"] = 1.0*rubric["state"]["a"]
+            field_scores["p"] = 1.0*rubric["state"]["p"] if len(packed1.ids) else 0
+            return field_scores
+
+        field_scores = dict.fromkeys(STATE_FIELDS, 0)
+
+        # (1) static_number
+        if np.array_equal(packed1.s, packed2.s):
+            field_scores["s"] = rubric["state"]["s"]
+
+        # (2) dynamic_number
+        if np.array_equal(packed1.d, packed2.d):
+            field_scores["d"] = rubric["state"]["d"]
+
+        # (3) available_digits_per_rindex: Sørensen–Dice coefficient over the rindexes with the same digits
+        present1 = packed1.a != ABSENT
+        present2 = packed2.a != ABSENT
+        adpr1_length = int(present1.sum())
+        adpr2_length = int(present2.sum())
+        common = min(len(packed1.a), len(packed2.a))
+        matching_key_values = int(np.sum(present1[:common] & present2[:common] & (packed1.a[:common] == packed2.a[:common])))
+        similarity_match = (2*matching_key_values)/(adpr1_length + adpr2_length)
+        length_penalty = 1 - (abs(adpr1_length - adpr2_length)/(adpr1_length + adpr2_length))
+        score = similarity_match*length_penalty
+        field_scores["a"] = score*rubric["state"]["a"]
+
+        # (4) players: Sørensen–Dice coefficient over the players of state 1 that are in state 2
+        players1 = np.stack([packed1.ids, packed1.scores, packed1.turn_flags], axis=1)
+        players2 = np.stack([packed2.ids, packed2.scores, packed2.turn_flags], axis=1)
+        players1_length = len(players1)
+        players2_length = len(players2)
+        if players1_length + players2_length:
+            matching_players = int(np.sum((players1[:, None, :] == players2[None, :, :]).all(axis=2).any(axis=1)))
+            players_similarity_match = (2*matching_players)/(players1_length + players2_length)
+            players_length_penalty = 1 - (abs(players1_length - players2_length))/(players1_length + players2_length)
+            player_similarity_score = players_similarity_match*players_length_penalty
+            field_scores["p"] = player_similarity_score*rubric["state"]["p"]
+
+        # (5) player_turn
+        if packed1.t == packed2.t:
+            field_scores["t"] = rubric["state"]["t"]
+
+        return field_scores
+
+    @staticmethod
+    def _compare_state_dicts(state1, state2, rubric):
+        '''
+        the unrounded similarity score of compare_states, computed on the state dictionaries
+        '''
+        return sum(Evaluator._state_dict_field_scores(state1, state2, rubric).values())
+
+    @staticmethod
+    def _state_dict_field_scores(state1, state2, rubric):
+        '''
+        the unrounded points of each field of the state (in STATE_FIELDS order), computed on the state dictionaries
+        '''
+        field_scores = dict.fromkeys(STATE_FIELDS, 0)
 
         # (1) static_number
         if state1["s"] == state2["s"]:
-            total_score += rubric["state"]["s"]
+            field_scores["s"] = rubric["state"]["s"]
 
         # (2) dynamic_number
         if state1["d"] == state2["d"]:
-            total_score += rubric["state"]["d"]
+            field_scores["d"] = rubric["state"]["d"]
 
         # (3) available_digits_per_rindex
         adpr1 = state1["a"]
@@ -243,7 +382,7 @@ class Evaluator(Inspector):
             length_penalty = 1 - (abs(adpr1_norm_length - adpr2_norm_length)/(adpr1_norm_length + adpr2_norm_length))
             # (3.5) compute score
             score = similarity_match*length_penalty
-            total_score += score*rubric["state"]["a"]
+            field_scores["a"] = score*rubric["state"]["a"]
         
         # (4) players
         players1 = state1["p"]
@@ -267,35 +406,23 @@ class Evaluator(Inspector):
                 players_length_penalty = 1 - (abs(players1_length - players2_length))/(players1_length + players2_length)
                 # (4.5) compute score
                 player_similarity_score = players_similarity_match*players_length_penalty
-                total_score += player_similarity_score*rubric["state"]["p"]
+                field_scores["p"] = player_similarity_score*rubric["state"]["p"]
             except Exception:
                 pass
 
         # (5) player_turn
         if state1["t"] == state2["t"]:
-            total_score += rubric["state"]["t"]
+            field_scores["t"] = rubric["state"]["t"]
 
-        # --- Compute result ---
-        similarity_score = round(total_score, 2)
-        equivalent = similarity_score == 100.0
-        
-        self.logger.add_info(STATE_COMPARISON, EQUIVALENT, equivalent)
-        self.logger.add_info(STATE_COMPARISON, SCORE, similarity_score)
-
-        # log
-        if self.logger.info not in self.logger.episode_log:
-            self.logger.episode_log.append(self.logger.info)
-                
-        return equivalent, similarity_score
+        return field_scores
         
     def action_generates_state(self):
         '''
         checks if the given action implies/generates the given state
+            (divide21x/evaluation/action_verification.py verifies many (state, action, state) triples at once)
         '''
         # get the generated state by applying the given action on the given state
-        divide21env_simulator = Divide21EnvSimulator(given_obs=self.state)
-        obs, reward, terminated, truncated, info = divide21env_simulator.step(self.action)
-        self.generated_state = divide21env_simulator._decode_state(obs)
+        self.generated_state, reward, terminated, truncated, info = get_simulator_pool().step_from_state(self.state, self.action)
         
         # compare the given state to the generated state
         states_are_equivalent, states_similarity_score = self.compare_states()
@@ -310,9 +437,7 @@ class Evaluator(Inspector):
         ground_truth = GroundTruth(self.state)
         ground_truth_action = ground_truth.get_action()
         # generate state from the optimal action
-        divide21env_simulator = Divide21EnvSimulator(given_obs=self.state)
-        obs, reward, terminated, truncated, info = divide21env_simulator.step(ground_truth_action)
-        ground_truth_state = divide21env_simulator._decode_state(obs)
+        ground_truth_state, reward, terminated, truncated, info = get_simulator_pool().step_from_state(self.state, ground_truth_action)
         
         # (1) action
         action_are_equivalent, action_similarity_score = self.compare_actions(self.action, ground_truth_action)
@@ -327,33 +452,16 @@ class Evaluator(Inspector):
         '''
         checks if the LLM given state is actually generated
         '''
-        # get challenge state and action
-        date = str(get_utc_date())
-        day = str(get_utc_day())
-        challenge_name = day + '.json'
-        challenge_path = os.path.join(CHALLENGES_DIR, date[:7])
-        challenge_file = os.path.join(challenge_path, challenge_name)
-        data = None
-        if not os.path.exists(challenge_file):
+        ground_truth_state = self.ground_truth_state
+        if ground_truth_state is None:
+            ground_truth_state = load_ground_truth_state(str(self.date or get_utc_date()), self.index)
+        if ground_truth_state is None:
             message = f"No challenge found!"
             self.logger.add_info(CHALLENGE, CRITICAL, message)
             # log
             if self.logger.info not in self.logger.episode_log:
                 self.logger.episode_log.append(self.logger.info)
             return
-        with open(challenge_file, 'r') as f:
-            data = json.load(f)
-        challenge_state = data["challenge"]["z"]
-        challenge_action = data["challenge"]["a"]
-        
-        # generate state from the action given in the challenge
-        divide21env_simulator = Divide21EnvSimulator()
-        options = {
-            'obs': challenge_state
-        }
-        obs, info = divide21env_simulator.reset(options=options)
-        obs, reward, terminated, truncated, info = divide21env_simulator.step(challenge_action)
-        ground_truth_state = divide21env_simulator._decode_state(obs)
         
         # compare states
         states_are_equivalent, states_similarity_score = self.compare_states(self.state, ground_truth_state)
@@ -20,18 +20,15 @@ GRADE = 'grade'
 
 
 class Grader(Evaluator):
-    def __init__(self, action=None, state=None):
-        super().__init__(action, state)
-        
-        self.evaluate()
+    def __init__(self, action=None, state=None, date=None, index=0, logger=None, ground_truth_state=None, rubric=None):
+        super().__init__(
+            action, state, date, index, logger if logger is not None else EpisodeLogger(BASE_DIR), ground_truth_state, rubric
+        )
         
         self.action_grade = 0
         self.state_grade = 0
         self.overall_grade = 0
         
-        # Logging
-        self.logger = EpisodeLogger(BASE_DIR)
-        
     def grade_submission(self):
         """
         grade an LLM submission (action + state) against ground truth.
@@ -45,6 +42,7 @@ class Grader(Evaluator):
                 "overall_grade": float
             }
         """
+        self.evaluate()
         
         # check inspection results
         #   (1) Action-State passed
@@ -106,6 +104,7 @@ class Grader(Evaluator):
         -------
         float
         """
+        self.evaluate()
         
         # check inspection results
         #   (1) State passed
@@ -2,6 +2,7 @@ import divide21env
 import json
 import os
 import numpy as np
+from divide21x.utils.digits import number_length
 from divide21x.utils.logger import EpisodeLogger
 
 # base dir
@@ -16,7 +17,7 @@ NOTE = 'note'
 SCORE = 'score'
 
 class Inspector():
-    def __init__(self, action=None, state=None):
+    def __init__(self, action=None, state=None, logger=None):
         self.action = action
         # action keys
         self.division = None
@@ -38,9 +39,12 @@ class Inspector():
         self.action_passing_score = 10
         self.state_passing_score = 40
         self.overall_passing_score = self.action_passing_score + self.state_passing_score
+        # the action and the state are inspected once, when their scores are first needed
+        self.action_inspected = False
+        self.state_inspected = False
                 
-        # Logging
-        self.logger = EpisodeLogger(BASE_DIR)
+        # Logging (the logger of the subclass, or of a whole batch, if one is given)
+        self.logger = logger if logger is not None else EpisodeLogger(BASE_DIR)
     
     def get_action(self):
         return self.action
@@ -52,6 +56,9 @@ class Inspector():
         '''
         inspect the action, to ensure it follows the format of the game Divide21
         '''
+        if self.action_inspected:
+            return
+        self.action_inspected = True
         # check action
         expected_keys = {"v", "g", "r"}
         if not isinstance(self.action, dict):
@@ -105,6 +112,9 @@ class Inspector():
         '''
         inspect the state, to ensure it follows the format of the game Divide21
         '''
+        if self.state_inspected:
+            return
+        self.state_inspected = True
         # check state
         expected_keys = {"s", "d", "a", "p", "t"}
         if not isinstance(self.state, dict):
@@ -149,9 +159,11 @@ class Inspector():
                 self.logger.add_info(STATE, CRITICAL, message)
                 return
             # (2.3) Validate keys and values
+            #   (the number of digits of s is computed once, not per key/player: it is costly for huge numbers)
+            static_number_length = number_length(self.static_number)
             for k, v in value.items():
                 # Key must be an integer ≥ 0
-                if isinstance(k, (int, np.integer)) and 0 <= k < len(str(self.static_number)) == False:
+                if isinstance(k, (int, np.integer)) and 0 <= k < static_number_length == False:
                     self.state_score -= 5
                     message = f"Key '{k}' in '{field}' must be a non-negative integer."
                     self.logger.add_info(STATE, CRITICAL, message)
@@ -200,7 +212,7 @@ class Inspector():
                                 self.logger.add_info(STATE, CRITICAL, message)
                                 break
                             #   score
-                            elif not (isinstance(player["c"], (int, np.integer)) and -9*len(str(self.static_number)) - 8 <= player["c"] <= 9*len(str(self.static_number)) + 8):
+                            elif not (isinstance(player["c"], (int, np.integer)) and -9*static_number_length - 8 <= player["c"] <= 9*static_number_length + 8):
                                 self.state_score -= 4
                                 message = "The player score, c, must satisfy: -9*(the original number of digits) - 8 <= c <= 9*(the original number of digits) + 8."
                                 self.logger.add_info(STATE, CRITICAL, message)
@@ -242,16 +254,18 @@ class Inspector():
         self.logger.save_episode()
     
     def get_action_score(self):
+        self.inspect_action()
         return self.action_score
     
     def action_passed(self):
-        return self.action_passing_score == self.action_score
+        return self.action_passing_score == self.get_action_score()
     
     def get_state_score(self):
+        self.inspect_state()
         return self.state_score
     
     def state_passed(self):
-        return self.state_passing_score == self.state_score
+        return self.state_passing_score == self.get_state_score()
     
     def get_overall_score(self):
         return self.overall_score
@@ -0,0 +1,445 @@
+'''
+Validators compiled from the challenge_maker schemas (state_action_schema.yaml, submission_schema.yaml) and the
+game rule bounds, giving the same action and state scores as the Inspector, in a single pass per submission.
+
+The schemas are written in the JSON-like notation of those files:
+    int, null           types ('int | null' for either)
+    {"key": ..., ...}   an object with exactly these keys
+    {int: ...}          an object with int keys
+    [..., ...]          a list of items of the given type
+
+compile_validator(schema_path) parses a schema, checks that every action and state in it has the fields the rules
+below know about (and only those, so a schema that drifts from the rules is refused), and generates the source of a
+function specialized to it: the key sets, digit range, score bounds and deductions are inlined, and the checks run in
+the order of the Inspector. The function is compiled once per schema file (again if the file changes).
+
+    validator = compile_validator(SUBMISSION_SCHEMA)
+    scores, messages = validator.validate({"o": state})     scores: {"o": state score}
+    results = validator.validate_many(submissions)          [(scores, messages), ...]
+
+messages are the (category, type, message) the Inspector would log. A player that is not a dictionary makes the
+Inspector raise; here it is deducted like a player with the wrong keys.
+
+    python -m divide21x.inspection.schema_validator         (benchmark against the Inspector)
+'''
+import argparse
+import os
+import random
+import re
+import time
+from functools import lru_cache
+import numpy as np
+from divide21x.utils.digits import number_length
+
+
+SCHEMAS_DIR = './divide21x/challenge_maker'
+STATE_ACTION_SCHEMA = os.path.join(SCHEMAS_DIR, 'state_action_schema.yaml')
+SUBMISSION_SCHEMA = os.path.join(SCHEMAS_DIR, 'submission_schema.yaml')
+# categories (as the Inspector logs them)
+ACTION = 'action'
+STATE = 'state'
+# types
+CRITICAL = 'critical'
+WARNING = 'warning'
+# schema node kinds
+INT = 'int'
+NULL = 'null'
+UNION = 'union'
+OBJECT = 'object'
+MAP = 'map'
+LIST = 'list'
+
+# game rule bounds
+DIGIT_RANGE = (0, 9)
+# |c| <= SCORE_PER_DIGIT*(digits of s) + SCORE_SLACK
+SCORE_PER_DIGIT = 9
+SCORE_SLACK = 8
+TURN_FLAG_RANGE = (0, 1)
+DIVISION_VALUES = (0, 1, True, False)
+
+# the schema each field must have, and the points and messages of its checks, in the order the Inspector runs them
+ACTION_RULES = {
+    "score": 10,
+    "fields": {"v": (INT,), "g": (INT,), "r": (UNION, ((INT,), (NULL,)))},
+    "not_dict": (10, CRITICAL, "Action must be a Python dictionary."),
+    "keys": (9, CRITICAL, "Action dictionary must have exactly these keys: {keys}."),
+    "v": (7, CRITICAL, "The value for the division attribute must be either True or False, or 1 or 0."),
+    "g": (7, CRITICAL, "Digit must be between 0-9."),
+    "r": (2, WARNING, "Rindex, r, should have not been provided!"),
+}
+STATE_RULES = {
+    "score": 40,
+    "fields": {
+        "s": (INT,),
+        "d": (INT,),
+        "a": (MAP, (INT,), (LIST, (INT,))),
+        "p": (LIST, (OBJECT, {"i": (INT,), "c": (INT,), "m": (INT,)})),
+        "t": (INT,),
+    },
+    "not_dict": (40, CRITICAL, "State must be a Python dictionary."),
+    "keys": (38, CRITICAL, "State dictionary must have exactly these keys: {keys}."),
+    "s": (7, CRITICAL, "The static number, s, must be a non-negative integer."),
+    "d": (7, CRITICAL, "The dynamic number, d, must be a non-negative integer."),
+    "a_not_dict": (7, CRITICAL, "'a' must be a Python dictionary."),
+    "a_empty": (6, CRITICAL, "'a' dictionary must not be empty."),
+    "a_not_list": (5, CRITICAL, "Value for key '{key}' in 'a' must be a Python list."),
+    "a_digits": (4, CRITICAL, "All elements in 'a[{key}]' must be digits between 0 and 9."),
+    "a_duplicates": (3, WARNING, "Duplicate digits found in 'a[{key}]'."),
+    "p_empty": (6, CRITICAL, "players list must have at least one player."),
+    "p_keys": (5, CRITICAL, "player must have exactly these keys: {keys}."),
+    "i": (4, CRITICAL, "The player id, i, must be a non-negative integer less than the number of players."),
+    "c": (4, CRITICAL, "The player score, c, must satisfy: -9*(the original number of digits) - 8 <= c <= 9*(the original number of digits) + 8."),
+    "m": (4, CRITICAL, "m must be 1 or 0, which means that it is the player's turn or not, respectivelly."),
+    "p_not_list": (7, CRITICAL, "players must be a Python list."),
+    "t": (7, CRITICAL, "The player turn must be a non-negative integer less than the number of players."),
+}
+
+
+class SchemaError(ValueError):
+    pass
+
+
+TOKEN = re.compile(r'\s*(?:(\.\.\.)|([{}\[\]:,|])|"([^"]*)"|([A-Za-z_]\w*))')
+
+
+def _tokenize(text):
+    tokens = []
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        match = TOKEN.match(text, position)
+        if match is None:
+            raise SchemaError(f"Unexpected schema text at {position}: {text[position:position+20]!r}")
+        ellipsis, punctuation, string, name = match.groups()
+        if ellipsis:
+            tokens.append(('...', None))
+        elif punctuation:
+            tokens.append((punctuation, None))
+        elif string is not None:
+            tokens.append(('string', string))
+        else:
+            tokens.append(('name', name))
+        position = match.end()
+    return tokens
+
+
+def parse_schema(text):
+    '''
+    parses a schema into nested tuples:
+        (INT,), (NULL,), (UNION, (node, ...)), (OBJECT, {key: node}), (MAP, key node, value node), (LIST, item node)
+    '''
+    tokens = _tokenize(text)
+    position = 0
+
+    def expect(kind):
+        nonlocal position
+        if position >= len(tokens) or tokens[position][0] != kind:
+            raise SchemaError(f"Expected '{kind}' in the schema, at token {position}.")
+        position += 1
+        return tokens[position - 1][1]
+
+    def peek():
+        return tokens[position][0] if position < len(tokens) else None
+
+    def value():
+        nonlocal position
+        options = [primary()]
+        while peek() == '|':
+            position += 1
+            options.append(primary())
+        return options[0] if len(options) == 1 else (UNION, tuple(options))
+
+    def primary():
+        nonlocal position
+        kind = peek()
+        if kind == '{':
+            return obj()
+        if kind == '[':
+            return lst()
+        name = expect('name')
+        if name not in (INT, NULL):
+            raise SchemaError(f"Unknown schema type '{name}'.")
+        return (name,)
+
+    def obj():
+        nonlocal position
+        expect('{')
+        fields = {}
+        key_type = None
+        while peek() != '}':
+            if peek() == 'string':
+                key = expect('string')
+                expect(':')
+                fields[key] = value()
+            else:
+                key_type = primary()
+                expect(':')
+                value_type = value()
+            if peek() == ',':
+                position += 1
+        expect('}')
+        if key_type is not None:
+            if fields:
+                raise SchemaError("An object cannot have both named and typed keys.")
+            return (MAP, key_type, value_type)
+        return (OBJECT, fields)
+
+    def lst():
+        nonlocal position
+        expect('[')
+        items = [value()]
+        while peek() == ',':
+            position += 1
+            if peek() == '...':
+                position += 1
+                break
+            items.append(value())
+        expect(']')
+        if any(item != items[0] for item in items):
+            raise SchemaError("List items must all have the same type.")
+        return (LIST, items[0])
+
+    node = value()
+    if position != len(tokens):
+        raise SchemaError(f"Unexpected schema text after token {position}.")
+    return node
+
+
+def _role(node):
+    '''
+    ACTION or STATE if the node is an action or state object (by its keys), None otherwise
+    '''
+    if node[0] != OBJECT:
+        return None
+    for role, rules in ((ACTION, ACTION_RULES), (STATE, STATE_RULES)):
+        if set(node[1]) == set(rules["fields"]):
+            if node[1] != rules["fields"]:
+                raise SchemaError(f"The {role} fields of the schema do not match the {role} rules: {node[1]}.")
+            return role
+    return None
+
+
+def _generate_action(name):
+    rules = ACTION_RULES
+    lines = [
+        f"def {name}(action, messages):",
+        f"    score = {rules['score']}",
+        f"    if not isinstance(action, dict):",
+        f"        messages.append((ACTION, {rules['not_dict'][1]!r}, {rules['not_dict'][2]!r}))",
+        f"        return score - {rules['not_dict'][0]}",
+        f"    if action.keys() != ACTION_KEYS:",
+        f"        messages.append((ACTION, {rules['keys'][1]!r}, {rules['keys'][2]!r}.format(keys=', '.join(ACTION_KEYS))))",
+        f"        return score - {rules['keys'][0]}",
+        f"    division = action['v']",
+        f"    if division not in DIVISION_VALUES:",
+        f"        messages.append((ACTION, {rules['v'][1]!r}, {rules['v'][2]!r}))",
+        f"        return score - {rules['v'][0]}",
+        f"    if action['g'] not in DIGIT_VALUES:",
+        f"        messages.append((ACTION, {rules['g'][1]!r}, {rules['g'][2]!r}))",
+        f"        return score - {rules['g'][0]}",
+        f"    rindex = action['r']",
+        f"    if division and isinstance(rindex, INT_TYPES) and rindex >= 0:",
+        f"        messages.append((ACTION, {rules['r'][1]!r}, {rules['r'][2]!r}))",
+        f"        return score - {rules['r'][0]}",
+        f"    return score",
+    ]
+    return lines
+
+
+def _generate_state(name):
+    rules = STATE_RULES
+
+    def deduct(rule, indent, **fields):
+        points, level, message = rules[rule]
+        text = f"{message!r}.format({', '.join(f'{k}={v}' for k, v in fields.items())})" if fields else repr(message)
+        return [f"{' '*indent}score -= {points}", f"{' '*indent}messages.append((STATE, {level!r}, {text}))"]
+
+    lines = [
+        f"def {name}(state, messages):",
+        f"    score = {rules['score']}",
+        f"    if not isinstance(state, dict):",
+        f"        messages.append((STATE, {rules['not_dict'][1]!r}, {rules['not_dict'][2]!r}))",
+        f"        return score - {rules['not_dict'][0]}",
+        f"    if state.keys() != STATE_KEYS:",
+        f"        messages.append((STATE, {rules['keys'][1]!r}, {rules['keys'][2]!r}.format(keys=', '.join(STATE_KEYS))))",
+        f"        return score - {rules['keys'][0]}",
+        # (0) static number, (1) dynamic number
+        f"    static_number = state['s']",
+        f"    if not (isinstance(static_number, INT_TYPES) and static_number > 0):",
+        f"        static_number = None",
+        *deduct("s", 8),
+        f"    dynamic_number = state['d']",
+        f"    if not (isinstance(dynamic_number, INT_TYPES) and dynamic_number > 0):",
+        *deduct("d", 8),
+        # (2) available digits per rindex (the Inspector stops there if 'a' is not a non-empty dictionary)
+        f"    available = state['a']",
+        f"    if not isinstance(available, dict):",
+        *deduct("a_not_dict", 8),
+        f"        return score",
+        f"    if len(available) == 0:",
+        *deduct("a_empty", 8),
+        f"        return score",
+        f"    for key, digit_list in available.items():",
+        f"        if not isinstance(digit_list, list):",
+        *deduct("a_not_list", 12, key="key"),
+        f"            break",
+        # (the types first: the digit set needs hashable elements)
+        f"        if not ((PLAIN_INTS.issuperset(map(type, digit_list)) or all(isinstance(element, INT_TYPES) for element in digit_list))",
+        f"                and DIGITS.issuperset(digit_list)):",
+        *deduct("a_digits", 12, key="key"),
+        f"            break",
+        f"        if len(digit_list) != len(set(digit_list)):",
+        *deduct("a_duplicates", 12, key="key"),
+        # (3) players: the turn is only checked if the first player is valid, like the Inspector does
+        f"    players = state['p']",
+        f"    players_valid = False",
+        f"    if isinstance(players, list):",
+        f"        number_of_players = len(players)",
+        f"        if number_of_players == 0:",
+        *deduct("p_empty", 12),
+        f"        else:",
+        f"            score_bound = {SCORE_PER_DIGIT}*number_length(static_number) + {SCORE_SLACK}",
+        f"            for player in players:",
+        f"                if not isinstance(player, dict) or player.keys() != PLAYER_KEYS:",
+        *deduct("p_keys", 20, keys="', '.join(PLAYER_KEYS)"),
+        f"                    break",
+        f"                player_id = player['i']",
+        f"                if not (isinstance(player_id, INT_TYPES) and 0 <= player_id < number_of_players):",
+        *deduct("i", 20),
+        f"                    break",
+        f"                player_score = player['c']",
+        f"                if not (isinstance(player_score, INT_TYPES) and -score_bound <= player_score <= score_bound):",
+        *deduct("c", 20),
+        f"                    break",
+        f"                turn_flag = player['m']",
+        f"                if not (isinstance(turn_flag, INT_TYPES) and {TURN_FLAG_RANGE[0]} <= turn_flag <= {TURN_FLAG_RANGE[1]}):",
+        *deduct("m", 20),
+        f"                    break",
+        f"                players_valid = True",
+        f"    else:",
+        *deduct("p_not_list", 8),
+        # (4) player turn
+        f"    player_turn = state['t']",
+        f"    if not (players_valid and isinstance(player_turn, INT_TYPES) and 0 <= player_turn < number_of_players):",
+        *deduct("t", 8),
+        f"    return score",
+    ]
+    return lines
+
+
+def generate_source(schema):
+    '''
+    source of the validator of a parsed schema: validate(submission) and validate_many(submissions)
+    '''
+    if schema[0] != OBJECT:
+        raise SchemaError("The schema must be an object.")
+    # the key sets and bounds, built once
+    low, high = DIGIT_RANGE
+    lines = [
+        f"ACTION_KEYS = {set(ACTION_RULES['fields'])!r}",
+        f"STATE_KEYS = {set(STATE_RULES['fields'])!r}",
+        f"PLAYER_KEYS = {set(STATE_RULES['fields']['p'][1][1])!r}",
+        f"DIVISION_VALUES = {list(DIVISION_VALUES)!r}",
+        f"DIGIT_VALUES = range({low}, {high + 1})",
+        f"DIGITS = frozenset(DIGIT_VALUES)",
+        f"PLAIN_INTS = frozenset((int, bool))",
+        "",
+    ]
+    fields = []
+    for field, node in schema[1].items():
+        role = _role(node)
+        if role is None:
+            raise SchemaError(f"Field '{field}' of the schema is neither an action nor a state.")
+        function = f"_{role}_{len(fields)}"
+        lines += (_generate_action if role == ACTION else _generate_state)(function) + [""]
+        fields.append((field, function))
+    lines += [
+        "def validate(submission):",
+        "    messages = []",
+        "    get = submission.get if isinstance(submission, dict) else (lambda field: None)",
+        "    scores = {",
+        *[f"        {field!r}: {function}(get({field!r}), messages)," for field, function in fields],
+        "    }",
+        "    return scores, messages",
+        "",
+        "def validate_many(submissions):",
+        "    return [validate(submission) for submission in submissions]",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+class CompiledValidator:
+    '''
+    validator generated from a schema file; see compile_validator()
+    '''
+    def __init__(self, schema_path):
+        with open(schema_path, 'r') as f:
+            self.schema = parse_schema(f.read())
+        self.source = generate_source(self.schema)
+        namespace = {"INT_TYPES": (int, np.integer), "number_length": number_length, "ACTION": ACTION, "STATE": STATE}
+        exec(compile(self.source, f"<validator {schema_path}>", "exec"), namespace)
+        self.validate = namespace["validate"]
+        self.validate_many = namespace["validate_many"]
+
+
+@lru_cache(maxsize=8)
+def _compile_validator(schema_path, mtime_ns):
+    return CompiledValidator(schema_path)
+
+
+def compile_validator(schema_path=STATE_ACTION_SCHEMA):
+    '''
+    the validator of the schema file, generated once per process (and again if the file changes)
+    '''
+    return _compile_validator(schema_path, os.stat(schema_path).st_mtime_ns)
+
+
+def _benchmark_states(n, rng):
+    '''
+    submissions of the shape models send: mostly valid states, some with the mistakes the Inspector deducts for
+    '''
+    from divide21x.challenge_maker.state_synthesizer import random_action, synthesize_state
+    submissions = []
+    for k in range(n):
+        state = synthesize_state(rng, rng.randint(2, 30), rng.randint(1, 12))
+        if k % 4 == 1:
+            state["p"][-1]["c"] = 10**6
+        elif k % 4 == 2:
+            state["a"][0] = state["a"][0] + state["a"][0]
+        submissions.append({"action": random_action(rng, len(str(state["d"]))), "state": state})
+    return submissions
+
+
+def main():
+    from divide21x.inspection import inspector as inspector_module
+    parser = argparse.ArgumentParser(description="Compiled schema validator vs. the Inspector, in submissions/sec.")
+    parser.add_argument("--submissions", type=int, default=2000)
+    args = parser.parse_args()
+
+    submissions = _benchmark_states(args.submissions, random.Random(21))
+    validator = compile_validator(STATE_ACTION_SCHEMA)
+    # the Inspector as graders run it, without the log files
+    inspectors = []
+    start = time.perf_counter()
+    for submission in submissions:
+        inspector = inspector_module.Inspector(action=submission["action"], state=submission["state"])
+        inspector.inspect_action()
+        inspector.inspect_state()
+        inspectors.append(inspector)
+    inspector_time = time.perf_counter() - start
+    start = time.perf_counter()
+    results = validator.validate_many(submissions)
+    validator_time = time.perf_counter() - start
+
+    mismatches = sum(
+        (inspector.get_action_score(), inspector.get_state_score()) != (scores[ACTION], scores[STATE])
+        for inspector, (scores, _) in zip(inspectors, results)
+    )
+    print(f"{'validator':<10} {'submissions/sec':>16}")
+    print(f"{'inspector':<10} {len(submissions)/inspector_time:>16.0f}")
+    print(f"{'compiled':<10} {len(submissions)/validator_time:>16.0f}")
+    print(f"score mismatches: {mismatches}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,14 @@
-import hashlib
 import json
 import os
 import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from divide21x.challenge_maker.challenge_store import get_challenge_set_size, load_challenge
 from divide21x.llm_api.client_class import ModelClient
+from divide21x.simulator.fingerprint import fingerprint_results
+from divide21x.utils.digits import allow_huge_ints
 from divide21x.utils.logger import EpisodeLogger
-from divide21x.utils.util import get_llm_registry, get_utc_date, get_utc_datetime, get_utc_day, get_utc_hour
+from divide21x.utils.util import get_challenge_file_name, get_challenge_id, get_llm_registry, get_utc_date, get_utc_datetime, get_utc_day, get_utc_hour
 
 
 CHALLENGES_DIR = './divide21x/challenges'
@@ -45,30 +49,35 @@ class Requestor():
         
         self.results_dir = os.path.join(RESULTS_DIR, self.date[:7])
         self.results = {}
+        # the models are asked in parallel threads, which share the logger
+        self.lock = threading.Lock()
         
-    def get_prompt(self):
-        try:
-            with open(self.challenge_file, "r") as f:
-                challenge_data = json.load(f)
-        except FileNotFoundError:
-            challenge_data = None
+    def get_prompt(self, index=0):
+        '''
+        builds the prompt of challenge index of the set of the day (0, the challenge of the day, by default)
+        '''
+        # a single small read from the challenge store (or the challenge file, for challenges that predate it)
+        challenge_data = load_challenge(CHALLENGES_DIR, self.date, index)
+        if challenge_data is None:
             message = "Challenge has not been created yet!"
             self.logger.add_info(REQUESTOR, CRITICAL, message)
             return self.prompt
 
         # Construct the few-shot + challenge prompt
+        #   (numbers past Python's int <-> str digit limit are written in full)
         prompt_lines = []
-        for example_key in ["example_1", "example_2", "example_3", "example_4"]:
-            ex = challenge_data[example_key]
-            prompt_lines.append(f"Example:\n{Z}: {json.dumps(ex[Z])}\n"
-                                f"{A}: {json.dumps(ex[A])}\n"
-                                f"{O}: {json.dumps(ex[O])}\n")
-
-        # Add the challenge (no final_state)
-        challenge = challenge_data["challenge"]
-        prompt_lines.append(f"Challenge:\n{Z}: {json.dumps(challenge[Z])}\n"
-                            f"{A}: {json.dumps(challenge[A])}\n"
-                            f"{O}: ? (compute this and return as JSON)")
+        with allow_huge_ints():
+            for example_key in ["example_1", "example_2", "example_3", "example_4"]:
+                ex = challenge_data[example_key]
+                prompt_lines.append(f"Example:\n{Z}: {json.dumps(ex[Z])}\n"
+                                    f"{A}: {json.dumps(ex[A])}\n"
+                                    f"{O}: {json.dumps(ex[O])}\n")
+
+            # Add the challenge (no final_state)
+            challenge = challenge_data["challenge"]
+            prompt_lines.append(f"Challenge:\n{Z}: {json.dumps(challenge[Z])}\n"
+                                f"{A}: {json.dumps(challenge[A])}\n"
+                                f"{O}: ? (compute this and return as JSON)")
 
         prompt_lines.append(f"Given '{Z}' and '{A}', compute '{O}'. You must ONLY return a valid JSON object.")
         
@@ -87,14 +96,34 @@ class Requestor():
         if client.client is None:
             return
 
+        answer = self.ask(client, self.prompt)
+        if answer is None:
+            return {"error": "empty_answer"}
+        
+        # record results
+        if client.model_alias not in self.results:
+            self.results[client.model_alias] = {}
+            self.results[client.model_alias][ANSWER] = answer
+        
+        # log
+        self.logger.add_info(client.model_alias, ANSWER, answer)
+
+    def ask(self, client, prompt):
+        '''
+        sends the prompt to the model and parses its answer.
+
+        Returns:
+            dict|None: the answer (or an error dictionary if it is not valid JSON), None if the model gave no answer.
+        '''
         # Request the LLM   
-        answer = client.chat(prompt=self.prompt)
+        answer = client.chat(prompt=prompt)
         
         # clean the answer - although it might be json, it still might need to be polished as it is gotten from a chat
         # --- Clean the answer safely ---
         if not answer or not isinstance(answer, str):
-            self.logger.add_info(CHAT, "ERROR", f"Empty or invalid answer: {answer}")
-            return {"error": "empty_answer"}
+            with self.lock:
+                self.logger.add_info(CHAT, "ERROR", f"Empty or invalid answer: {answer}")
+            return None
 
         # (1) Remove Markdown code fences, with optional language tag and newlines
         answer = re.sub(r"^```(?:json)?\s*|\s*```$", "", answer.strip(), flags=re.DOTALL)
@@ -112,63 +141,65 @@ class Requestor():
 
         # (4) Try to parse JSON safely
         try:
-            answer = json.loads(answer)
+            with allow_huge_ints():
+                answer = json.loads(answer)
         except json.JSONDecodeError as e:
             # fallback: try a cleanup for double quotes or trailing commas
             cleaned = answer.strip().strip('"').strip("'").rstrip(',')
             try:
-                answer = json.loads(cleaned)
+                with allow_huge_ints():
+                    answer = json.loads(cleaned)
             except Exception:
-                self.logger.add_info(CHAT, "WARN", f"Invalid JSON: {answer[:150]} | Error: {e}")
+                with self.lock:
+                    self.logger.add_info(CHAT, "WARN", f"Invalid JSON: {answer[:150]} | Error: {e}")
                 answer = {"error": "invalid_json", "raw": answer}
-        
-        # record results
-        if client.model_alias not in self.results:
-            self.results[client.model_alias] = {}
-            self.results[client.model_alias][ANSWER] = answer
-        
-        # log
-        self.logger.add_info(client.model_alias, ANSWER, answer)
 
+        return answer
+
+    def _prompt_model(self, registry_entry, prompts):
+        '''
+        asks one model every prompt of the set, in order (one client, one request at a time per model)
+
+        Returns:
+            tuple(str|None, list): the model alias (None if its client could not be made) and its answers.
+        '''
+        client = ModelClient(
+            registry_entry=registry_entry
+        )
+        if client.client is None:
+            return None, []
+        return client.model_alias, [self.ask(client, prompt) for prompt in prompts]
 
     def start_request(self):
         self.registry = get_llm_registry()
         
         if self.registry:
-            # get prompt
-            self.prompt = self.get_prompt()
+            # get the prompts of the set of challenges of the day
+            prompts = []
+            for index in range(max(1, get_challenge_set_size(CHALLENGES_DIR, self.date))):
+                prompt = self.get_prompt(index)
+                if not prompt:
+                    break
+                prompts.append(prompt)
+            self.prompt = prompts[0] if prompts else None
             
             if self.prompt:
-                # start the requests
-                for registry_entry in self.registry:
-                    self.prompt_llm(registry_entry)
+                # start the requests, fanned out over the models
+                results_per_challenge = [{} for _ in prompts]
+                with ThreadPoolExecutor(max_workers=len(self.registry)) as executor:
+                    model_answers = list(executor.map(lambda entry: self._prompt_model(entry, prompts), self.registry))
+                for alias, answers in model_answers:
+                    for index, answer in enumerate(answers):
+                        if alias is None or answer is None or alias in results_per_challenge[index]:
+                            continue
+                        results_per_challenge[index][alias] = {ANSWER: answer}
+                        # log
+                        self.logger.add_info(alias, ANSWER, answer)
+                self.results = results_per_challenge[0]
             
                 # write to results dir
-                if self.results:
-                    os.makedirs(self.results_dir, exist_ok=True)
-        
-                    result_file_name = self.day + '.json'
-                    result_file = os.path.join(self.results_dir, result_file_name)
-                    result_name_tmp = result_file_name + '.tmp'
-                    result_file_tmp = os.path.join(self.results_dir, result_name_tmp)
-                    
-                    # make the results file
-                    with open(result_file_tmp, 'w') as tmp_file:
-                        json.dump(self.results, tmp_file, indent=4)
-                    os.rename(result_file_tmp, result_file)
-                    
-                    # log
-                    message = f'Results for today [{self.date}] are in.'
-                    self.logger.add_info(REQUESTOR, RESULTS, message)
-                    # log a unique challenge ID and hash
-                    self.results_id = self.date
-                    to_hash = self.results_id + str(self.results)
-                    self.results_hash = hashlib.sha256(to_hash.encode()).hexdigest()
-                    self.logger.add_info(REQUESTOR, ID, self.results_id)
-                    self.logger.add_info(REQUESTOR, HASH, self.results_hash)
-                else:
-                    message = f'No results recorded!'
-                    self.logger.add_info(REQUESTOR, CRITICAL, message)
+                for index, results in enumerate(results_per_challenge):
+                    self._write_results(index, results)
         else:
             message = f'Registry is empty!'
             self.logger.add_info(REQUESTOR, CRITICAL, message)
@@ -177,6 +208,36 @@ class Requestor():
         if self.logger.info not in self.logger.episode_log:
             self.logger.episode_log.append(self.logger.info)
         self.logger.save_episode()
+
+    def _write_results(self, index, results):
+        '''
+        writes the results of challenge index of the set (<day>.json for the challenge of the day, <day>_<index>.json)
+        '''
+        if results:
+            os.makedirs(self.results_dir, exist_ok=True)
+        
+            result_file_name = get_challenge_file_name(self.date, index)
+            result_file = os.path.join(self.results_dir, result_file_name)
+            result_name_tmp = result_file_name + '.tmp'
+            result_file_tmp = os.path.join(self.results_dir, result_name_tmp)
+            
+            # make the results file
+            with open(result_file_tmp, 'w') as tmp_file, allow_huge_ints():
+                json.dump(results, tmp_file, indent=4)
+            os.rename(result_file_tmp, result_file)
+            
+            # log
+            challenge_id = get_challenge_id(self.date, index)
+            message = f'Results for today [{challenge_id}] are in.'
+            self.logger.add_info(REQUESTOR, RESULTS, message)
+            # log a unique challenge ID and hash
+            self.results_id = challenge_id
+            self.results_hash = fingerprint_results(self.results_id, results).hex()
+            self.logger.add_info(REQUESTOR, ID, self.results_id)
+            self.logger.add_info(REQUESTOR, HASH, self.results_hash)
+        else:
+            message = f'No results recorded!'
+            self.logger.add_info(REQUESTOR, CRITICAL, message)
         
 
 
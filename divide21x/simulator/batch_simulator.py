@@ -0,0 +1,395 @@
+'''
+Batched NumPy simulator for the game Divide21.
+
+It keeps N decoded states in struct-of-arrays form and applies N actions in one vectorized call, following the
+same rules as the transition kernel (see divide21x/simulator/transition_kernel.py):
+    - dynamic_digits:   (N x D) digits of d, by rindex (column 0 is the units digit), zero padded
+    - static_digits:    (N x S) digits of s, by rindex, zero padded
+    - available:        (N x D x 10) availability mask of a, False past the number of digits
+    - player_ids:       (N x P) player ids, padded
+    - scores:           (N x P) player scores, padded
+    - player_turn:      (N,) index of the player with the turn
+so a batch can mix states with different numbers of digits and players. A state a step cannot be applied to (where the
+kernel raises a ValueError) is left as it is and reported terminated, without stopping the other rows.
+States are only decoded back into dictionaries when decode() is called; load_packed()/get_packed() move states in and
+out of the batch in their packed form (see divide21x/simulator/state_codec.py) without going through Python lists.
+'''
+import numpy as np
+from divide21x.simulator.state_codec import ABSENT, DIGIT_BITS, PackedState
+from divide21x.simulator.transition_kernel import apply_action, parse_action, state_passes_inspection
+from divide21x.utils.digits import digits_to_int, int_to_digits, number_length
+
+
+NONE = -1
+
+
+def _encode_number(number, width):
+    '''
+    digits of a positive integer by rindex, zero padded to the given width
+    '''
+    number_digits = int_to_digits(number)
+    encoded = np.zeros(width, dtype=np.int8)
+    encoded[:len(number_digits)] = number_digits[::-1]
+    return encoded
+
+
+def _decode_number(digits, length):
+    return digits_to_int(digits[:length][::-1])
+
+
+def _number_length(digits):
+    '''
+    number of digits of each row, i.e. the position of the highest non-zero digit + 1
+    '''
+    nonzero = digits != 0
+    width = digits.shape[1]
+    return np.where(nonzero.any(axis=1), width - np.argmax(nonzero[:, ::-1], axis=1), 1)
+
+
+def _prohibited_digits(digits, lengths):
+    '''
+    vectorized version of the kernel's _prohibited_digits, for every rindex of every row.
+
+    Returns:
+        tuple(np.ndarray, np.ndarray): (M x D) masks of where 0 and where 1 are prohibited.
+    '''
+    columns = np.arange(digits.shape[1])
+    nonzero = (digits != 0) & (columns < lengths[:, None])
+    # writing 0 (or 1, at the units position) only makes the number 0 (or 1) if every other digit is 0
+    others_are_zero = (nonzero.sum(axis=1)[:, None] - nonzero) == 0
+    prohibited_zero = (columns == (lengths - 1)[:, None]) | others_are_zero
+    prohibited_one = others_are_zero & (columns == 0)
+    return prohibited_zero, prohibited_one
+
+
+class Divide21BatchSimulator():
+    def __init__(self, states=None):
+        self.size = 0
+        self.static_digits = None
+        self.static_length = None
+        self.dynamic_digits = None
+        self.dynamic_length = None
+        self.available = None
+        self.player_ids = None
+        self.scores = None
+        self.number_of_players = None
+        self.player_turn = None
+        self.max_score = None
+        # rows the last step could not be applied to (see step_arrays())
+        self.failed = None
+
+        if states is not None:
+            self.load(states)
+
+    def __len__(self):
+        return self.size
+
+    def load(self, states):
+        '''
+        encodes the decoded states into the batch arrays.
+            Every state must pass inspection and have an 'a' entry for each rindex of 'd' (decoded states always do).
+        '''
+        for state in states:
+            if not state_passes_inspection(state):
+                raise ValueError("State must pass inspection to be simulated.")
+            if {int(k) for k in state["a"].keys()} != set(range(number_length(state["d"]))):
+                raise ValueError("State must have available digits for exactly each rindex of the dynamic number.")
+
+        self._allocate(
+            [number_length(state["s"]) for state in states],
+            [number_length(state["d"]) for state in states],
+            [len(state["p"]) for state in states]
+        )
+        for n, state in enumerate(states):
+            self._encode_state(n, state)
+
+    def load_packed(self, packed_states):
+        '''
+        loads packed states (PackedState) into the batch arrays, with the same requirements as load().
+        '''
+        for packed in packed_states:
+            if not packed.passes_inspection():
+                raise ValueError("State must pass inspection to be simulated.")
+            if np.any(packed.a & ABSENT):
+                raise ValueError("State must have available digits for exactly each rindex of the dynamic number.")
+
+        self._allocate(
+            [len(packed.s) for packed in packed_states],
+            [len(packed.d) for packed in packed_states],
+            [len(packed.ids) for packed in packed_states]
+        )
+        for n, packed in enumerate(packed_states):
+            self.static_digits[n, :len(packed.s)] = packed.s[::-1]
+            self.dynamic_digits[n, :len(packed.d)] = packed.d[::-1]
+            self.available[n, :len(packed.a)] = (packed.a[:, None] & DIGIT_BITS) != 0
+            self.player_ids[n, :len(packed.ids)] = packed.ids
+            self.scores[n, :len(packed.scores)] = packed.scores
+            self.player_turn[n] = packed.t
+
+    def load_arrays(self, static_digits, static_length, dynamic_digits, dynamic_length, available, player_ids, scores,
+                    number_of_players, player_turn):
+        '''
+        loads states that are already encoded in the batch layout (see above), with the same requirements as load().
+            The arrays are used as they are (not copied), and are updated in place by step().
+        '''
+        self.size = len(static_length)
+        self.static_digits = np.asarray(static_digits, dtype=np.int8)
+        self.static_length = np.asarray(static_length, dtype=np.int64)
+        self.dynamic_digits = np.asarray(dynamic_digits, dtype=np.int8)
+        self.dynamic_length = np.asarray(dynamic_length, dtype=np.int64)
+        self.available = np.asarray(available, dtype=bool)
+        self.player_ids = np.asarray(player_ids, dtype=np.int64)
+        self.scores = np.asarray(scores, dtype=np.int64)
+        self.number_of_players = np.asarray(number_of_players, dtype=np.int64)
+        self.player_turn = np.asarray(player_turn, dtype=np.int64)
+        self.max_score = 9*self.static_length
+
+    def _allocate(self, static_length, dynamic_length, number_of_players):
+        self.size = len(static_length)
+        static_width = max(static_length, default=1)
+        dynamic_width = max(dynamic_length, default=1)
+        players_width = max(number_of_players, default=1)
+
+        self.static_length = np.array(static_length, dtype=np.int64)
+        self.dynamic_length = np.array(dynamic_length, dtype=np.int64)
+        self.number_of_players = np.array(number_of_players, dtype=np.int64)
+        self.max_score = 9*self.static_length
+        self.static_digits = np.zeros((self.size, static_width), dtype=np.int8)
+        self.dynamic_digits = np.zeros((self.size, dynamic_width), dtype=np.int8)
+        self.available = np.zeros((self.size, dynamic_width, 10), dtype=bool)
+        self.player_ids = np.zeros((self.size, players_width), dtype=np.int64)
+        self.scores = np.zeros((self.size, players_width), dtype=np.int64)
+        self.player_turn = np.zeros(self.size, dtype=np.int64)
+
+    def _encode_state(self, n, state):
+        self.static_digits[n] = _encode_number(state["s"], self.static_digits.shape[1])
+        self.dynamic_digits[n] = _encode_number(state["d"], self.dynamic_digits.shape[1])
+        self.dynamic_length[n] = number_length(state["d"])
+        self.available[n] = False
+        self.available[n].flat[[int(rindex)*10 + int(d) for rindex, digit_list in state["a"].items() for d in digit_list]] = True
+        for i, player in enumerate(state["p"]):
+            self.player_ids[n, i] = player["i"]
+            self.scores[n, i] = player["c"]
+        self.player_turn[n] = state["t"]
+
+    def decode(self, indices=None):
+        '''
+        decodes the states back into the JSON-compatible dictionary form.
+
+        Args:
+            indices (iterable[int]|None): rows to decode, all of them by default.
+
+        Returns:
+            list[dict]: decoded states.
+        '''
+        if indices is None:
+            indices = range(self.size)
+        states = []
+        for n in indices:
+            dynamic_length = int(self.dynamic_length[n])
+            player_turn = int(self.player_turn[n])
+            available = self.available[n, :dynamic_length].tolist()
+            states.append({
+                "s": _decode_number(self.static_digits[n], int(self.static_length[n])),
+                "d": _decode_number(self.dynamic_digits[n], dynamic_length),
+                "a": {rindex: [d for d, flag in enumerate(row) if flag] for rindex, row in enumerate(available)},
+                "p": [
+                    {"i": int(self.player_ids[n, i]), "c": int(self.scores[n, i]), "m": int(i == player_turn)}
+                    for i in range(int(self.number_of_players[n]))
+                ],
+                "t": player_turn
+            })
+        return states
+
+    def get_packed(self, indices=None):
+        '''
+        returns the states in their packed form (PackedState), for the given rows (all of them by default).
+        '''
+        if indices is None:
+            indices = range(self.size)
+        packed_states = []
+        for n in indices:
+            static_length = self.static_length[n]
+            dynamic_length = self.dynamic_length[n]
+            number_of_players = self.number_of_players[n]
+            player_turn = self.player_turn[n]
+            packed_states.append(PackedState(
+                self.static_digits[n, :static_length][::-1],
+                self.dynamic_digits[n, :dynamic_length][::-1],
+                (self.available[n, :dynamic_length] * DIGIT_BITS).sum(axis=1),
+                self.player_ids[n, :number_of_players],
+                self.scores[n, :number_of_players],
+                np.arange(number_of_players) == player_turn,
+                player_turn
+            ))
+        return packed_states
+
+    def step(self, actions):
+        '''
+        applies one action (dict) per state.
+
+        Returns:
+            tuple(np.ndarray, np.ndarray): rewards (float) and terminated flags (bool), one per state.
+        '''
+        if len(actions) != self.size:
+            raise ValueError(f"Expected {self.size} actions, got {len(actions)}.")
+        division = np.full(self.size, NONE, dtype=np.int64)
+        digit = np.full(self.size, NONE, dtype=np.int64)
+        rindex = np.full(self.size, NONE, dtype=np.int64)
+        for n, action in enumerate(actions):
+            v, g, r = parse_action(action)
+            if v is not None:
+                division[n] = int(v)
+            if g is not None:
+                digit[n] = g
+            if r is not None:
+                rindex[n] = r
+        return self.step_arrays(division, digit, rindex)
+
+    def _advance_player_turn(self, rows, scores, player_turn):
+        '''
+        vectorized version of the kernel's _update_player_turn for the given rows
+
+        Returns:
+            np.ndarray: the rows no player is left to take the turn of (the kernel raises a ValueError for them), whose
+                turn is left as it was.
+        '''
+        number_of_players = self.number_of_players[rows]
+        turn = (player_turn[rows] + 1) % number_of_players
+        candidates = (turn[:, None] + np.arange(scores.shape[1])) % number_of_players[:, None]
+        eligible = scores[rows[:, None], candidates] > -self.max_score[rows, None]
+        several_players = number_of_players > 1
+        stuck = several_players & ~eligible.any(axis=1)
+        first_eligible = candidates[np.arange(len(rows)), np.argmax(eligible, axis=1)]
+        player_turn[rows[~stuck]] = np.where(several_players, first_eligible, turn)[~stuck]
+        return rows[stuck]
+
+    def step_arrays(self, division, digit, rindex):
+        '''
+        applies one action per state, given as arrays.
+
+        Args:
+            division (np.ndarray): 1 for a division, 0 for a digit change, -1 if not valid
+            digit (np.ndarray): 0-9, -1 if not valid
+            rindex (np.ndarray): rindex for a digit change, -1 if not given
+
+        Returns:
+            tuple(np.ndarray, np.ndarray): rewards (float) and terminated flags (bool), one per state.
+                A state the action cannot be applied to (the kernel raises a ValueError, e.g. a finished game with no
+                player left to take the turn) is left unchanged, with a reward of 0 and terminated; self.failed flags
+                them.
+        '''
+        division = np.asarray(division, dtype=np.int64)
+        digit = np.asarray(digit, dtype=np.int64)
+        rindex = np.asarray(rindex, dtype=np.int64)
+        rows = np.arange(self.size)
+        reward = np.zeros(self.size, dtype=np.float64)
+
+        valid = (division != NONE) & (digit != NONE)
+        reward[~valid] -= 5
+
+        # (1) Division attempt
+        is_division = valid & (division == 1)
+        reward[is_division & (rindex != NONE)] -= 2
+        reward[is_division & (digit < 2)] -= 5
+        attempts = rows[is_division & (digit >= 2)]
+        divisor = digit[attempts]
+        dividend = self.dynamic_digits[attempts].astype(np.int64)
+        quotient = np.zeros_like(dividend)
+        remainder = np.zeros(len(attempts), dtype=np.int64)
+        # long division from the most significant rindex (padding zeros leave the remainder at 0)
+        for column in range(dividend.shape[1]-1, -1, -1):
+            current = remainder*10 + dividend[:, column]
+            quotient[:, column] = current // divisor
+            remainder = current % divisor
+        divides = remainder == 0
+        good_divisions = attempts[divides]
+        quotient = quotient[divides]
+        bad_divisions = attempts[~divides]
+        reward[good_divisions] += 1
+        reward[bad_divisions] -= 1
+
+        # (2) Digit change
+        is_change = valid & (division == 0)
+        in_number = is_change & (rindex >= 0) & (rindex < self.dynamic_length)
+        clipped_rindex = np.clip(rindex, 0, self.available.shape[1]-1)
+        changes = in_number & self.available[rows, clipped_rindex, np.clip(digit, 0, 9)]
+        reward[is_change & ~changes] -= 2
+        # a zero written at the leading rindex shrinks the number, which the kernel handles (quirks included)
+        leading_zero = changes & (digit == 0) & (rindex == self.dynamic_length - 1)
+        fallbacks = rows[leading_zero]
+        changes = rows[changes & ~leading_zero]
+        reward[changes] += 1
+        failed = np.zeros(self.size, dtype=bool)
+        fallback_results = {}
+        for n, state in zip(fallbacks, self.decode(fallbacks)):
+            try:
+                fallback_results[n] = apply_action(state, {"v": False, "g": 0, "r": int(rindex[n])})
+            except ValueError:
+                failed[n] = True
+
+        # players (before mutating anything else, because advancing the turn can fail for some rows)
+        scores = self.scores.copy()
+        player_turn = self.player_turn.copy()
+        scores[good_divisions, player_turn[good_divisions]] += divisor[divides]
+        scores[bad_divisions, player_turn[bad_divisions]] -= divisor[~divides]
+        out_of_points = bad_divisions[scores[bad_divisions, player_turn[bad_divisions]] <= -self.max_score[bad_divisions]]
+        failed[self._advance_player_turn(np.concatenate([out_of_points, changes]), scores, player_turn)] = True
+        # the rows that failed are left unchanged
+        scores[failed] = self.scores[failed]
+        changes = changes[~failed[changes]]
+        self.scores = scores
+        self.player_turn = player_turn
+
+        # (1) good divisions: new number and available digits
+        if len(good_divisions):
+            lengths = _number_length(quotient)
+            self.dynamic_digits[good_divisions] = quotient
+            self.dynamic_length[good_divisions] = lengths
+            in_quotient = np.arange(quotient.shape[1]) < lengths[:, None]
+            current = np.arange(10) == quotient[:, :, None]
+            prohibited_zero, prohibited_one = _prohibited_digits(quotient, lengths)
+            refill = ~current
+            refill[:, :, 0] &= ~prohibited_zero
+            refill[:, :, 1] &= ~prohibited_one
+            available = self.available[good_divisions] & in_quotient[:, :, None] & refill
+            ran_out = ~available.any(axis=2) & in_quotient
+            available[ran_out] = refill[ran_out]
+            self.available[good_divisions] = available
+
+        # (2) digit changes: new number and available digits at rindex
+        if len(changes):
+            changed_rindex = rindex[changes]
+            changed_digit = digit[changes]
+            self.dynamic_digits[changes, changed_rindex] = changed_digit
+            self.available[changes, changed_rindex, changed_digit] = False
+            ran_out = changes[~self.available[changes, changed_rindex].any(axis=1)]
+            if len(ran_out):
+                ran_out_rindex = rindex[ran_out]
+                prohibited_zero, prohibited_one = _prohibited_digits(self.dynamic_digits[ran_out], self.dynamic_length[ran_out])
+                refill = np.arange(10) != digit[ran_out][:, None]
+                refill[:, 0] &= ~prohibited_zero[np.arange(len(ran_out)), ran_out_rindex]
+                refill[:, 1] &= ~prohibited_one[np.arange(len(ran_out)), ran_out_rindex]
+                self.available[ran_out, ran_out_rindex] = refill
+
+        # Check if game is over
+        players = np.arange(self.scores.shape[1]) < self.number_of_players[:, None]
+        out_of_points = ((self.scores <= -self.max_score[:, None]) & players).sum(axis=1)
+        single_player = self.number_of_players == 1
+        terminated = (
+            ((self.dynamic_length == 1) & (self.dynamic_digits[:, 0] == 1))
+            | ((self.scores >= self.max_score[:, None]) & players).any(axis=1)
+            | (single_player & (out_of_points > 0))
+            | (~single_player & (out_of_points == self.number_of_players - 1))
+        )
+        reward[terminated] = np.where(reward[terminated] > 0, reward[terminated] + 10, reward[terminated] - 10)
+
+        for n, (state, fallback_reward, fallback_terminated) in fallback_results.items():
+            self._encode_state(n, state)
+            reward[n] = fallback_reward
+            terminated[n] = fallback_terminated
+        reward[failed] = 0
+        terminated[failed] = True
+        self.failed = failed
+
+        return reward, terminated
@@ -4,38 +4,129 @@ import divide21env
 from divide21env.envs.divide21_env import Divide21Env
 import numpy as np
 import math
-from divide21x.utils.logger import EpisodeLogger
+from typing import NamedTuple
+from divide21x.simulator.transition_kernel import state_passes_inspection
+from divide21x.utils.digits import allow_huge_ints, digits_to_int, int_to_digits, number_length
+from divide21x.utils.trajectory_recorder import RECORD_OFF, TrajectoryRecorder
 
 
 BASE_DIR='./divide21x/simulator/logs'
 
 
+class SimulatorSnapshot(NamedTuple):
+    '''
+    immutable copy of the Divide21Env game state, taken by Divide21EnvSimulator.snapshot().
+        Made of tuples, ints and the (never mutated) observation space, so it can be shared across threads and
+        restored into any simulator.
+    '''
+    static_number: int
+    dynamic_number: int
+    digits: int
+    max_score: int
+    available_digits_per_rindex: tuple  # ((rindex, (digit, ...)), ...)
+    players: tuple                      # (((key, value), ...), ...)
+    player_turn: int
+    observation_space: object           # never mutated by the env, only replaced on reset
+
+
 class Divide21EnvSimulator(gym.Env):
 
     metadata = {"render_modes": ["human"]}
 
-    def __init__(self, digits=2, players=1, render_mode=None, auto_render=False):
+    def __init__(self, digits=2, players=1, render_mode=None, auto_render=False, record=RECORD_OFF, record_dir=BASE_DIR):
+        '''
+        record: what the trajectory recorder keeps of each episode ('off', the default, 'actions' or 'states').
+        record_dir: where episodes are flushed to (one .npz file per episode), or None to keep them in memory only.
+            An episode is flushed when it terminates or is truncated, on the next reset and on close(), so close the
+            simulator (or use it in a with block) to keep the one in progress.
+        '''
         super().__init__()
+        self.digits = digits
+        self.players = players
         self.base_env = gym.make("Divide21-v0", digits=digits, players=players, render_mode=render_mode, auto_render=auto_render)
         self.action_space = self.base_env.action_space
         self.observation_space = self.base_env.observation_space
         self.render_mode = render_mode
         self.auto_render = auto_render
+        self.state = None
         
-        # Logging
-        self.logger = EpisodeLogger(BASE_DIR)
+        # Recording
+        self.recorder = TrajectoryRecorder(level=record, base_dir=record_dir)
     
     def reset(self, *, seed=None, options=None):
-        obs, info = self.base_env.reset(seed=seed, options=options)
+        # the base env's random reset keeps the players, digits and max score of the previous game (or manual reset),
+        #   so put back those of a freshly built env first; a manual reset overwrites them anyway
+        env = self.base_env.unwrapped
+        env.digits = self.digits
+        env.maxScore = 9*self.digits
+        env.players = [{"i": i, "c": 0, "m": 1 if i==0 else 0} for i in range(self.players)]
+        env.observation_space = self.observation_space
+        manual_obs = options.get('obs', None) if options else None
+        if manual_obs is not None and state_passes_inspection(manual_obs):
+            obs, info = self._manual_reset(manual_obs, seed=seed)
+        else:
+            # the base env converts numbers with str()/int(), which refuse huge numbers by default
+            with allow_huge_ints():
+                obs, info = self.base_env.reset(seed=seed, options=options)
         self.state = obs
-        self.logger = EpisodeLogger(BASE_DIR)
+        self.recorder.start_episode(obs)
         return obs, info
 
+    def _manual_reset(self, obs, seed=None):
+        '''
+        same as the base env's manual reset (for a state that passes inspection), without its Inspector and len(str(.))
+        calls, which are quadratic in the number of digits
+        '''
+        env = self.base_env.unwrapped
+        gym.Env.reset(env, seed=seed)
+        number_of_players = len(obs["p"])
+        static_length = number_length(obs["s"])
+        dynamic_length = number_length(obs["d"])
+        env.maxScore = 9*static_length
+        env.observation_space = spaces.Dict({
+            "s": spaces.Box(low=0, high=9, shape=(static_length,), dtype=np.int8),
+            "d": spaces.Box(low=0, high=9, shape=(dynamic_length,), dtype=np.int8),
+            "a": spaces.MultiBinary(10 * dynamic_length),
+            "p": spaces.Box(
+                low=np.array([0, -env.maxScore-8, 0] * number_of_players, dtype=np.int64),
+                high=np.array([number_of_players - 1, env.maxScore+8, 1] * number_of_players, dtype=np.int64),
+                shape=(number_of_players * 3,),
+                dtype=np.int64
+            ),
+            "t": spaces.Discrete(number_of_players)
+        })
+        env.digits = dynamic_length
+        env.static_number = obs["s"]
+        env.dynamic_number = obs["d"]
+        # like the base env, keep the given lists and players (not copies)
+        env.player_turn = obs["t"]
+        new_obs = {
+            "s": int_to_digits(obs["s"]).astype(np.int8),
+            "d": int_to_digits(obs["d"]).astype(np.int8),
+            "a": env._encode_available_digits(obs["a"]),
+            "p": env._encode_players(obs["p"]),
+            "t": np.int64(obs["t"])
+        }
+        self._mark_reset(new_obs)
+        return new_obs, {"manual_reset": True}
+
+    def _mark_reset(self, obs):
+        '''
+        a reset that does not go through the base env still counts as one for the wrappers gym.make adds
+        (OrderEnforcing, PassiveEnvChecker)
+        '''
+        wrapper = self.base_env
+        while isinstance(wrapper, gym.Wrapper):
+            if hasattr(wrapper, "_has_reset"):
+                wrapper._has_reset = True
+            if getattr(wrapper, "checked_reset", True) is False:
+                wrapper.checked_reset = True
+                wrapper._previous_data = (obs, {})
+            wrapper = wrapper.env
+
     def _decode_dynamic_number(self, dynamic_number):
-        decoded_dynamic_number = [str(d) for d in dynamic_number.tolist()]
-        decoded_dynamic_number = ''.join(decoded_dynamic_number)
-        decoded_dynamic_number = int(decoded_dynamic_number)
-        return decoded_dynamic_number
+        # subquadratic, and without the int <-> str digit limit, for numbers with thousands of digits
+        return digits_to_int(dynamic_number)
     
     def _decode_available_digits(self, flat_mask, digits):
         '''
@@ -104,7 +195,7 @@ class Divide21EnvSimulator(gym.Env):
         decoded_state = {
             "s": decoded_static_number,
             "d": decoded_dynamic_number,
-            "a": self._decode_available_digits(state["a"], len(str(decoded_dynamic_number))),
+            "a": self._decode_available_digits(state["a"], number_length(decoded_dynamic_number)),
             "p": self._decode_players(state["p"]),
             "t": self._decode_player_turn(state["t"])
         }
@@ -112,39 +203,70 @@ class Divide21EnvSimulator(gym.Env):
         return decoded_state
     
     def step(self, action):
-        obs, reward, terminated, truncated, info = self.base_env.step(action)
+        with allow_huge_ints():
+            obs, reward, terminated, truncated, info = self.base_env.step(action)
 
-        # Decode states
-        #   (1)
-        state_before_action_decoded = self._decode_state(self.state)
-        #   (2)
-        state_after_action_decoded = self._decode_state(obs)
-        
-        action_log = {
-            "v": bool(action["v"]),
-            "g": int(action["g"]),
-            "r": int(action["r"]) if not bool(action["v"]) else None
-        }
-        
-        # Log transition
-        self.logger.episode_log.append({
-            "state_before_action": state_before_action_decoded,
-            "action": action_log,
-            "state_after_action": state_after_action_decoded,
-            "reward": reward,
-            "terminated": terminated,
-            "truncated": truncated,
-            "info": info
-        })
+        # Record transition
+        self.recorder.record_step(action, obs, reward, terminated, truncated)
         
         # Update the state
         self.state = obs
         
-        # log episode
-        self.logger.save_episode()
+        # flush the episode once it is over
+        if terminated or truncated:
+            self.recorder.end_episode()
 
         return obs, reward, terminated, truncated, info
 
+    def snapshot(self):
+        '''
+        captures the game state of the base env in O(digits + players), e.g. to branch from it in a tree search
+        '''
+        env = self.base_env.unwrapped
+        return SimulatorSnapshot(
+            static_number=env.static_number,
+            dynamic_number=env.dynamic_number,
+            digits=env.digits,
+            max_score=env.maxScore,
+            available_digits_per_rindex=tuple((rindex, tuple(digit_list)) for rindex, digit_list in env.available_digits_per_rindex.items()),
+            players=tuple(tuple(player.items()) for player in env.players),
+            player_turn=env.player_turn,
+            observation_space=env.observation_space
+        )
+
+    def restore(self, snapshot):
+        '''
+        puts the base env back in the game state of the snapshot (no inspection, no dict -> NumPy round trip of the
+        state), and starts a new episode from it like reset does.
+
+        Returns:
+            obs: the observation of the restored state.
+        '''
+        env = self.base_env.unwrapped
+        env.static_number = snapshot.static_number
+        env.dynamic_number = snapshot.dynamic_number
+        env.digits = snapshot.digits
+        env.maxScore = snapshot.max_score
+        env.available_digits_per_rindex = {rindex: list(digit_list) for rindex, digit_list in snapshot.available_digits_per_rindex}
+        env.players = [dict(player) for player in snapshot.players]
+        env.player_turn = snapshot.player_turn
+        env.observation_space = snapshot.observation_space
+        obs = {
+            "s": int_to_digits(env.static_number).astype(np.int8),
+            "d": int_to_digits(env.dynamic_number).astype(np.int8),
+            "a": env._encode_available_digits(),
+            "p": env._encode_players(),
+            "t": np.int64(env.player_turn)
+        }
+        self._mark_reset(obs)
+        self.state = obs
+        self.recorder.start_episode(obs)
+        return obs
+
     def render(self):
         return self.base_env.render()
 
+    def close(self):
+        self.recorder.end_episode()
+        return self.base_env.close()
+
@@ -0,0 +1,152 @@
+'''
+Canonical 128-bit fingerprints (blake2b) of Divide21 states, actions and (state, action) pairs.
+
+    state:      the canonical bytes of the packed state (see divide21x/simulator/state_codec.py), so states that only
+                differ in their 'a' key types, the order of their digit lists or the order of their players have the
+                same fingerprint, like compare_states reads them
+    action:     the action as the transition kernel reads it (parse_action)
+    pair:       both of them
+
+How the players count is the view of the state (players=):
+
+    SORTED_PLAYERS      sorted by (i, c, m), with t as it is (the default, compare_states)
+    ORDERED_PLAYERS     in their order, since t indexes them (the transition cache: the next state depends on it)
+    ANONYMOUS_PLAYERS   only the sorted (c, m) of the players and the score of the player to play, ids ignored (the
+                        duplicate index of the challenge maker)
+
+Every kind and view of fingerprint is hashed with its own prefix, so no two of them share one. They are stable
+across processes and versions of Python (unlike hash()), and are meant as keys for caches, deduplication and
+integrity hashes. The keys of the challenge store are not fingerprints but content addresses (sha256 of the stored
+record, see divide21x/challenge_maker/challenge_store.py).
+'''
+import hashlib
+import json
+import struct
+import numpy as np
+from divide21x.simulator.state_codec import PackedState
+from divide21x.simulator.transition_kernel import parse_action
+from divide21x.utils.digits import allow_huge_ints
+
+
+FINGERPRINT_SIZE = 16
+ACTION_PREFIX = b"a"
+JSON_PREFIX = b"j"
+RESULTS_PREFIX = b"r"
+# views of the players
+SORTED_PLAYERS = 'sorted'
+ORDERED_PLAYERS = 'ordered'
+ANONYMOUS_PLAYERS = 'anonymous'
+STATE_PREFIXES = {SORTED_PLAYERS: b"z", ORDERED_PLAYERS: b"zo", ANONYMOUS_PLAYERS: b"zn"}
+PAIR_PREFIXES = {SORTED_PLAYERS: b"za", ORDERED_PLAYERS: b"zoa", ANONYMOUS_PLAYERS: b"zna"}
+
+
+def _digest(prefix, *parts):
+    digest = hashlib.blake2b(prefix, digest_size=FINGERPRINT_SIZE)
+    for part in parts:
+        digest.update(part)
+    return digest.digest()
+
+
+def _pack(state):
+    if isinstance(state, PackedState):
+        return state
+    try:
+        return PackedState.from_state(state)
+    except ValueError:
+        return None
+
+
+def _anonymous_bytes(packed):
+    players = np.stack([packed.scores, packed.turn_flags], axis=1)
+    players = players[np.lexsort((players[:, 1], players[:, 0]))]
+    has_turn = 0 <= packed.t < len(packed.scores)
+    header = np.array([len(packed.s), len(packed.d), len(players), 1 if has_turn else -1,
+                       int(packed.scores[packed.t]) if has_turn else 0], dtype=np.int64)
+    return b"".join(array.tobytes() for array in (header, packed.s, packed.d, packed.a, players))
+
+
+def _state_bytes(packed, players):
+    if players == SORTED_PLAYERS:
+        return packed.canonical_bytes()
+    if players == ORDERED_PLAYERS:
+        return packed.to_bytes()
+    if players == ANONYMOUS_PLAYERS:
+        return _anonymous_bytes(packed)
+    raise ValueError(f"Unknown view of the players: {players!r}.")
+
+
+def _action_bytes(action):
+    # the rindex is not bounded, so it is not packed into a fixed width
+    return repr(parse_action(action)).encode()
+
+
+def _sized(data):
+    return struct.pack("<q", len(data)) + data
+
+
+def fingerprint_packed(packed, players=SORTED_PLAYERS):
+    '''
+    fingerprint of a PackedState
+    '''
+    data = _state_bytes(packed, players)
+    return _digest(STATE_PREFIXES[players], data)
+
+
+def fingerprint_state(state, players=SORTED_PLAYERS):
+    '''
+    Returns:
+        bytes|None: fingerprint of the state (dictionary or PackedState), or None if it cannot be packed.
+    '''
+    packed = _pack(state)
+    return None if packed is None else fingerprint_packed(packed, players)
+
+
+def fingerprint_action(action):
+    '''
+    fingerprint of an action (the actions the kernel reads the same way, e.g. {"v": 1, ...} and {"v": True, ...},
+    have the same one)
+    '''
+    return _digest(ACTION_PREFIX, _action_bytes(action))
+
+
+def fingerprint_pair(state, action, players=SORTED_PLAYERS):
+    '''
+    Returns:
+        bytes|None: fingerprint of the (state, action) pair, or None if the state cannot be packed.
+    '''
+    packed = _pack(state)
+    if packed is None:
+        return None
+    data = _state_bytes(packed, players)
+    return _digest(PAIR_PREFIXES[players], _sized(_action_bytes(action)), data)
+
+
+def _canonical_json(value):
+    with allow_huge_ints():
+        try:
+            return json.dumps(value, sort_keys=True, separators=(",", ":"))
+        except TypeError:
+            # keys of several types (e.g. 0 and "1") cannot be sorted until JSON turns them into strings
+            return json.dumps(json.loads(json.dumps(value)), sort_keys=True, separators=(",", ":"))
+
+
+def fingerprint_json(value):
+    '''
+    fingerprint of any JSON value, over its canonical JSON text (sorted keys, compact separators), for values that
+    are not states
+    '''
+    return _digest(JSON_PREFIX, _canonical_json(value).encode())
+
+
+def fingerprint_results(results_id, results):
+    '''
+    integrity hash of the results of a challenge ({alias: {"answer": ..., ...}}): the same whatever the order of the
+    models, and whatever the key types and list order of each answer that is a state.
+    '''
+    parts = [_sized(results_id.encode())]
+    for alias in sorted(results):
+        value = results[alias]
+        answer = value.get("answer") if isinstance(value, dict) else value
+        others = {key: item for key, item in value.items() if key != "answer"} if isinstance(value, dict) else None
+        parts += [_sized(alias.encode()), fingerprint_state(answer) or fingerprint_json(answer), fingerprint_json(others)]
+    return _digest(RESULTS_PREFIX, *parts)
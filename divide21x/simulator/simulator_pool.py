@@ -0,0 +1,112 @@
+'''
+Process-wide pool of warmed Divide21EnvSimulator instances, keyed by (digits, players).
+
+Building a simulator runs gym.make and sets up its trajectory recorder, so instead of building one per evaluation,
+callers check one out for the shape they need, reset it (e.g. from a decoded state with options={'obs': state}),
+and give it back:
+
+    with get_simulator_pool().checkout(digits, players) as divide21env_simulator:
+        obs, info = divide21env_simulator.reset(options={'obs': state})
+'''
+import copy
+import threading
+from contextlib import contextmanager
+from divide21x.simulator.divide21env_simulator import Divide21EnvSimulator
+from divide21x.utils.digits import number_length
+from divide21x.utils.trajectory_recorder import RECORD_OFF
+
+
+class SimulatorPool:
+    '''
+    thread-safe pool of idle simulators per (digits, players) shape.
+
+    Args:
+        record (str): recording level of the pooled simulators (off by default, so checking out writes nothing).
+        record_dir (str|None): where the pooled simulators flush their episodes, if they record.
+        max_idle (int): idle simulators kept per shape; extra ones are closed when given back.
+    '''
+    def __init__(self, record=RECORD_OFF, record_dir=None, max_idle=4):
+        self.record = record
+        self.record_dir = record_dir
+        self.max_idle = max_idle
+        self.idle = {}
+        self.created = 0
+        self.lock = threading.Lock()
+
+    def _acquire(self, key):
+        with self.lock:
+            simulators = self.idle.get(key)
+            if simulators:
+                return simulators.pop()
+            self.created += 1
+        digits, players = key
+        return Divide21EnvSimulator(digits=digits, players=players, record=self.record, record_dir=self.record_dir)
+
+    def _release(self, key, divide21env_simulator):
+        with self.lock:
+            simulators = self.idle.setdefault(key, [])
+            if len(simulators) < self.max_idle:
+                simulators.append(divide21env_simulator)
+                return
+        divide21env_simulator.close()
+
+    @contextmanager
+    def checkout(self, digits=2, players=1):
+        '''
+        yields a simulator built for the given shape, taken from the pool (or built if none is idle),
+        and returns it to the pool afterwards. It must be reset before it is used.
+        '''
+        key = (int(digits), int(players))
+        divide21env_simulator = self._acquire(key)
+        try:
+            yield divide21env_simulator
+        finally:
+            # flush whatever the episode recorded, so the next checkout starts clean
+            divide21env_simulator.recorder.end_episode()
+            self._release(key, divide21env_simulator)
+
+    @contextmanager
+    def checkout_from_state(self, state):
+        '''
+        yields a simulator of the state's shape, already reset from the (decoded) state.
+
+        Yields:
+            tuple(Divide21EnvSimulator, obs)
+        '''
+        with self.checkout(number_length(state["d"]), len(state["p"])) as divide21env_simulator:
+            # the base env keeps a reference to the players it is given, so never hand it the caller's state
+            obs, info = divide21env_simulator.reset(options={'obs': copy.deepcopy(state)})
+            yield divide21env_simulator, obs
+
+    def step_from_state(self, state, action):
+        '''
+        applies the action to the decoded state through a pooled simulator.
+
+        Returns:
+            tuple(dict, float, bool, bool, dict): decoded next state, reward, terminated, truncated and info.
+        '''
+        with self.checkout_from_state(state) as (divide21env_simulator, obs):
+            obs, reward, terminated, truncated, info = divide21env_simulator.step(copy.deepcopy(action))
+            return divide21env_simulator._decode_state(obs), reward, terminated, truncated, info
+
+    def close(self):
+        with self.lock:
+            simulators = [s for simulators in self.idle.values() for s in simulators]
+            self.idle = {}
+        for divide21env_simulator in simulators:
+            divide21env_simulator.close()
+
+
+_simulator_pool = None
+_simulator_pool_lock = threading.Lock()
+
+
+def get_simulator_pool():
+    '''
+    returns the process-wide simulator pool, creating it on first use
+    '''
+    global _simulator_pool
+    with _simulator_pool_lock:
+        if _simulator_pool is None:
+            _simulator_pool = SimulatorPool()
+        return _simulator_pool
@@ -0,0 +1,225 @@
+'''
+Compact, canonical packed representation of Divide21 states.
+
+    s, d:       digits as uint8 arrays, most significant digit first (like the Divide21Env observation)
+    a:          one 10-bit int per rindex (uint16, bit g set if digit g is available at that rindex);
+                rindexes missing from the 'a' dictionary are marked with the ABSENT bit, so len(a) == len(d)
+    ids:        player ids (int64)
+    scores:     player scores (int64)
+    turn_flags: player m flags (int64)
+    t:          player turn (int)
+
+It encodes/decodes losslessly to and from both the JSON dictionary form and the Divide21Env observation form,
+and supports equality and hashing without going back to Python lists. to_bytes() keeps the order of the players (the
+player turn indexes them); canonical_bytes() sorts them, for comparisons that read them as a multiset.
+'''
+import numpy as np
+from divide21x.simulator.transition_kernel import STATE_KEYS, PLAYER_KEYS, _is_int
+from divide21x.utils.digits import digits_to_int, int_to_digits
+
+
+ABSENT = 1 << 15
+DIGIT_BITS = (1 << np.arange(10)).astype(np.uint16)
+
+
+def _encode_number(number):
+    if not _is_int(number) or isinstance(number, bool) or number < 0:
+        raise ValueError("Numbers must be non-negative integers.")
+    return int_to_digits(number)
+
+
+def _decode_number(digits):
+    return digits_to_int(digits)
+
+
+def _encode_rindex(key, digits):
+    '''
+    int keys and their string form (the keys JSON gives back) map to the same rindex; anything else is rejected
+    '''
+    if _is_int(key) and not isinstance(key, bool):
+        rindex = int(key)
+    elif isinstance(key, str) and key.isdigit() and str(int(key)) == key:
+        rindex = int(key)
+    else:
+        raise ValueError(f"Key '{key}' in 'a' is not a rindex.")
+    if not 0 <= rindex < digits:
+        raise ValueError(f"Rindex {rindex} is outside the dynamic number.")
+    return rindex
+
+
+def _encode_digit_list(digit_list):
+    if not isinstance(digit_list, list):
+        raise ValueError("Available digits must be a list.")
+    bits = 0
+    for digit in digit_list:
+        if not (_is_int(digit) and 0 <= digit <= 9) or bits & (1 << int(digit)):
+            raise ValueError("Available digits must be unique digits between 0 and 9.")
+        bits |= 1 << int(digit)
+    return bits
+
+
+class PackedState:
+    __slots__ = ("s", "d", "a", "ids", "scores", "turn_flags", "t", "_bytes", "_canonical_bytes")
+
+    def __init__(self, s, d, a, ids, scores, turn_flags, t):
+        self.s = np.asarray(s, dtype=np.uint8)
+        self.d = np.asarray(d, dtype=np.uint8)
+        self.a = np.asarray(a, dtype=np.uint16)
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.scores = np.asarray(scores, dtype=np.int64)
+        self.turn_flags = np.asarray(turn_flags, dtype=np.int64)
+        self.t = int(t)
+        for array in (self.s, self.d, self.a, self.ids, self.scores, self.turn_flags):
+            array.setflags(write=False)
+        self._bytes = None
+        self._canonical_bytes = None
+
+    @classmethod
+    def from_state(cls, state):
+        '''
+        encodes a state in the JSON dictionary form (int or str 'a' keys).
+            Raises ValueError if the state cannot be represented, e.g. keys are missing or values are not integers.
+        '''
+        if not isinstance(state, dict) or set(state.keys()) != STATE_KEYS:
+            raise ValueError(f"State dictionary must have exactly these keys: {', '.join(STATE_KEYS)}.")
+        # available digits per rindex
+        if not isinstance(state["a"], dict):
+            raise ValueError("'a' must be a Python dictionary.")
+        d = _encode_number(state["d"])
+        a = np.full(len(d), ABSENT, dtype=np.uint16)
+        for key, digit_list in state["a"].items():
+            rindex = _encode_rindex(key, len(d))
+            if a[rindex] != ABSENT:
+                raise ValueError(f"Rindex {rindex} appears more than once in 'a'.")
+            a[rindex] = _encode_digit_list(digit_list)
+        # players
+        if not isinstance(state["p"], list):
+            raise ValueError("'p' must be a Python list.")
+        players = []
+        for player in state["p"]:
+            if not isinstance(player, dict) or set(player.keys()) != PLAYER_KEYS:
+                raise ValueError(f"Players must have exactly these keys: {', '.join(PLAYER_KEYS)}.")
+            if not all(_is_int(player[key]) for key in ("i", "c", "m")):
+                raise ValueError("Player values must be integers.")
+            players.append((player["i"], player["c"], player["m"]))
+        if not _is_int(state["t"]):
+            raise ValueError("The player turn must be an integer.")
+        try:
+            players = np.array(players, dtype=np.int64).reshape(-1, 3)
+            np.int64(state["t"])
+        except OverflowError:
+            raise ValueError("Player values and the player turn must fit in 64 bits.")
+        return cls(_encode_number(state["s"]), d, a, players[:, 0], players[:, 1], players[:, 2], state["t"])
+
+    @classmethod
+    def from_observation(cls, obs):
+        '''
+        encodes an observation from Divide21Env, reading as many 'a' rows as 'd' has digits (like _decode_state does)
+        '''
+        d = np.asarray(obs["d"], dtype=np.uint8)
+        mask = np.asarray(obs["a"]).reshape(-1, 10)[:len(d)].astype(bool)
+        a = np.zeros(len(d), dtype=np.uint16)
+        a[:len(mask)] = (mask * DIGIT_BITS).sum(axis=1)
+        players = np.asarray(obs["p"], dtype=np.int64).reshape(-1, 3)
+        return cls(obs["s"], d, a, players[:, 0], players[:, 1], players[:, 2], obs["t"])
+
+    def to_state(self):
+        '''
+        decodes into the JSON dictionary form (int keys, sorted digit lists)
+        '''
+        a = self.a.tolist()
+        return {
+            "s": _decode_number(self.s),
+            "d": _decode_number(self.d),
+            "a": {rindex: [g for g in range(10) if bits >> g & 1] for rindex, bits in enumerate(a) if not bits & ABSENT},
+            "p": [{"i": i, "c": c, "m": m} for i, c, m in zip(self.ids.tolist(), self.scores.tolist(), self.turn_flags.tolist())],
+            "t": self.t
+        }
+
+    def to_observation(self):
+        '''
+        decodes into the Divide21Env observation form (rindexes missing from 'a' become empty rows)
+        '''
+        return {
+            "s": self.s.astype(np.int8),
+            "d": self.d.astype(np.int8),
+            "a": self.available_mask().astype(np.int64).flatten(),
+            "p": np.stack([self.ids, self.scores, self.turn_flags], axis=1).flatten(),
+            "t": np.int64(self.t)
+        }
+
+    def available_mask(self):
+        '''
+        (rindexes x 10) boolean availability mask, False for missing rindexes
+        '''
+        return ((self.a[:, None] & DIGIT_BITS) != 0) & ((self.a & ABSENT) == 0)[:, None]
+
+    def passes_inspection(self):
+        '''
+        the checks the Inspector runs on a state, on the packed form (the dictionary structure is already
+        guaranteed by the encoding)
+        '''
+        number_of_players = len(self.ids)
+        score_bound = 9*len(self.s) + 8
+        return bool(
+            self.s[0] > 0
+            and self.d[0] > 0
+            and np.any(self.a != ABSENT)
+            and number_of_players > 0
+            and np.all((self.ids >= 0) & (self.ids < number_of_players))
+            and np.all(np.abs(self.scores) <= score_bound)
+            and np.all((self.turn_flags >= 0) & (self.turn_flags <= 1))
+            and 0 <= self.t < number_of_players
+        )
+
+    def to_bytes(self):
+        '''
+        canonical byte encoding (lengths, then each array), used for equality and hashing
+        '''
+        if self._bytes is None:
+            header = np.array([len(self.s), len(self.d), len(self.ids), self.t], dtype=np.int64)
+            self._bytes = b"".join(
+                array.tobytes() for array in (header, self.s, self.d, self.a, self.ids, self.scores, self.turn_flags)
+            )
+        return self._bytes
+
+    def canonical_bytes(self):
+        '''
+        the byte encoding of to_bytes() with the players sorted by (i, c, m): the same for states that only differ in
+        the order of their players
+        '''
+        if self._canonical_bytes is None:
+            order = np.lexsort((self.turn_flags, self.scores, self.ids))
+            header = np.array([len(self.s), len(self.d), len(self.ids), self.t], dtype=np.int64)
+            self._canonical_bytes = b"".join(
+                array.tobytes() for array in (
+                    header, self.s, self.d, self.a, self.ids[order], self.scores[order], self.turn_flags[order]
+                )
+            )
+        return self._canonical_bytes
+
+    @classmethod
+    def from_bytes(cls, data):
+        '''
+        decodes the canonical byte encoding produced by to_bytes()
+        '''
+        static_length, dynamic_length, number_of_players, t = np.frombuffer(data, dtype=np.int64, count=4).tolist()
+        offset = 32
+        arrays = []
+        for dtype, count in ((np.uint8, static_length), (np.uint8, dynamic_length), (np.uint16, dynamic_length),
+                             (np.int64, number_of_players), (np.int64, number_of_players), (np.int64, number_of_players)):
+            array = np.frombuffer(data, dtype=dtype, count=count, offset=offset)
+            arrays.append(array)
+            offset += array.nbytes
+        return cls(*arrays, t)
+
+    def __eq__(self, other):
+        if not isinstance(other, PackedState):
+            return NotImplemented
+        return self.to_bytes() == other.to_bytes()
+
+    def __hash__(self):
+        return hash(self.to_bytes())
+
+    def __repr__(self):
+        return f"PackedState({self.to_state()})"
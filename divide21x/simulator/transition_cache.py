@@ -0,0 +1,185 @@
+'''
+Two-tier memoization cache for Divide21 state transitions.
+
+    (1) an in-process LRU of the most recent transitions, and
+    (2) an optional SQLite file, which several worker processes can share.
+
+Entries are keyed by the fingerprint of the packed state, with its players in their order, and the action as the
+transition kernel reads it (see divide21x/simulator/fingerprint.py), and are namespaced by the installed divide21env
+version and the version of the keys, so upgrading the simulator never serves transitions computed by another version.
+'''
+import importlib.metadata
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from divide21x.simulator.fingerprint import ORDERED_PLAYERS, fingerprint_pair
+from divide21x.simulator.state_codec import PackedState
+from divide21x.simulator.transition_kernel import apply_action
+
+
+# on-disk tier used by the process-wide cache, if set
+TRANSITION_CACHE_ENV = 'DIVIDE21X_TRANSITION_CACHE'
+DEFAULT_MAXSIZE = 4096
+# version of the keys, part of the namespace of the on-disk entries
+KEY_VERSION = 2
+
+
+def get_divide21env_version():
+    try:
+        return importlib.metadata.version("divide21env")
+    except importlib.metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def transition_key(state, action):
+    '''
+    canonical fingerprint of a (state, action) pair: equal for states that only differ in their key types or digit list
+    order, and for actions the kernel reads the same way (the order of the players counts, since the turn indexes them).
+
+    Returns:
+        bytes|None: 16-byte key, or None if the state cannot be packed (such transitions are not cached).
+    '''
+    return fingerprint_pair(state, action, players=ORDERED_PLAYERS)
+
+
+class TransitionCache:
+    '''
+    Args:
+        maxsize (int): transitions kept in the in-process LRU tier.
+        db_path (str|None): SQLite file of the on-disk tier, or None to cache in memory only.
+        version (str|None): namespace of the entries, the installed divide21env version by default.
+    '''
+    def __init__(self, maxsize=DEFAULT_MAXSIZE, db_path=None, version=None):
+        self.maxsize = maxsize
+        self.db_path = db_path
+        self.version = version if version is not None else get_divide21env_version()
+        self.namespace = f"{self.version}/{KEY_VERSION}"
+        self.memory = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self._connection = None
+        self._connection_pid = None
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "size": len(self.memory),
+            "version": self.version,
+        }
+
+    def _connect(self):
+        '''
+        connection to the on-disk tier; a new one is opened in each process (connections do not survive a fork)
+        '''
+        if self.db_path is None:
+            return None
+        if self._connection is None or self._connection_pid != os.getpid():
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS transitions ("
+                "version TEXT NOT NULL, key BLOB NOT NULL, next_state BLOB NOT NULL, reward REAL NOT NULL, "
+                "terminated INTEGER NOT NULL, PRIMARY KEY (version, key))"
+            )
+            # entries of other simulator (or key) versions are stale
+            connection.execute("DELETE FROM transitions WHERE version != ?", (self.namespace,))
+            connection.commit()
+            self._connection = connection
+            self._connection_pid = os.getpid()
+        return self._connection
+
+    def _remember(self, key, value):
+        self.memory[key] = value
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.maxsize:
+            self.memory.popitem(last=False)
+
+    def get(self, key):
+        '''
+        Returns:
+            tuple(PackedState, float, bool)|None: the cached transition, or None on a miss.
+        '''
+        with self.lock:
+            value = self.memory.get(key)
+            if value is not None:
+                self.memory.move_to_end(key)
+                self.hits += 1
+                return value
+            connection = self._connect()
+            if connection is not None:
+                row = connection.execute(
+                    "SELECT next_state, reward, terminated FROM transitions WHERE version = ? AND key = ?",
+                    (self.namespace, key)
+                ).fetchone()
+                if row is not None:
+                    value = (PackedState.from_bytes(row[0]), row[1], bool(row[2]))
+                    self._remember(key, value)
+                    self.disk_hits += 1
+                    return value
+            self.misses += 1
+            return None
+
+    def put(self, key, next_packed, reward, terminated):
+        with self.lock:
+            self._remember(key, (next_packed, reward, terminated))
+            connection = self._connect()
+            if connection is not None:
+                connection.execute(
+                    "INSERT OR REPLACE INTO transitions (version, key, next_state, reward, terminated) VALUES (?, ?, ?, ?, ?)",
+                    (self.namespace, key, next_packed.to_bytes(), reward, int(terminated))
+                )
+                connection.commit()
+
+    def apply_action(self, state, action):
+        '''
+        same as transition_kernel.apply_action, served from the cache when the transition was already computed.
+            Errors are never cached: a state the kernel rejects raises every time.
+        '''
+        key = transition_key(state, action)
+        if key is None:
+            return apply_action(state, action)
+        cached = self.get(key)
+        if cached is not None:
+            next_packed, reward, terminated = cached
+            return next_packed.to_state(), reward, terminated
+        next_state, reward, terminated = apply_action(state, action)
+        self.put(key, PackedState.from_state(next_state), reward, terminated)
+        return next_state, reward, terminated
+
+    def clear(self):
+        with self.lock:
+            self.memory.clear()
+            connection = self._connect()
+            if connection is not None:
+                connection.execute("DELETE FROM transitions")
+                connection.commit()
+
+    def close(self):
+        with self.lock:
+            if self._connection is not None and self._connection_pid == os.getpid():
+                self._connection.close()
+            self._connection = None
+
+
+_transition_cache = None
+_transition_cache_lock = threading.Lock()
+
+
+def get_transition_cache():
+    '''
+    returns the process-wide transition cache, creating it on first use
+    (with an on-disk tier if the DIVIDE21X_TRANSITION_CACHE environment variable gives its path)
+    '''
+    global _transition_cache
+    with _transition_cache_lock:
+        if _transition_cache is None:
+            _transition_cache = TransitionCache(db_path=os.environ.get(TRANSITION_CACHE_ENV))
+        return _transition_cache
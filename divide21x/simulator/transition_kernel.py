@@ -0,0 +1,274 @@
+'''
+Pure-function transition kernel for the game Divide21.
+
+It applies an action to a decoded state (the JSON-compatible dict form used in the challenges) and returns
+the decoded state that Divide21EnvSimulator would produce after
+    reset(options={'obs': state}) -> step(action) -> _decode_state(obs)
+without building a gym env, going through the wrapper stack or encoding/decoding NumPy observations.
+
+The rules are a direct port of divide21env's Divide21Env.step, including its quirks, so that both agree bit-for-bit
+(see tests/simulator/transition_kernel_test.py).
+Numbers go through divide21x.utils.digits, so they can have any number of digits.
+'''
+import numpy as np
+from divide21x.utils.digits import int_to_string, number_length, string_to_int
+
+
+STATE_KEYS = {"s", "d", "a", "p", "t"}
+ACTION_KEYS = {"v", "g", "r"}
+PLAYER_KEYS = {"i", "c", "m"}
+DIGITS = frozenset(range(10))
+INT_TYPES = (int, np.integer)
+
+
+def _is_int(value):
+    return isinstance(value, INT_TYPES)
+
+
+def state_passes_inspection(state):
+    '''
+    mirrors the checks the Inspector runs on a state (the base env runs them on reset), returning True only if the
+    state would keep its full state score.
+    '''
+    if not isinstance(state, dict) or set(state.keys()) != STATE_KEYS:
+        return False
+    # (0) static_number and (1) dynamic_number
+    if not (_is_int(state["s"]) and state["s"] > 0):
+        return False
+    if not (_is_int(state["d"]) and state["d"] > 0):
+        return False
+    # (2) available digits per rindex
+    available_digits_per_rindex = state["a"]
+    if not isinstance(available_digits_per_rindex, dict) or len(available_digits_per_rindex) == 0:
+        return False
+    for digit_list in available_digits_per_rindex.values():
+        if not isinstance(digit_list, list):
+            return False
+        digit_set = set(digit_list)
+        if not (digit_set <= DIGITS and all(isinstance(d, INT_TYPES) for d in digit_list)):
+            return False
+        if len(digit_list) != len(digit_set):
+            return False
+    # (3) players
+    players = state["p"]
+    if not isinstance(players, list) or len(players) == 0:
+        return False
+    score_bound = 9*number_length(state["s"]) + 8
+    for player in players:
+        if not isinstance(player, dict) or set(player.keys()) != PLAYER_KEYS:
+            return False
+        if not (_is_int(player["i"]) and 0 <= player["i"] < len(players)):
+            return False
+        if not (_is_int(player["c"]) and -score_bound <= player["c"] <= score_bound):
+            return False
+        if not (_is_int(player["m"]) and 0 <= player["m"] <= 1):
+            return False
+    # (4) player_turn
+    return _is_int(state["t"]) and 0 <= state["t"] < len(players)
+
+
+def _digit_position(rindex, digits):
+    '''
+    string position the base env reads/overwrites for a given rindex
+    '''
+    return -rindex-1 if rindex > 0 else digits-1
+
+
+def _prohibited_digits(number_string, digits, rindex, nonzero_digits):
+    '''
+    same result as Divide21Env._get_prohibited_digit_list_at_rindex, but in O(1):
+        writing 0 at rindex makes the number 0 only if every other digit is 0, and
+        writing 1 at rindex makes the number 1 only if, on top of that, rindex is the units position.
+    '''
+    prohibited = set()
+    # no leading zero
+    if rindex == digits-1:
+        prohibited.add(0)
+    # can't make number 0 or 1
+    position = _digit_position(rindex, digits)
+    current_digit = number_string[position]
+    if nonzero_digits - (current_digit != '0') == 0:
+        prohibited.add(0)
+        if position % len(number_string) == len(number_string)-1:
+            prohibited.add(1)
+    return prohibited
+
+
+def _nonzero_digits(number_string):
+    return len(number_string) - number_string.count('0')
+
+
+def _update_player_turn(players, player_turn, max_score):
+    number_of_players = len(players)
+    player_turn = (player_turn + 1) % number_of_players
+    if number_of_players > 1:
+        # the base env loops forever if nobody is left above -max score; stop after a full lap instead
+        for _ in range(number_of_players):
+            if players[player_turn]["c"] > -max_score:
+                break
+            player_turn = (player_turn + 1) % number_of_players
+        else:
+            raise ValueError("No player is left to take the turn.")
+    return player_turn
+
+
+def _game_over(dynamic_number, players, max_score):
+    # (1) quotient 1
+    if dynamic_number == 1:
+        return True
+    # (2) max points
+    for player in players:
+        if player["c"] >= max_score:
+            return True
+    # (3) only one player left without -max points or less
+    count = 0
+    for player in players:
+        if player["c"] <= -max_score:
+            if len(players) > 1:
+                count += 1
+            else:
+                return True
+    if len(players) > 1 and count == len(players) - 1:
+        return True
+    return False
+
+
+def _decode_available_digits(available_digits_per_rindex, digits, decoded_digits):
+    '''
+    what encoding the available digits into the (digits x 10) mask and decoding it back yields:
+        sorted, de-duplicated lists for every rindex of the resulting dynamic number.
+    '''
+    rows = {}
+    for rindex, digit_list in available_digits_per_rindex.items():
+        if not -digits <= rindex < digits:
+            raise IndexError(f"index {rindex} is out of bounds for axis 0 with size {digits}")
+        rows.setdefault(rindex % digits, set()).update(int(d) for d in digit_list)
+    return {rindex: sorted(rows.get(rindex, ())) if rindex < digits else [] for rindex in range(decoded_digits)}
+
+
+def parse_action(action):
+    '''
+    reads the action the way the base env does.
+
+    Returns:
+        tuple(division, digit, rindex): division and digit are None if they are not valid (and so is everything
+            if the action is not a dictionary with the keys v, g and r), rindex is None if it was not given.
+    '''
+    if not isinstance(action, dict) or set(action.keys()) != ACTION_KEYS:
+        return None, None, None
+    division = bool(action["v"]) if action["v"] in [0, 1, True, False] else None
+    digit = int(action["g"]) if action["g"] in range(0, 10) else None
+    rindex = int(action["r"]) if (_is_int(action["r"]) and action["r"] >= 0) else None
+    return division, digit, rindex
+
+
+def apply_action(state, action):
+    '''
+    applies the action to the decoded state of the game Divide21.
+
+    Args:
+        state (dict): decoded state, e.g. {"s": 19, "d": 59, "a": {0: [...], 1: [...]}, "p": [{"i": 0, "c": -13, "m": 1}], "t": 0}
+        action (dict): {"v": bool|int, "g": int, "r": int|None}
+
+    Returns:
+        tuple(dict, float, bool): the decoded state after the action, the reward and whether the game is over.
+            The given state is never mutated.
+    '''
+    if not state_passes_inspection(state):
+        raise ValueError("State must pass inspection to be simulated.")
+
+    static_number = int(state["s"])
+    dynamic_number = int(state["d"])
+    number_string = int_to_string(dynamic_number)
+    digits = len(number_string)
+    max_score = 9*number_length(static_number)
+    # convert string keys to int if necessary; the lists are replaced (never mutated) below
+    available_digits_per_rindex = {int(k): v for k, v in state["a"].items()}
+    # the base env encodes them on reset, which fails for rindexes outside the number
+    for rindex in available_digits_per_rindex:
+        if not -digits <= rindex < digits:
+            raise IndexError(f"index {rindex} is out of bounds for axis 0 with size {digits}")
+    players = [{"i": p["i"], "c": p["c"]} for p in state["p"]]
+    player_turn = int(state["t"])
+
+    reward = 0
+
+    division, digit, rindex = parse_action(action)
+    if division is None or digit is None:
+        reward += -5
+    # (1) Division attempt
+    elif division:
+        # deduct points if rindex is not None
+        if rindex is not None:
+            reward += -2
+
+        if digit in [0, 1]:
+            reward += -5
+        elif dynamic_number % digit == 0:
+            dynamic_number = dynamic_number // digit
+            number_string = int_to_string(dynamic_number)
+            # drop the rindexes the quotient no longer has
+            for j in range(len(number_string), digits):
+                available_digits_per_rindex.pop(j, None)
+            digits = len(number_string)
+            reward += 1
+            # update the list of available digits per rindex
+            #   (1) remove each quotient digit from available digits per rindex
+            for i in range(digits):
+                digit_list = available_digits_per_rindex[i]
+                if digit_list:
+                    digit_to_remove = int(number_string[digits-i-1])
+                    available_digits_per_rindex[i] = [d for d in digit_list if d != digit_to_remove]
+            #   (2) update available digits per rindex
+            nonzero_digits = _nonzero_digits(number_string)
+            for i in range(digits):
+                current_digit = int(number_string[digits-i-1])
+                prohibited = _prohibited_digits(number_string, digits, i, nonzero_digits)
+                digit_list = [d for d in available_digits_per_rindex[i] if d != current_digit and d not in prohibited]
+                if not digit_list:
+                    digit_list = [d for d in range(10) if d != current_digit and d not in prohibited]
+                available_digits_per_rindex[i] = digit_list
+            # update player score
+            players[player_turn]["c"] += digit
+        else:
+            reward += -1
+            # update player score
+            players[player_turn]["c"] -= digit
+            if players[player_turn]["c"] <= -max_score:
+                player_turn = _update_player_turn(players, player_turn, max_score)
+    # (2) Digit change
+    elif rindex in available_digits_per_rindex and digit in available_digits_per_rindex[rindex]:
+        position = _digit_position(rindex, digits) % digits
+        number_string = number_string[:position] + str(digit) + number_string[position+1:]
+        # a leading zero shrinks the number
+        number_string = number_string.lstrip('0') or '0'
+        dynamic_number = string_to_int(number_string)
+        reward += 1
+        # update the list of available digits per rindex
+        #   (1) remove digit from rindex available digits
+        digit_list = [d for d in available_digits_per_rindex[rindex] if d != digit]
+        #   (2) refill the rindex available digits if they ran out
+        if not digit_list:
+            current_digit = int(number_string[_digit_position(rindex, digits)])
+            prohibited = _prohibited_digits(number_string, digits, rindex, _nonzero_digits(number_string))
+            digit_list = [d for d in range(10) if d != current_digit and d not in prohibited]
+        available_digits_per_rindex[rindex] = digit_list
+        # update player turn
+        player_turn = _update_player_turn(players, player_turn, max_score)
+    else:
+        reward += -2
+
+    # Check if game is over
+    terminated = _game_over(dynamic_number, players, max_score)
+    if terminated:
+        reward = reward + 10 if reward > 0 else reward - 10
+
+    next_state = {
+        "s": static_number,
+        "d": dynamic_number,
+        "a": _decode_available_digits(available_digits_per_rindex, digits, len(number_string)),
+        "p": [{"i": int(p["i"]), "c": int(p["c"]), "m": int(i == player_turn)} for i, p in enumerate(players)],
+        "t": player_turn
+    }
+
+    return next_state, float(reward), terminated
@@ -0,0 +1,157 @@
+'''
+Divide21EnvSimulator exposed through gymnasium's vector envs (SyncVectorEnv / AsyncVectorEnv), to run rollouts
+across all the cores of a machine.
+
+Divide21Env observations change shape when the dynamic number loses digits, which gymnasium cannot batch, so each
+sub-env is a Divide21FixedShapeEnv: the observation keeps the shape of the first reset,
+    s, d:   digits, most significant first, left-padded with zeros (so they still read as the same number)
+    a:      (digits x 10) availability mask by rindex, zero rows past the number of digits
+    p, t:   as in Divide21Env
+(a reset from a state with more digits, or another number of players, raises a ValueError), and decode_observations() turns a batch of them back into decoded states.
+'''
+import random
+from functools import partial
+import gymnasium as gym
+from gymnasium import spaces
+import numpy as np
+from divide21x.simulator.divide21env_simulator import Divide21EnvSimulator
+from divide21x.utils.digits import digits_to_int, number_length
+from divide21x.utils.trajectory_recorder import RECORD_OFF
+
+
+class Divide21FixedShapeEnv(gym.Env):
+    '''
+    Divide21EnvSimulator with a fixed observation shape and a Discrete action space for r.
+        r is ignored (sent as None) when v is 1, since a division takes no rindex.
+
+    Seeding: the base env draws its numbers from the global random module, so every reset seeds it from this env's
+    own np_random (then puts it back the way it was). Resets are therefore deterministic per env, whatever the other
+    envs in the same process do.
+    '''
+    metadata = {"render_modes": []}
+
+    def __init__(self, digits=2, players=1, record=RECORD_OFF, record_dir=None):
+        super().__init__()
+        self.digits = digits
+        self.players = players
+        self.simulator = Divide21EnvSimulator(digits=digits, players=players, record=record, record_dir=record_dir)
+        max_score = 9*digits
+        self.observation_space = spaces.Dict({
+            "s": spaces.Box(low=0, high=9, shape=(digits,), dtype=np.int8),
+            "d": spaces.Box(low=0, high=9, shape=(digits,), dtype=np.int8),
+            "a": spaces.MultiBinary(10*digits),
+            "p": spaces.Box(
+                low=np.array([0, -max_score-8, 0]*players, dtype=np.int64),
+                high=np.array([players-1, max_score+8, 1]*players, dtype=np.int64),
+                shape=(players*3,),
+                dtype=np.int64
+            ),
+            "t": spaces.Discrete(players)
+        })
+        self.action_space = spaces.Dict({
+            "v": spaces.Discrete(2),
+            "g": spaces.Discrete(10),
+            "r": spaces.Discrete(digits)
+        })
+
+    def _check_shape(self, obs):
+        '''
+        raises a ValueError if the observation does not fit the fixed shape (e.g. a reset from a state with more digits
+        or players than the env was built with)
+        '''
+        digits = max(len(obs["s"]), len(obs["d"]))
+        if digits > self.digits:
+            raise ValueError(f"The state has numbers of {digits} digits, more than the {self.digits} of the env.")
+        players = len(obs["p"]) // 3
+        if players != self.players:
+            raise ValueError(f"The state has {players} players, but the env was built with {self.players}.")
+
+    def _pad(self, obs):
+        self._check_shape(obs)
+        padded = {
+            "s": np.zeros(self.digits, dtype=np.int8),
+            "d": np.zeros(self.digits, dtype=np.int8),
+            "a": np.zeros(10*self.digits, dtype=np.int8),
+            "p": np.asarray(obs["p"], dtype=np.int64).copy(),
+            "t": int(obs["t"])
+        }
+        padded["s"][self.digits-len(obs["s"]):] = obs["s"]
+        padded["d"][self.digits-len(obs["d"]):] = obs["d"]
+        # only the rows of the digits d still has (like _decode_state reads them)
+        rows = 10*min(len(obs["d"]), self.digits)
+        padded["a"][:rows] = np.asarray(obs["a"])[:rows]
+        return padded
+
+    def reset(self, *, seed=None, options=None):
+        super().reset(seed=seed)
+        global_random_state = random.getstate()
+        random.seed(int(self.np_random.integers(2**63)))
+        try:
+            obs, info = self.simulator.reset(options=options)
+        finally:
+            random.setstate(global_random_state)
+        return self._pad(obs), info
+
+    def step(self, action):
+        division = int(action["v"])
+        action = {
+            "v": division,
+            "g": int(action["g"]),
+            "r": int(action["r"]) if not division else None
+        }
+        obs, reward, terminated, truncated, info = self.simulator.step(action)
+        return self._pad(obs), reward, terminated, truncated, info
+
+    def close(self):
+        self.simulator.close()
+
+
+def make_vector_env(num_envs, digits=2, players=1, asynchronous=False, autoreset_mode=None, **kwargs):
+    '''
+    builds num_envs Divide21FixedShapeEnv in a SyncVectorEnv, or in an AsyncVectorEnv (one process each) if
+    asynchronous is True. Reset it with a seed for deterministic rollouts: env k is seeded with seed + k.
+
+    Args:
+        autoreset_mode (str|None): gymnasium's autoreset mode ('NextStep', 'SameStep' or 'Disabled'),
+            gymnasium's default if None.
+        **kwargs: passed on to Divide21FixedShapeEnv (e.g. record, record_dir).
+    '''
+    env_fns = [partial(Divide21FixedShapeEnv, digits=digits, players=players, **kwargs) for _ in range(num_envs)]
+    vector_kwargs = {} if autoreset_mode is None else {"autoreset_mode": autoreset_mode}
+    if asynchronous:
+        return gym.vector.AsyncVectorEnv(env_fns, **vector_kwargs)
+    return gym.vector.SyncVectorEnv(env_fns, **vector_kwargs)
+
+
+def decode_observations(obs):
+    '''
+    decodes a batch of Divide21FixedShapeEnv observations (as returned by the vector env) into a list of states
+    in the JSON-compatible dictionary form.
+    '''
+    static_numbers = obs["s"]
+    dynamic_numbers = obs["d"]
+    available = np.asarray(obs["a"]).reshape(len(dynamic_numbers), -1, 10).astype(bool)
+    players = np.asarray(obs["p"]).reshape(len(dynamic_numbers), -1, 3)
+    states = []
+    for n in range(len(dynamic_numbers)):
+        dynamic_number = digits_to_int(dynamic_numbers[n])
+        states.append({
+            "s": digits_to_int(static_numbers[n]),
+            "d": dynamic_number,
+            "a": {rindex: np.flatnonzero(row).tolist() for rindex, row in enumerate(available[n, :number_length(dynamic_number)])},
+            "p": [{"i": i, "c": c, "m": m} for i, c, m in players[n].tolist()],
+            "t": int(obs["t"][n])
+        })
+    return states
+
+
+def sample_actions(rng, num_envs, digits):
+    '''
+    random batched actions for the vector env, as ChallengeMaker draws them (divisors 2-9)
+    '''
+    division = rng.integers(0, 2, size=num_envs)
+    return {
+        "v": division,
+        "g": np.where(division == 1, rng.integers(2, 10, size=num_envs), rng.integers(0, 10, size=num_envs)),
+        "r": rng.integers(0, digits, size=num_envs)
+    }
@@ -0,0 +1,48 @@
+'''
+Throughput of Divide21FixedShapeEnv rollouts, in steps/sec, against the number of workers.
+
+    python -m divide21x.simulator.vector_env_benchmark --digits 12 --players 4 --steps 2000
+'''
+import argparse
+import os
+import time
+import numpy as np
+from divide21x.simulator.vector_env import make_vector_env, sample_actions
+
+
+def measure(num_envs, digits, players, steps, asynchronous, seed=21):
+    '''
+    Returns:
+        float: environment steps per second (num_envs steps per vector step).
+    '''
+    vector_env = make_vector_env(num_envs, digits=digits, players=players, asynchronous=asynchronous)
+    rng = np.random.default_rng(seed)
+    try:
+        vector_env.reset(seed=seed)
+        start = time.perf_counter()
+        for _ in range(steps):
+            vector_env.step(sample_actions(rng, num_envs, digits))
+        elapsed = time.perf_counter() - start
+    finally:
+        vector_env.close()
+    return num_envs*steps/elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Divide21 vector env throughput vs. number of workers.")
+    parser.add_argument("--digits", type=int, default=12)
+    parser.add_argument("--players", type=int, default=4)
+    parser.add_argument("--steps", type=int, default=2000, help="vector steps per measurement")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    print(f"{'mode':<6} {'workers':>7} {'steps/sec':>12}")
+    print(f"{'sync':<6} {1:>7} {measure(1, args.digits, args.players, args.steps, asynchronous=False):>12.0f}")
+    workers = 1
+    while workers <= args.max_workers:
+        print(f"{'async':<6} {workers:>7} {measure(workers, args.digits, args.players, args.steps, asynchronous=True):>12.0f}")
+        workers *= 2
+
+
+if __name__ == "__main__":
+    main()
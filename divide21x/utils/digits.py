@@ -0,0 +1,162 @@
+'''
+Conversions between Python ints and their decimal digits that stay fast for numbers with thousands of digits.
+
+int(str) and str(int) are quadratic in CPython and refuse numbers past sys.get_int_max_str_digits() (4300 digits by
+default), so big numbers go through these instead:
+    number_length:      len(str(n)), from the bit length (no string is built)
+    digits_to_int:      digit array -> int, combining 18-digit chunks pairwise (subquadratic)
+    int_to_string:      int -> str, through a Decimal built from the halves of its bits (subquadratic: libmpdec
+                        multiplies big numbers with a number-theoretic transform)
+    int_to_digits:      int -> digit array, from int_to_string (no digit limit)
+    allow_huge_ints:    lifts the digit limit, e.g. around json.load/json.dump of huge challenges (thread-safe: the
+                        limit is put back when the last block of any thread exits)
+'''
+import decimal
+import sys
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+import numpy as np
+
+
+# digits per machine-word chunk (10**18 < 2**63)
+CHUNK = 18
+# up to this many digits (just under the default limit of 4300), plain str/int conversions are fast enough
+SMALL = 4000
+CHUNK_WEIGHTS = 10**np.arange(CHUNK-1, -1, -1, dtype=np.int64)
+# ints of up to this many bits are converted to a Decimal directly
+DECIMAL_BITS = 128
+# the digit limit is process-wide: the blocks of allow_huge_ints() that are open (in any thread) and the limit to put
+# back when the last one exits
+_huge_ints_lock = threading.Lock()
+_huge_ints_blocks = 0
+_huge_ints_limit = None
+
+
+@lru_cache(maxsize=256)
+def _power_of_ten(exponent):
+    return 10**exponent
+
+
+def number_length(number):
+    '''
+    same as len(str(number)), without building the string for non-negative integers
+    '''
+    if isinstance(number, bool) or not isinstance(number, (int, np.integer)) or number < 0:
+        return len(str(number))
+    number = int(number)
+    if number < _power_of_ten(SMALL):
+        return len(str(number))
+    # log10(2) ~ 0.30103: the estimate is the length or one less than it
+    length = int((number.bit_length() - 1)*0.30102999566398120) + 1
+    return length + 1 if number >= _power_of_ten(length) else length
+
+
+def digits_to_int(digits):
+    '''
+    int value of an array of decimal digits (most significant first)
+    '''
+    digits = np.asarray(digits, dtype=np.int64)
+    if len(digits) == 0:
+        return 0
+    if len(digits) <= SMALL:
+        return int((digits + ord('0')).astype(np.uint8).tobytes())
+    # values of the 18-digit chunks, then combine neighbours until one is left
+    padding = (-len(digits)) % CHUNK
+    chunks = np.concatenate([np.zeros(padding, dtype=np.int64), digits]).reshape(-1, CHUNK)
+    values = (chunks @ CHUNK_WEIGHTS).tolist()
+    width = CHUNK
+    while len(values) > 1:
+        if len(values) % 2:
+            values.insert(0, 0)
+        power = _power_of_ten(width)
+        values = [values[k]*power + values[k+1] for k in range(0, len(values), 2)]
+        width *= 2
+    return values[0]
+
+
+def _int_to_decimal(number):
+    '''
+    exact Decimal of a non-negative int: the int is split in halves of its bits (shifts, linear) down to DECIMAL_BITS
+    bits, and the halves are joined back as high*2**width + low in Decimal arithmetic, whose products of big numbers
+    are subquadratic. Dividing by powers of 10 instead (divmod on ints) is quadratic.
+    '''
+    powers_of_two = {}
+
+    def power_of_two(width):
+        power = powers_of_two.get(width)
+        if power is None:
+            if width <= DECIMAL_BITS:
+                power = decimal.Decimal(2)**width
+            elif width - 1 in powers_of_two:
+                power = powers_of_two[width - 1] + powers_of_two[width - 1]
+            else:
+                half = width >> 1
+                power = power_of_two(half)*power_of_two(width - half)
+            powers_of_two[width] = power
+        return power
+
+    def join(number, width):
+        if width <= DECIMAL_BITS:
+            return decimal.Decimal(number)
+        half = width >> 1
+        high = number >> half
+        low = number - (high << half)
+        return join(low, half) + join(high, width - half)*power_of_two(half)
+
+    with decimal.localcontext() as context:
+        # exact: as many digits as needed, and an error rather than a rounded result
+        context.prec = decimal.MAX_PREC
+        context.Emax = decimal.MAX_EMAX
+        context.traps[decimal.Inexact] = True
+        return join(number, number.bit_length())
+
+
+def int_to_string(number):
+    '''
+    same as str(number) for a non-negative integer, without the digit limit
+    '''
+    number = int(number)
+    if number < _power_of_ten(SMALL):
+        return str(number)
+    return str(_int_to_decimal(number))
+
+
+def string_to_int(number_string):
+    '''
+    same as int(number_string) for a string of decimal digits, without the digit limit
+    '''
+    if len(number_string) <= SMALL:
+        return int(number_string)
+    return digits_to_int(np.frombuffer(number_string.encode(), dtype=np.uint8) - ord('0'))
+
+
+def int_to_digits(number):
+    '''
+    decimal digits of a non-negative integer, most significant first, as a uint8 array
+    '''
+    return np.frombuffer(int_to_string(number).encode(), dtype=np.uint8) - ord('0')
+
+
+@contextmanager
+def allow_huge_ints():
+    '''
+    lifts the int <-> str digit limit (Python 3.11+) inside the block, e.g. for JSON I/O of huge numbers. The limit is
+    global, so it stays lifted while any thread is inside such a block, and is put back when the last one exits.
+    '''
+    global _huge_ints_blocks, _huge_ints_limit
+    if not hasattr(sys, "get_int_max_str_digits"):
+        yield
+        return
+    with _huge_ints_lock:
+        if _huge_ints_blocks == 0:
+            _huge_ints_limit = sys.get_int_max_str_digits()
+            sys.set_int_max_str_digits(0)
+        _huge_ints_blocks += 1
+    try:
+        yield
+    finally:
+        with _huge_ints_lock:
+            _huge_ints_blocks -= 1
+            if _huge_ints_blocks == 0:
+                sys.set_int_max_str_digits(_huge_ints_limit)
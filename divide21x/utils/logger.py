@@ -1,13 +1,16 @@
 import json
 import os
 from datetime import datetime
+from divide21x.utils.digits import allow_huge_ints
 
 SCORE = 'score'
 
 class EpisodeLogger:
-    def __init__(self, base_dir="./logs"):
-        os.makedirs(base_dir, exist_ok=True)
+    def __init__(self, base_dir="./logs", deferred=False):
+        # the dir is made when the first episode is saved
         self.base_dir = base_dir
+        # a deferred logger only saves when forced (e.g. once for a whole batch)
+        self.deferred = deferred
         self.info = {}
         self.episode = 0
         self.episode_log = []
@@ -28,13 +31,14 @@ class EpisodeLogger:
             else:
                 self.info[category][type] = message
     
-    def save_episode(self):
-        if not self.episode_log:
+    def save_episode(self, force=False):
+        if not self.episode_log or (self.deferred and not force):
             return
         
+        os.makedirs(self.base_dir, exist_ok=True)
         ts = datetime.now().strftime("%Y%m%d_%H%M%S")
         path = os.path.join(self.base_dir, f"episode_{self.episode}_{ts}.json")
-        with open(path, "w") as f:
+        with open(path, "w") as f, allow_huge_ints():
             json.dump(self.episode_log, f, indent=2)
         self.episode += 1
         return path
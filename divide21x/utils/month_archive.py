@@ -0,0 +1,438 @@
+'''
+Monthly archives of the challenges, results and leaderboards of a past month, one file per month in
+divide21x/archives/<year-month>.d21a, so historical analyses open a single file instead of hundreds of indented ones.
+
+An archive is
+    MAGIC, version (1 byte), index offset (uint64), index length (uint64), records, index
+where every record is zlib-compressed on its own and the index (zlib-compressed JSON) gives the [offset, length] of
+each of them:
+    challenges:     {challenge id: [offset, length]}                the challenge file, byte for byte
+    results:        {challenge id: {model alias: [offset, length]}} the entry of one model (compact JSON)
+    leaderboards:   {file name: [offset, length]}                   the leaderboard csv, byte for byte
+Readers mmap the archive, so reading the result of one (date, model) decompresses that record only.
+
+read_challenge(), read_results() and read_leaderboard() read from the archive of the month if there is one, and from
+the loose files otherwise (the current month, which is still growing, is never packed). A loose file written after
+the archive (e.g. by a regrade, which writes its results files back) is read instead of the archive, and
+pack_past_months() packs such a month again; packing keeps the entries of the previous archive whose loose files were
+removed, so a month can be regraded and repacked after --remove-results.
+
+    python -m divide21x.utils.month_archive                      (every past month without an up to date archive; the
+                                                                  pipeline workflow runs it after grading, and commits
+                                                                  the archives)
+    python -m divide21x.utils.month_archive --month 2025-11 --remove-results
+'''
+import argparse
+import json
+import mmap
+import os
+import struct
+import zlib
+from functools import lru_cache
+from divide21x.utils.digits import allow_huge_ints
+from divide21x.utils.util import YEAR_MONTH, get_challenge_file_name, get_challenge_id, get_utc_date, parse_challenge_file_name
+
+
+ROOT_DIR = './divide21x'
+ARCHIVES_DIR = 'archives'
+CHALLENGES_DIR = 'challenges'
+RESULTS_DIR = 'results'
+LEADERBOARDS_DIR = 'leaderboards'
+ARCHIVE_EXTENSION = '.d21a'
+MAGIC = b'D21A'
+VERSION = 1
+HEADER = struct.Struct('<4sBQQ')
+# index sections
+CHALLENGES = 'challenges'
+RESULTS = 'results'
+LEADERBOARDS = 'leaderboards'
+
+
+def get_archive_path(year_month, root=ROOT_DIR):
+    return os.path.join(root, ARCHIVES_DIR, year_month + ARCHIVE_EXTENSION)
+
+
+def _month_files(directory, extension):
+    '''
+    (name, path) of the files of a month dir with the extension, sorted by name (none if the dir does not exist)
+    '''
+    if not os.path.isdir(directory):
+        return []
+    return [(name, os.path.join(directory, name)) for name in sorted(os.listdir(directory)) if name.endswith(extension)]
+
+
+def _challenge_id_of(year_month, name):
+    parsed = parse_challenge_file_name(name)
+    if parsed is None:
+        return None
+    day, index = parsed
+    return get_challenge_id(f"{year_month}-{day:02d}", index)
+
+
+def pack_month(year_month, root=ROOT_DIR):
+    '''
+    packs the challenge, results and leaderboard files of the month into its archive (replacing the archive if there
+    is one, and keeping the entries of that archive that have no loose file any more). The archive is written to a
+    temporary file first, so readers never see a partial one.
+
+    Returns:
+        str|None: path of the archive, None if the month has no files.
+    '''
+    if not YEAR_MONTH.fullmatch(year_month):
+        raise ValueError("The month must be given as 'YYYY-MM'.")
+    archive_path = get_archive_path(year_month, root)
+    previous = open_archive(archive_path)
+    index = {CHALLENGES: {}, RESULTS: {}, LEADERBOARDS: {}}
+    records = []
+    offset = HEADER.size
+
+    def add(content=None, location=None):
+        '''
+        adds a record, compressing the content, or copying the (compressed) record at the location of the previous
+        archive
+        '''
+        nonlocal offset
+        if location is not None:
+            compressed = previous.buffer[location[0]:location[0] + location[1]]
+        else:
+            compressed = zlib.compress(content, 9)
+        records.append(compressed)
+        location = [offset, len(compressed)]
+        offset += len(compressed)
+        return location
+
+    for name, path in _month_files(os.path.join(root, CHALLENGES_DIR, year_month), '.json'):
+        challenge_id = _challenge_id_of(year_month, name)
+        if challenge_id is not None:
+            with open(path, 'rb') as f:
+                index[CHALLENGES][challenge_id] = add(f.read())
+    for name, path in _month_files(os.path.join(root, RESULTS_DIR, year_month), '.json'):
+        challenge_id = _challenge_id_of(year_month, name)
+        if challenge_id is None:
+            continue
+        with open(path, 'r') as f, allow_huge_ints():
+            results = json.load(f)
+            index[RESULTS][challenge_id] = {
+                alias: add(json.dumps(entry, separators=(',', ':')).encode()) for alias, entry in results.items()
+            }
+    for name, path in _month_files(os.path.join(root, LEADERBOARDS_DIR, year_month), '.csv'):
+        with open(path, 'rb') as f:
+            index[LEADERBOARDS][name] = add(f.read())
+    # what the previous archive holds and is not loose any more (e.g. its removed results)
+    if previous is not None:
+        for section in (CHALLENGES, LEADERBOARDS):
+            for name, location in previous.index[section].items():
+                if name not in index[section]:
+                    index[section][name] = add(location=location)
+        for challenge_id, locations in previous.index[RESULTS].items():
+            if challenge_id not in index[RESULTS]:
+                index[RESULTS][challenge_id] = {alias: add(location=location) for alias, location in locations.items()}
+    if not records:
+        return None
+
+    index_bytes = zlib.compress(json.dumps(index, separators=(',', ':')).encode(), 9)
+    os.makedirs(os.path.dirname(archive_path), exist_ok=True)
+    archive_path_tmp = f"{archive_path}.{os.getpid()}.tmp"
+    with open(archive_path_tmp, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, offset, len(index_bytes)))
+        for record in records:
+            f.write(record)
+        f.write(index_bytes)
+    os.replace(archive_path_tmp, archive_path)
+    return archive_path
+
+
+def remove_packed_results(year_month, root=ROOT_DIR):
+    '''
+    removes the results and leaderboard files of the month that its archive holds, once they read back identical.
+    The challenge files stay: the challenge store and catalog refer to them.
+
+    Returns:
+        int: number of files removed.
+    '''
+    archive = open_archive(get_archive_path(year_month, root))
+    if archive is None:
+        raise ValueError(f"Month {year_month} has not been packed.")
+    removed = 0
+    for name, path in _month_files(os.path.join(root, RESULTS_DIR, year_month), '.json'):
+        challenge_id = _challenge_id_of(year_month, name)
+        with open(path, 'r') as f, allow_huge_ints():
+            results = json.load(f)
+        if challenge_id is not None and archive.results(challenge_id) == results:
+            os.remove(path)
+            removed += 1
+    for name, path in _month_files(os.path.join(root, LEADERBOARDS_DIR, year_month), '.csv'):
+        with open(path, 'rb') as f:
+            content = f.read()
+        if archive.leaderboard(name) == content.decode():
+            os.remove(path)
+            removed += 1
+    return removed
+
+
+def _is_stale(year_month, root=ROOT_DIR):
+    '''
+    whether the month has a loose file written after its archive (True if it has no archive)
+    '''
+    archive = open_archive(get_archive_path(year_month, root))
+    if archive is None:
+        return True
+    for directory, extension in ((CHALLENGES_DIR, '.json'), (RESULTS_DIR, '.json'), (LEADERBOARDS_DIR, '.csv')):
+        for _, path in _month_files(os.path.join(root, directory, year_month), extension):
+            if _is_newer(path, archive):
+                return True
+    return False
+
+
+def pack_past_months(root=ROOT_DIR):
+    '''
+    packs every month before the current one that has files but no archive yet, or files written after its archive.
+
+    Returns:
+        list[str]: the months packed.
+    '''
+    current_month = str(get_utc_date())[:7]
+    months = set()
+    for directory in (CHALLENGES_DIR, RESULTS_DIR, LEADERBOARDS_DIR):
+        if os.path.isdir(os.path.join(root, directory)):
+            months.update(name for name in os.listdir(os.path.join(root, directory)) if YEAR_MONTH.fullmatch(name))
+    packed = []
+    for year_month in sorted(months):
+        if year_month < current_month and _is_stale(year_month, root):
+            if pack_month(year_month, root) is not None:
+                packed.append(year_month)
+    return packed
+
+
+class MonthArchive:
+    '''
+    read-only, memory-mapped view of a month archive. Only the index is parsed when it is opened; every record is
+    decompressed on demand.
+
+    Args:
+        path (str): path of the archive.
+    '''
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            # loose files written after this are newer than the archive
+            self.mtime_ns = os.fstat(f.fileno()).st_mtime_ns
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, index_offset, index_length = HEADER.unpack_from(self.buffer, 0)
+        if magic != MAGIC or version != VERSION:
+            self.buffer.close()
+            raise ValueError(f"{path} is not a month archive.")
+        self.index = json.loads(zlib.decompress(self.buffer[index_offset:index_offset + index_length]))
+
+    def _read(self, location):
+        offset, length = location
+        return zlib.decompress(self.buffer[offset:offset + length])
+
+    def challenge_ids(self):
+        return list(self.index[CHALLENGES])
+
+    def models(self, challenge_id):
+        return list(self.index[RESULTS].get(challenge_id, {}))
+
+    def results_ids(self):
+        '''
+        ids of the challenges the archive has results for
+        '''
+        return list(self.index[RESULTS])
+
+    def challenge(self, challenge_id):
+        '''
+        Returns:
+            dict|None: the challenge with the id, None if the archive does not have it.
+        '''
+        location = self.index[CHALLENGES].get(challenge_id)
+        if location is None:
+            return None
+        with allow_huge_ints():
+            return json.loads(self._read(location))
+
+    def result(self, challenge_id, alias):
+        '''
+        Returns:
+            dict|None: the result entry of the model for the challenge (answer, proximity, score), None if there is none.
+        '''
+        location = self.index[RESULTS].get(challenge_id, {}).get(alias)
+        if location is None:
+            return None
+        with allow_huge_ints():
+            return json.loads(self._read(location))
+
+    def results(self, challenge_id):
+        '''
+        Returns:
+            dict|None: the results file of the challenge ({alias: entry}, in its order), None if there is none.
+        '''
+        if challenge_id not in self.index[RESULTS]:
+            return None
+        return {alias: self.result(challenge_id, alias) for alias in self.index[RESULTS][challenge_id]}
+
+    def leaderboard(self, name):
+        '''
+        Returns:
+            str|None: the leaderboard csv with the file name ('<day>.csv', 'average_score.csv', ...), None if there is none.
+        '''
+        location = self.index[LEADERBOARDS].get(name)
+        return None if location is None else self._read(location).decode()
+
+    def close(self):
+        self.buffer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+@lru_cache(maxsize=16)
+def _open_archive(path, mtime_ns, size):
+    return MonthArchive(path)
+
+
+def open_archive(path):
+    '''
+    the archive at the path, opened once per process (and again if it is replaced), or None if there is none
+    '''
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return _open_archive(path, stat.st_mtime_ns, stat.st_size)
+
+
+def _is_newer(path, archive):
+    '''
+    whether the loose file at the path was written after the archive (False if there is no such file)
+    '''
+    try:
+        return os.stat(path).st_mtime_ns > archive.mtime_ns
+    except FileNotFoundError:
+        return False
+
+
+def _read_json(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f, allow_huge_ints():
+        return json.load(f)
+
+
+def get_results_path(date, index=0, root=ROOT_DIR):
+    '''
+    path of the (loose) results file of challenge index of the set of the date
+    '''
+    date = str(date)
+    return os.path.join(root, RESULTS_DIR, date[:7], get_challenge_file_name(date, index))
+
+
+def read_challenge(date, index=0, root=ROOT_DIR):
+    '''
+    challenge index of the set of the date ('YYYY-MM-DD'), from the archive of its month or its challenge file
+    (whichever is newer).
+
+    Returns:
+        dict|None
+    '''
+    date = str(date)
+    path = os.path.join(root, CHALLENGES_DIR, date[:7], get_challenge_file_name(date, index))
+    archive = open_archive(get_archive_path(date[:7], root))
+    if archive is not None and not _is_newer(path, archive):
+        return archive.challenge(get_challenge_id(date, index))
+    return _read_json(path)
+
+
+def has_results(date, index=0, root=ROOT_DIR):
+    '''
+    whether challenge index of the set of the date has results, in the archive of its month or in a results file
+    '''
+    date = str(date)
+    if os.path.exists(get_results_path(date, index, root)):
+        return True
+    archive = open_archive(get_archive_path(date[:7], root))
+    return archive is not None and bool(archive.models(get_challenge_id(date, index)))
+
+
+def read_results(date, alias=None, index=0, root=ROOT_DIR):
+    '''
+    results of challenge index of the set of the date, from the archive of its month or its results file (whichever
+    is newer): the entry of the model alias, or every entry ({alias: entry}) if alias is None.
+
+    Returns:
+        dict|None
+    '''
+    date = str(date)
+    path = get_results_path(date, index, root)
+    archive = open_archive(get_archive_path(date[:7], root))
+    if archive is not None and not _is_newer(path, archive):
+        challenge_id = get_challenge_id(date, index)
+        return archive.results(challenge_id) if alias is None else archive.result(challenge_id, alias)
+    results = _read_json(path)
+    if results is None or alias is None:
+        return results
+    return results.get(alias)
+
+
+def read_month_results(year_month, root=ROOT_DIR):
+    '''
+    results of every challenge of the month with results, from its archive and its results files (whichever is newer
+    for each of them).
+
+    Returns:
+        dict: {challenge id: {alias: entry}}, by challenge id.
+    '''
+    archive = open_archive(get_archive_path(year_month, root))
+    challenge_ids = set(archive.results_ids()) if archive is not None else set()
+    for name, _ in _month_files(os.path.join(root, RESULTS_DIR, year_month), '.json'):
+        challenge_id = _challenge_id_of(year_month, name)
+        if challenge_id is not None:
+            challenge_ids.add(challenge_id)
+    month_results = {}
+    for challenge_id in sorted(challenge_ids):
+        date, _, index = challenge_id.partition('_')
+        month_results[challenge_id] = read_results(date, index=int(index or 0), root=root)
+    return month_results
+
+
+def read_leaderboard(year_month, name, root=ROOT_DIR):
+    '''
+    leaderboard csv of the month with the file name, from the archive of the month or the loose file (whichever is
+    newer).
+
+    Returns:
+        str|None
+    '''
+    path = os.path.join(root, LEADERBOARDS_DIR, year_month, name)
+    archive = open_archive(get_archive_path(year_month, root))
+    if archive is not None and not _is_newer(path, archive):
+        return archive.leaderboard(name)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        return f.read().decode()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pack past months of Divide21x challenges and results into archives.")
+    parser.add_argument("--root", default=ROOT_DIR)
+    parser.add_argument("--month", help="YYYY-MM to pack (every past month without an archive if not given)")
+    parser.add_argument("--remove-results", action="store_true",
+                        help="remove the results and leaderboard files of the packed months once they read back identical")
+    args = parser.parse_args()
+
+    months = [args.month] if args.month else pack_past_months(args.root)
+    for year_month in months:
+        if args.month and pack_month(year_month, args.root) is None:
+            print(f"{year_month}: nothing to pack")
+            continue
+        print(f"packed {year_month} into {get_archive_path(year_month, args.root)}")
+        if args.remove_results:
+            print(f"removed {remove_packed_results(year_month, args.root)} files of {year_month}")
+
+
+if __name__ == "__main__":
+    main()
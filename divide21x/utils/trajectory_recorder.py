@@ -0,0 +1,190 @@
+import itertools
+import os
+from datetime import datetime
+import numpy as np
+from divide21x.simulator.transition_kernel import parse_action
+
+# recording levels
+RECORD_OFF = 'off'
+RECORD_ACTIONS = 'actions'
+RECORD_STATES = 'states'
+RECORD_LEVELS = (RECORD_OFF, RECORD_ACTIONS, RECORD_STATES)
+# a missing value (invalid division/digit, or rindex not given)
+NONE = -1
+# ids of the recorders of this process (with the pid, they keep the episode files of recorders sharing a dir apart)
+RECORDER_IDS = itertools.count()
+
+
+class GrowableArray:
+    '''
+    1D NumPy buffer that is preallocated and doubles its capacity when it fills up,
+    so appending n values costs O(n) overall.
+    '''
+    def __init__(self, dtype, capacity=64):
+        self.buffer = np.empty(capacity, dtype=dtype)
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def _reserve(self, size):
+        if size > len(self.buffer):
+            buffer = np.empty(max(size, 2*len(self.buffer)), dtype=self.buffer.dtype)
+            buffer[:self.size] = self.buffer[:self.size]
+            self.buffer = buffer
+
+    def append(self, value):
+        self._reserve(self.size + 1)
+        self.buffer[self.size] = value
+        self.size += 1
+
+    def extend(self, values):
+        values = np.asarray(values).ravel()
+        self._reserve(self.size + len(values))
+        self.buffer[self.size:self.size + len(values)] = values
+        self.size += len(values)
+
+    def array(self):
+        return self.buffer[:self.size].copy()
+
+
+class TrajectoryRecorder:
+    '''
+    records the transitions of a Divide21EnvSimulator episode column by column and flushes them once per episode,
+    either to a compressed .npz file in base_dir, or to memory (self.episodes) if base_dir is None.
+
+    An episode is flushed when it ends: on end_episode() (the simulator calls it when the episode terminates or is
+    truncated, and on close()) and when the next one starts. One still in progress when the recorder is dropped is
+    not written, so close the simulator (or use it in a with block) to keep it.
+
+    Recording levels:
+        off:        nothing is recorded
+        actions:    v, g, r (-1 for a missing value), reward, terminated and truncated of every step
+        states:     the above, plus every observation of the episode (the one from reset first) in the Divide21Env
+                    observation form. Ragged fields are flattened, and observation k is [x_offsets[k]:x_offsets[k+1]]
+                    for x in d, a and p.
+    '''
+    def __init__(self, level=RECORD_STATES, base_dir=None):
+        if level not in RECORD_LEVELS:
+            raise ValueError(f"Recording level must be one of: {', '.join(RECORD_LEVELS)}.")
+        self.level = level
+        self.base_dir = base_dir
+        if self.base_dir is not None and self.level != RECORD_OFF:
+            os.makedirs(self.base_dir, exist_ok=True)
+        self.episode = 0
+        self.episodes = []
+        self.recorder_id = next(RECORDER_IDS)
+        self._new_episode()
+
+    def _new_episode(self):
+        self.steps = 0
+        self.static_number = None
+        self.columns = {
+            "v": GrowableArray(np.int8),
+            "g": GrowableArray(np.int8),
+            "r": GrowableArray(np.int64),
+            "reward": GrowableArray(np.float64),
+            "terminated": GrowableArray(bool),
+            "truncated": GrowableArray(bool),
+        }
+        if self.level == RECORD_STATES:
+            self.columns.update({
+                "d": GrowableArray(np.int8),
+                "d_offsets": GrowableArray(np.int64),
+                "a": GrowableArray(np.int8),
+                "a_offsets": GrowableArray(np.int64),
+                "p": GrowableArray(np.int64),
+                "p_offsets": GrowableArray(np.int64),
+                "t": GrowableArray(np.int64),
+            })
+            for offsets in ("d_offsets", "a_offsets", "p_offsets"):
+                self.columns[offsets].append(0)
+
+    def _record_observation(self, obs):
+        if self.static_number is None:
+            self.static_number = np.asarray(obs["s"], dtype=np.int8).copy()
+        for field in ("d", "a", "p"):
+            self.columns[field].extend(obs[field])
+            self.columns[field + "_offsets"].append(len(self.columns[field]))
+        self.columns["t"].append(obs["t"])
+
+    def start_episode(self, obs):
+        '''
+        flushes the episode in progress, if any, and starts a new one from the observation returned by reset
+        '''
+        if self.steps:
+            self.end_episode()
+        else:
+            self._new_episode()
+        if self.level == RECORD_STATES:
+            self._record_observation(obs)
+
+    def record_step(self, action, obs, reward, terminated, truncated):
+        if self.level == RECORD_OFF:
+            return
+        division, digit, rindex = parse_action(action)
+        self.columns["v"].append(NONE if division is None else int(division))
+        self.columns["g"].append(NONE if digit is None else digit)
+        self.columns["r"].append(NONE if rindex is None else rindex)
+        self.columns["reward"].append(reward)
+        self.columns["terminated"].append(terminated)
+        self.columns["truncated"].append(truncated)
+        if self.level == RECORD_STATES:
+            self._record_observation(obs)
+        self.steps += 1
+
+    def get_episode(self):
+        '''
+        returns the episode in progress as a dictionary of arrays
+        '''
+        episode = {name: column.array() for name, column in self.columns.items()}
+        if self.level == RECORD_STATES:
+            episode["s"] = self.static_number if self.static_number is not None else np.zeros(0, dtype=np.int8)
+        return episode
+
+    def end_episode(self):
+        '''
+        flushes the episode in progress and starts a new one.
+
+        Returns:
+            str | dict | None: the path of the .npz file (episode_<n>_<timestamp>_<pid>_<recorder id>.npz), the
+                episode itself if kept in memory, or None if there was nothing to record.
+        '''
+        result = None
+        if self.level != RECORD_OFF and self.steps:
+            episode = self.get_episode()
+            if self.base_dir is not None:
+                ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+                name = f"episode_{self.episode}_{ts}_{os.getpid()}_{self.recorder_id}.npz"
+                result = os.path.join(self.base_dir, name)
+                np.savez_compressed(result, **episode)
+            else:
+                self.episodes.append(episode)
+                result = episode
+            self.episode += 1
+        self._new_episode()
+        return result
+
+
+def load_episode(path):
+    '''
+    loads an episode flushed by TrajectoryRecorder as a dictionary of arrays
+    '''
+    with np.load(path) as data:
+        return {name: data[name] for name in data.files}
+
+
+def get_observations(episode):
+    '''
+    rebuilds the observations of an episode recorded at the states level, in the Divide21Env observation form
+    (so they can be decoded with Divide21EnvSimulator._decode_state)
+    '''
+    observations = []
+    for k in range(len(episode["t"])):
+        observation = {"s": episode["s"]}
+        for field in ("d", "a", "p"):
+            offsets = episode[field + "_offsets"]
+            observation[field] = episode[field][offsets[k]:offsets[k+1]]
+        observation["t"] = np.int64(episode["t"][k])
+        observations.append(observation)
+    return observations
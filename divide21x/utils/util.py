@@ -1,5 +1,20 @@
 import datetime
 import json
+import os
+import re
+from functools import lru_cache
+
+
+# challenges per day, when the pipeline is not told otherwise
+CHALLENGES_PER_DAY_ENV = 'DIVIDE21X_CHALLENGES_PER_DAY'
+CHALLENGE_FILE_NAME = re.compile(r"(\d{1,2})(?:_(\d+))?\.json")
+# month dirs of the challenges, results and leaderboards
+YEAR_MONTH = re.compile(r"\d{4}-\d{2}")
+# points of each field of the states and actions: every version of the rubric in RUBRICS_DIR/<version>.json, and the
+# current one named in RUBRIC_FILE ({"version": <version>})
+RUBRIC_FILE = "divide21x/grading/rubric.json"
+RUBRICS_DIR = "divide21x/grading/rubrics"
+RUBRIC_VERSION = "version"
 
 def get_utc_date(as_iso=True):
     """
@@ -59,19 +74,82 @@ def get_llm_registry():
     return registry
 
 
-def get_rubric():
+@lru_cache(maxsize=4)
+def _load_rubric(path, mtime_ns):
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def get_rubric_version():
+    '''
+    returns the version of the current rubric, named in divide21x/grading/rubric.json (None if it cannot be read)
+    '''
+    version = None
+    try:
+        version = _load_rubric(RUBRIC_FILE, os.stat(RUBRIC_FILE).st_mtime_ns)[RUBRIC_VERSION]
+    except Exception as e:
+        version = None
+    
+    return version
+
+
+def set_rubric_version(version):
+    '''
+    makes the rubric of the version (divide21x/grading/rubrics/<version>.json) the current one
+    '''
+    with open(RUBRIC_FILE, "w") as f:
+        json.dump({RUBRIC_VERSION: version}, f, indent=4)
+
+
+def get_rubric(version=None):
     '''
-    returns the rubric from divide21x\grading\rubric.json
+    returns the rubric of the version from divide21x/grading/rubrics/<version>.json, the current one (see
+    get_rubric_version()) by default, or None if there is none. It is read once per process (and again if the file
+    changes), and the same dictionary is returned to every caller, so it must not be modified.
     '''
     rubric = None
+    version = version or get_rubric_version()
+    if version is None:
+        return None
+    path = os.path.join(RUBRICS_DIR, f"{version}.json")
     try:
-        with open("divide21x/grading/rubric.json", "r") as f:
-            rubric = json.load(f)
+        rubric = _load_rubric(path, os.stat(path).st_mtime_ns)
     except Exception as e:
         rubric = None
     
     return rubric
 
 
+def get_challenges_per_day():
+    """
+    Returns the number of challenges in the set of each day (DIVIDE21X_CHALLENGES_PER_DAY, 1 by default).
+    """
+    return max(1, int(os.environ.get(CHALLENGES_PER_DAY_ENV, 1)))
+
+def get_challenge_id(date, index=0):
+    """
+    Returns the id of a challenge of the set of a date: the date ('YYYY-MM-DD') for the first one (index 0, the
+    challenge of the day), 'YYYY-MM-DD_<index>' for the others.
+    """
+    return str(date) if index == 0 else f"{date}_{index}"
+
+def get_challenge_file_name(date, index=0):
+    """
+    Returns the name of the challenge (and results) file of a challenge of the set of a date: '<day>.json' for the
+    first one, '<day>_<index>.json' for the others.
+    """
+    day = int(str(date)[8:10])
+    return f"{day}.json" if index == 0 else f"{day}_{index}.json"
+
+def parse_challenge_file_name(name):
+    """
+    Returns (day, index) of a challenge (or results) file name, or None if it is not one.
+    """
+    match = CHALLENGE_FILE_NAME.fullmatch(name)
+    if match is None:
+        return None
+    return int(match.group(1)), int(match.group(2) or 0)
+
+
 if __name__ == "__main__":
     print(get_utc_day())
\ No newline at end of file
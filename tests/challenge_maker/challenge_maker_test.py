@@ -0,0 +1,118 @@
+import hashlib
+import json
+import os
+import random
+import pytest
+import divide21x.challenge_maker.challenge_maker as challenge_maker_module
+from divide21x.challenge_maker.challenge_catalog import BAD, DIGIT_CHANGE, YEAR_MONTH, ChallengeCatalog, challenge_features
+from divide21x.challenge_maker.challenge_maker import SYNTHESIS, ChallengeMaker, make_challenges
+from divide21x.challenge_maker.challenge_store import get_challenge_set_size, load_challenge
+
+
+def read_challenges(challenges_dir):
+    challenges = {}
+    for year_month in sorted(os.listdir(challenges_dir)):
+        # the <year-month> dirs of challenge files (and their sealed answers) only
+        if not YEAR_MONTH.fullmatch(year_month):
+            continue
+        for name in sorted(os.listdir(os.path.join(challenges_dir, year_month))):
+            with open(os.path.join(challenges_dir, year_month, name), 'rb') as f:
+                challenges[(year_month, name)] = f.read()
+    return challenges
+
+
+def test_backfill_matches_daily_path(tmp_path, monkeypatch):
+    # the daily path, one date at a time
+    monkeypatch.setattr(challenge_maker_module, "CHALLENGES_DIR", str(tmp_path / "daily"))
+    for date in ("2025-01-30", "2025-01-31", "2025-02-01", "2025-02-02"):
+        ChallengeMaker().make_challenge(date)
+    # the same dates over a process pool, leaving the global random module alone
+    monkeypatch.setattr(challenge_maker_module, "CHALLENGES_DIR", str(tmp_path / "backfill"))
+    random.seed(3)
+    expected = random.random()
+    random.seed(3)
+    dates = make_challenges("2025-01-30", "2025-02-02", workers=2)
+    assert random.random() == expected
+    assert dates == ["2025-01-30", "2025-01-31", "2025-02-01", "2025-02-02"]
+
+    daily = read_challenges(tmp_path / "daily")
+    # every challenge file with its sealed answer
+    assert list(daily) == [
+        (year_month, day + extension) for year_month, day in (("2025-01", "30"), ("2025-01", "31"), ("2025-02", "1"), ("2025-02", "2"))
+        for extension in (".answer", ".json")
+    ]
+    assert read_challenges(tmp_path / "backfill") == daily
+    # existing challenges are kept as they are
+    make_challenges("2025-01-31", "2025-02-01", workers=1)
+    assert read_challenges(tmp_path / "backfill") == daily
+
+
+def test_catalog_is_updated_on_every_write(tmp_path, pipeline_dirs):
+    make_challenges("2025-03-01", "2025-03-12", workers=3)
+    catalog = ChallengeCatalog(str(tmp_path / "challenges"))
+    rows = catalog.query()
+    assert [row["date"] for row in rows] == [f"2025-03-{day:02d}" for day in range(1, 13)]
+    # the recorded features are the ones re-derived from the files
+    for row in rows:
+        with open(tmp_path / "challenges" / row["path"], "rb") as f:
+            content = f.read()
+        assert row["content_hash"] == hashlib.sha256(content).hexdigest()
+        features = challenge_features(json.loads(content))
+        assert {key: row[key] for key in features} == features
+    # queries filter on the features
+    bad_divisions = catalog.query(division=BAD, min_digits=5, min_players=3)
+    assert bad_divisions == [
+        row for row in rows if row["division"] == BAD and row["digits"] >= 5 and row["players"] >= 3
+    ]
+    assert catalog.query(action_type=DIGIT_CHANGE) == [row for row in rows if row["division"] is None]
+    assert catalog.get("2025-03-04") == rows[3]
+    assert catalog.get("2025-04-01") is None
+    # rebuilding from the files gives the same catalog
+    assert catalog.rebuild() == 12
+    assert catalog.query() == rows
+    catalog.close()
+    # and so does opening a new one (the catalog file is not committed)
+    os.remove(tmp_path / "challenges" / "catalog.sqlite")
+    catalog = ChallengeCatalog(str(tmp_path / "challenges"))
+    assert catalog.query() == rows
+    catalog.close()
+
+
+def test_synthesized_challenges(tmp_path, monkeypatch):
+    for name in ("first", "second"):
+        monkeypatch.setattr(challenge_maker_module, "CHALLENGES_DIR", str(tmp_path / name))
+        make_challenges("2025-05-01", "2025-05-04", workers=2, generator=SYNTHESIS, digits=12, players=6, rollout_steps=20)
+    assert read_challenges(tmp_path / "first") == read_challenges(tmp_path / "second")
+    catalog = ChallengeCatalog(str(tmp_path / "first"))
+    rows = catalog.query()
+    assert len(rows) == 4 and all(row["static_digits"] == 12 and row["players"] == 6 for row in rows)
+    catalog.close()
+    # the date sets the shape of the daily (rollout) challenges
+    with pytest.raises(ValueError):
+        ChallengeMaker(digits=12)
+
+
+def test_challenge_sets(tmp_path, monkeypatch):
+    monkeypatch.setattr(challenge_maker_module, "CHALLENGES_DIR", str(tmp_path / "daily"))
+    ChallengeMaker().make_challenge("2025-06-02")
+    # a set of 3 per day: the challenge of the day, then <day>_1.json and <day>_2.json, each seeded from (date, index)
+    for name in ("first", "second"):
+        monkeypatch.setattr(challenge_maker_module, "CHALLENGES_DIR", str(tmp_path / name))
+        make_challenges("2025-06-01", "2025-06-02", workers=2, size=3)
+    first = read_challenges(tmp_path / "first")
+    assert first == read_challenges(tmp_path / "second")
+    assert list(first) == [
+        ("2025-06", name + extension) for name in ("1", "1_1", "1_2", "2", "2_1", "2_2") for extension in (".answer", ".json")
+    ]
+    assert first[("2025-06", "2.json")] == read_challenges(tmp_path / "daily")[("2025-06", "2.json")]
+    challenges = [json.loads(content)["challenge"] for (year_month, name), content in first.items() if name.endswith(".json")]
+    assert len({json.dumps(challenge, sort_keys=True) for challenge in challenges}) == 6
+    assert get_challenge_set_size(str(tmp_path / "first"), "2025-06-02") == 3
+    assert get_challenge_set_size(str(tmp_path / "first"), "2025-06-03") == 0
+    assert json.loads(json.dumps(load_challenge(str(tmp_path / "first"), "2025-06-01", 2))) == json.loads(first[("2025-06", "1_2.json")])
+    # the catalog keys them by (date, index)
+    catalog = ChallengeCatalog(str(tmp_path / "first"))
+    assert [(row["date"], row["idx"]) for row in catalog.query()] == [(date, index) for date in ("2025-06-01", "2025-06-02") for index in range(3)]
+    assert catalog.get("2025-06-01", 1)["path"] == "2025-06/1_1.json"
+    assert catalog.rebuild() == 6
+    catalog.close()
@@ -0,0 +1,102 @@
+import json
+import os
+import shutil
+import pytest
+import divide21x.evaluation.evaluator as evaluator_module
+from divide21x.challenge_maker.challenge_maker import ChallengeMaker
+from divide21x.challenge_maker.challenge_store import ChallengeStore, challenge_key, load_answer, load_challenge
+from divide21x.evaluation.evaluator import Evaluator
+from divide21x.simulator.transition_kernel import apply_action
+
+
+CHALLENGES_DIR = './divide21x/challenges'
+
+
+def test_store_renders_the_challenge_files(tmp_path):
+    # the challenge files of the repo, imported into a fresh store
+    for year_month in ("2025-11", "2025-12"):
+        shutil.copytree(os.path.join(CHALLENGES_DIR, year_month), tmp_path / year_month)
+    challenge_store = ChallengeStore(str(tmp_path))
+    assert challenge_store.import_all() == 31
+    assert challenge_store.import_all() == 0
+    # the examples are stored once, and every date gets the JSON file it was made with
+    assert len(os.listdir(tmp_path / "store" / "examples")) == 1
+    for date in ("2025-11-19", "2025-12-01", "2025-12-19"):
+        with open(tmp_path / date[:7] / f"{int(date[8:])}.json") as f:
+            content = f.read()
+        assert challenge_store.render(challenge_store.key_of(date)) == content
+        assert load_challenge(str(tmp_path), date) == challenge_store.load(challenge_store.key_of(date))
+        assert json.loads(json.dumps(load_challenge(str(tmp_path), date))) == json.loads(content)
+
+
+def test_identical_challenges_are_stored_once(tmp_path):
+    challenge_store = ChallengeStore(str(tmp_path))
+    state = {"s": 523, "d": 195, "a": {0: [0, 1, 2], 1: [3], 2: [4, 9]}, "p": [{"i": 0, "c": -2, "m": 1}], "t": 0}
+    action = {"v": True, "g": 3, "r": None}
+    examples = ChallengeMaker()._build_examples()
+    key = challenge_store.put("2025-01-01", state, action, examples)
+    assert challenge_store.put("2025-01-02", state, action, examples) == key
+    assert challenge_store.key_of("2025-01-02") == key and challenge_store.key_of("2025-01-03") is None
+    objects = [name for _, _, names in os.walk(tmp_path / "store" / "objects") for name in names]
+    assert objects == [key + ".bin"]
+    assert challenge_store.get(key) == (state, action, challenge_store.put_examples(examples))
+    # the key is canonical: JSON string keys and list order do not change it, the action does
+    shuffled = {**state, "a": {"2": [9, 4], "0": [2, 0, 1], "1": [3]}}
+    assert challenge_key(shuffled, action) == key
+    assert challenge_key(state, {"v": True, "g": 5, "r": None}) != key
+    # but only the canonical form is stored, so the JSON view gives it back as it was
+    with pytest.raises(ValueError):
+        challenge_store.put("2025-01-04", shuffled, action, examples)
+    with pytest.raises(ValueError):
+        challenge_store.put("2025-01-04", state, {"v": 1, "g": 3, "r": None}, examples)
+
+
+def test_load_challenge_falls_back_to_the_json_file(tmp_path):
+    os.makedirs(tmp_path / "2025-11")
+    shutil.copy(os.path.join(CHALLENGES_DIR, "2025-11", "19.json"), tmp_path / "2025-11" / "19.json")
+    with open(tmp_path / "2025-11" / "19.json") as f:
+        assert load_challenge(str(tmp_path), "2025-11-19") == json.load(f)
+    assert load_challenge(str(tmp_path), "2025-11-20") is None
+
+
+def test_sealed_answers(tmp_path, monkeypatch):
+    challenge_store = ChallengeStore(str(tmp_path))
+    state = {"s": 523, "d": 195, "a": {0: [0, 1, 2], 1: [3], 2: [4, 9]}, "p": [{"i": 0, "c": -2, "m": 1}], "t": 0}
+    action = {"v": True, "g": 3, "r": None}
+    key = challenge_store.put("2025-01-01", state, action, ChallengeMaker()._build_examples())
+    os.makedirs(tmp_path / "2025-01")
+    with open(tmp_path / "2025-01" / "1.json", "w") as f:
+        f.write(challenge_store.render(key))
+    assert challenge_store.get_answer("2025-01-01") is None and challenge_store.seal_all() == 1
+    assert challenge_store.seal_all() == 0
+    # the answer is sealed next to the challenge file, so it is committed with it
+    assert sorted(os.listdir(tmp_path / "2025-01")) == ["1.answer", "1.json"]
+    assert load_answer(str(tmp_path), "2025-01-01") == apply_action(state, action)[0]
+    assert load_answer(str(tmp_path), "2025-01-02") is None
+    # the answer is never part of the challenge
+    assert "o" not in load_challenge(str(tmp_path), "2025-01-01")["challenge"]
+    # grading reads the sealed answer without simulating anything, also in a checkout without the store
+    shutil.rmtree(tmp_path / "store")
+    monkeypatch.setattr(evaluator_module, "CHALLENGES_DIR", str(tmp_path))
+    monkeypatch.setattr(evaluator_module, "get_utc_date", lambda: "2025-01-01")
+    monkeypatch.setattr(evaluator_module, "get_transition_cache", None)
+    evaluator = Evaluator(state=apply_action(state, action)[0])
+    evaluator.compare_to_ground_truth2()
+    assert evaluator.ground_truth_state_score == evaluator.compare_states(state, state)[1]
+    # a record that does not match its seal, or its challenge, is refused
+    answer_path = tmp_path / "2025-01" / "1.answer"
+    with open(answer_path, "rb") as f:
+        record = f.read()
+    with open(answer_path, "wb") as f:
+        f.write(record[:-1] + bytes([record[-1] ^ 1]))
+    with pytest.raises(ValueError):
+        challenge_store.get_answer("2025-01-01")
+    with open(answer_path, "wb") as f:
+        f.write(record)
+    with open(tmp_path / "2025-01" / "1.json") as f:
+        content = json.load(f)
+    content["challenge"]["a"]["g"] = 4
+    with open(tmp_path / "2025-01" / "1.json", "w") as f:
+        json.dump(content, f)
+    with pytest.raises(ValueError):
+        challenge_store.get_answer("2025-01-01")
@@ -0,0 +1,110 @@
+import json
+import os
+import random
+import sqlite3
+import divide21x.challenge_maker.challenge_maker as challenge_maker_module
+from divide21x.challenge_maker.challenge_maker import REJECTED, ChallengeMaker, make_challenges
+from divide21x.challenge_maker.duplicate_index import (
+    DUPLICATE, INDEX_NAME, NEAR_DUPLICATE, SAME_STATE, DuplicateIndex, challenge_signature, pair_fingerprint,
+    signature_similarity, state_fingerprint
+)
+from divide21x.challenge_maker.state_synthesizer import synthesize_state
+
+
+STATE = {
+    "s": 65929,
+    "d": 2271,
+    "a": {0: [0, 3, 5, 7, 8], 1: [0, 3, 5, 6, 9], 2: [3, 5, 6, 7, 8], 3: [1, 6, 8, 9]},
+    "p": [{"i": 0, "c": 9, "m": 0}, {"i": 1, "c": -20, "m": 1}, {"i": 2, "c": 4, "m": 0}],
+    "t": 1
+}
+ACTION = {"v": True, "g": 9, "r": None}
+
+
+def test_fingerprints_are_order_insensitive():
+    # JSON keys, digit list order, and the order and ids of the players (with the turn following its player)
+    reordered = {
+        "s": 65929,
+        "d": 2271,
+        "a": {"3": [9, 8, 6, 1], "2": [3, 5, 6, 7, 8], "1": [0, 3, 5, 6, 9], "0": [8, 7, 5, 3, 0]},
+        "p": [{"i": 0, "c": 4, "m": 0}, {"i": 1, "c": 9, "m": 0}, {"i": 2, "c": -20, "m": 1}],
+        "t": 2
+    }
+    assert state_fingerprint(reordered) == state_fingerprint(STATE)
+    assert pair_fingerprint(reordered, ACTION) == pair_fingerprint(STATE, ACTION)
+    assert signature_similarity(challenge_signature(reordered, ACTION), challenge_signature(STATE, ACTION)) == 1
+    # but not to who plays next, nor to the action
+    assert state_fingerprint({**STATE, "t": 0}) != state_fingerprint(STATE)
+    assert pair_fingerprint(STATE, {"v": True, "g": 3, "r": None}) != pair_fingerprint(STATE, ACTION)
+
+
+def test_duplicates_and_near_duplicates_are_found(tmp_path):
+    duplicate_index = DuplicateIndex(str(tmp_path))
+    rng = random.Random(5)
+    for day in range(1, 29):
+        state = synthesize_state(rng, 30, 8)
+        duplicate_index.add(f"2025-02-{day:02d}", 0, state, {"v": True, "g": rng.randint(2, 9), "r": None})
+    duplicate_index.add("2025-03-01", 0, STATE, ACTION)
+    assert len(duplicate_index) == 29
+
+    assert duplicate_index.find(STATE, ACTION) == (DUPLICATE, "2025-03-01", 1.0)
+    assert duplicate_index.find(STATE, {"v": False, "g": 1, "r": 3}) == (SAME_STATE, "2025-03-01", 1.0)
+    # one more player
+    near = {**STATE, "p": STATE["p"] + [{"i": 3, "c": 0, "m": 0}]}
+    kind, challenge_id, similarity = duplicate_index.find(near, ACTION)
+    assert (kind, challenge_id) == (NEAR_DUPLICATE, "2025-03-01") and similarity < 1
+    # only the challenges before the given one count
+    assert duplicate_index.find(STATE, ACTION, before=("2025-03-01", 0)) is None
+    assert duplicate_index.find(synthesize_state(rng, 30, 8), ACTION) is None
+    duplicate_index.close()
+
+
+def test_index_of_another_version_is_rebuilt(tmp_path):
+    os.makedirs(tmp_path / "2025-11")
+    with open("./divide21x/challenges/2025-11/19.json") as f, open(tmp_path / "2025-11" / "19.json", "w") as g:
+        g.write(f.read())
+    DuplicateIndex(str(tmp_path)).close()
+    # an index whose fingerprints were made another way
+    connection = sqlite3.connect(tmp_path / INDEX_NAME)
+    connection.execute("UPDATE challenges SET state_fingerprint = 'old', pair_fingerprint = 'old'")
+    connection.execute("PRAGMA user_version = 1")
+    connection.commit()
+    connection.close()
+    with open(tmp_path / "2025-11" / "19.json") as f:
+        challenge = json.load(f)["challenge"]
+    duplicate_index = DuplicateIndex(str(tmp_path))
+    assert duplicate_index.find(challenge["z"], challenge["a"]) == (DUPLICATE, "2025-11-19", 1.0)
+    duplicate_index.close()
+
+
+def test_maker_redraws_duplicates(tmp_path, monkeypatch):
+    monkeypatch.setattr(challenge_maker_module, "CHALLENGES_DIR", str(tmp_path / "first"))
+    challenge_maker = ChallengeMaker()
+    challenge_maker.make_challenge("2025-08-02")
+    first_state, first_action = challenge_maker.get_state(), challenge_maker.get_action()
+    # the same challenge, made the day before
+    monkeypatch.setattr(challenge_maker_module, "CHALLENGES_DIR", str(tmp_path / "second"))
+    duplicate_index = DuplicateIndex(str(tmp_path / "second"))
+    duplicate_index.add("2025-08-01", 0, first_state, first_action)
+    duplicate_index.close()
+    challenge_maker = ChallengeMaker()
+    challenge_maker._make_challenge("2025-08-02")
+    assert challenge_maker.logger.info[challenge_maker_module.CHALLENGE][REJECTED]
+    assert pair_fingerprint(challenge_maker.get_state(), challenge_maker.get_action()) != pair_fingerprint(first_state, first_action)
+    # the redraw is deterministic, and backfills make the same one
+    monkeypatch.setattr(challenge_maker_module, "CHALLENGES_DIR", str(tmp_path / "third"))
+    duplicate_index = DuplicateIndex(str(tmp_path / "third"))
+    duplicate_index.add("2025-08-01", 0, first_state, first_action)
+    duplicate_index.close()
+    make_challenges("2025-08-02", "2025-08-02", workers=1)
+    with open(tmp_path / "second" / "2025-08" / "2.json") as second, open(tmp_path / "third" / "2025-08" / "2.json") as third:
+        assert json.load(second) == json.load(third)
+    # unless duplicates are allowed
+    monkeypatch.setattr(challenge_maker_module, "CHALLENGES_DIR", str(tmp_path / "fourth"))
+    duplicate_index = DuplicateIndex(str(tmp_path / "fourth"))
+    duplicate_index.add("2025-08-01", 0, first_state, first_action)
+    duplicate_index.close()
+    challenge_maker = ChallengeMaker(reject_duplicates=False)
+    challenge_maker.make_challenge("2025-08-02")
+    assert (challenge_maker.get_state(), challenge_maker.get_action()) == (first_state, first_action)
+    assert os.path.exists(tmp_path / "fourth" / "duplicates.sqlite")
@@ -0,0 +1,59 @@
+import random
+from collections import Counter
+from divide21x.challenge_maker import state_synthesizer
+from divide21x.challenge_maker.state_synthesizer import random_action, rollout_state, synthesize_state
+from divide21x.simulator.transition_kernel import _game_over, apply_action, state_passes_inspection
+from divide21x.utils.digits import number_length
+
+
+def test_synthesized_states_keep_the_game_invariants():
+    rng = random.Random(7)
+    for _ in range(2000):
+        static_digits = rng.randint(2, 40)
+        players = rng.randint(1, 12)
+        state = synthesize_state(rng, static_digits, players)
+        assert state_passes_inspection(state)
+        max_score = 9*static_digits
+        digits = number_length(state["d"])
+        assert number_length(state["s"]) == static_digits and 1 <= digits <= static_digits
+        assert all(state["s"] % divisor for divisor in range(2, 10))
+        assert not _game_over(state["d"], state["p"], max_score)
+        assert state["p"][state["t"]]["c"] > -max_score
+        assert [player["m"] for player in state["p"]] == [int(i == state["t"]) for i in range(players)]
+        # every rindex can still be changed, never to its current digit
+        number_string = str(state["d"])
+        assert sorted(state["a"]) == list(range(digits))
+        for rindex, digit_list in state["a"].items():
+            assert digit_list and digit_list == sorted(set(digit_list))
+            assert int(number_string[digits-rindex-1]) not in digit_list
+        # no leading zero
+        assert 0 not in state["a"][digits-1]
+        # and the game can be played on from it
+        apply_action(state, random_action(rng, digits))
+
+
+def test_synthesis_is_deterministic_and_targets_the_shape():
+    first = synthesize_state(random.Random(3), 30, 9, digits=25)
+    assert first == synthesize_state(random.Random(3), 30, 9, digits=25)
+    assert number_length(first["s"]) == 30 and number_length(first["d"]) == 25 and len(first["p"]) == 9
+    # thousands of digits and players, without playing a single action
+    huge = synthesize_state(random.Random(3), 6000, 3000)
+    assert number_length(huge["s"]) == 6000 and len(huge["p"]) == 3000
+    assert state_passes_inspection(huge)
+
+
+def test_rollout_reservoir_is_uniform(monkeypatch):
+    # a game that goes on forever, whose states count the actions played
+    monkeypatch.setattr(state_synthesizer, "apply_action", lambda state, action: ({"d": state["d"] + 1}, 1.0, False))
+    rng = random.Random(11)
+    counts = Counter(rollout_state(rng, {"d": 10}, steps=5)["d"] for _ in range(10000))
+    assert sorted(counts) == [11, 12, 13, 14, 15]
+    assert all(1800 < count < 2200 for count in counts.values())
+
+
+def test_rollout_stops_at_the_end_of_the_game():
+    rng = random.Random(5)
+    for _ in range(200):
+        start = synthesize_state(rng, 4, 2)
+        state = rollout_state(rng, start, steps=100)
+        assert state is None or (state_passes_inspection(state) and not _game_over(state["d"], state["p"], 36))
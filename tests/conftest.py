@@ -0,0 +1,45 @@
+import pytest
+import divide21env.inspection.inspector as env_inspector_module
+import divide21x.challenge_maker.challenge_maker as challenge_maker_module
+import divide21x.envs.divide21x_main as main_module
+import divide21x.evaluation.evaluator as evaluator_module
+import divide21x.grading.grader as grader_module
+import divide21x.inspection.inspector as inspector_module
+import divide21x.llm_api.client_class as client_class_module
+import divide21x.llm_api.requestor as requestor_module
+import divide21x.simulator.divide21env_simulator as simulator_module
+
+
+# the modules that save episode logs to a dir of the repo (their BASE_DIR), the base env's inspector included
+LOGGING_MODULES = (
+    challenge_maker_module, main_module, evaluator_module, grader_module, inspector_module, client_class_module,
+    requestor_module, simulator_module, env_inspector_module
+)
+REGISTRY = [{"alias": "right", "provider": "p1"}, {"alias": "wrong", "provider": "p2"}]
+
+
+@pytest.fixture(autouse=True)
+def log_dirs(tmp_path, monkeypatch):
+    '''
+    every test saves its episode logs to tmp_path/logs/<module>, never to the repo
+    '''
+    for module in LOGGING_MODULES:
+        monkeypatch.setattr(module, "BASE_DIR", str(tmp_path / "logs" / module.__name__.rsplit(".", 1)[-1]))
+
+
+@pytest.fixture
+def pipeline_dirs(tmp_path, monkeypatch):
+    '''
+    the challenges, results and leaderboards dirs of the pipeline in tmp_path, with a registry of two models ("right"
+    and "wrong").
+
+    Returns:
+        str: the challenges dir.
+    '''
+    challenges_dir = str(tmp_path / "challenges")
+    monkeypatch.setattr(challenge_maker_module, "CHALLENGES_DIR", challenges_dir)
+    monkeypatch.setattr(evaluator_module, "CHALLENGES_DIR", challenges_dir)
+    monkeypatch.setattr(main_module, "RESULTS_DIR", str(tmp_path / "results"))
+    monkeypatch.setattr(main_module, "LEADERBOARDS_DIR", str(tmp_path / "leaderboards"))
+    monkeypatch.setattr(main_module, "get_llm_registry", lambda: REGISTRY)
+    return challenges_dir
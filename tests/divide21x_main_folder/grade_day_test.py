@@ -0,0 +1,59 @@
+import csv
+import json
+import os
+import sys
+import divide21x.envs.divide21x_main as main_module
+from divide21x.challenge_maker.challenge_maker import make_challenges
+from divide21x.challenge_maker.challenge_store import load_answer
+from divide21x.utils.util import get_challenge_file_name
+
+
+def write_results(tmp_path, challenges_dir):
+    '''
+    "right" answers every challenge of the set, "wrong" only the first one
+    '''
+    for index in range(3):
+        answer = load_answer(challenges_dir, "2025-07-03", index)
+        wrong = answer if index == 0 else {**answer, "d": answer["d"] + 1}
+        with open(tmp_path / "results" / "2025-07" / get_challenge_file_name("2025-07-03", index), "w") as f:
+            json.dump({"right": {"answer": answer}, "wrong": {"answer": wrong}}, f)
+
+
+def test_grade_day_aggregates_the_set(tmp_path, pipeline_dirs, monkeypatch):
+    challenges_dir = pipeline_dirs
+    make_challenges("2025-07-03", "2025-07-03", workers=1, size=3)
+    os.makedirs(tmp_path / "results" / "2025-07")
+    write_results(tmp_path, challenges_dir)
+
+    assert main_module.grade_day("2025-07-03") == 3
+    with open(tmp_path / "leaderboards" / "2025-07" / "3.csv") as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == ["Model", "Provider", "Average Proximity (%)", "Average Score (%)", "Challenges"]
+    assert rows[1] == ["right", "p1", "100.0", "100.0", "3"]
+    assert rows[2][:2] == ["wrong", "p2"] and rows[2][3:] == ["33.33", "3"] and float(rows[2][2]) < 100
+    # every challenge of the set counts in the monthly averages
+    with open(tmp_path / "leaderboards" / "2025-07" / "average_score.csv") as f:
+        assert list(csv.reader(f))[1:] == [["right", "p1", "100.0"], ["wrong", "p2", "33.33"]]
+
+    # grading the answers in chunks over a process pool writes the same files
+    files = [tmp_path / "leaderboards" / "2025-07" / "3.csv", tmp_path / "leaderboards" / "2025-07" / "average_proximity.csv"]
+    files += [tmp_path / "results" / "2025-07" / get_challenge_file_name("2025-07-03", index) for index in range(3)]
+    contents = [file.read_text() for file in files]
+    for file in files:
+        file.unlink()
+    write_results(tmp_path, challenges_dir)
+    assert main_module.grade_day("2025-07-03", workers=2, chunk_size=1) == 3
+    assert [file.read_text() for file in files] == contents
+
+    # the command grades in this process by default, one chunk per results file
+    for file in files:
+        file.unlink()
+    write_results(tmp_path, challenges_dir)
+    chunks = []
+    grade_chunk = main_module._grade_chunk
+    monkeypatch.setattr(main_module, "_grade_chunk", lambda task: chunks.append(task[1]) or grade_chunk(task))
+    monkeypatch.setattr(main_module, "ProcessPoolExecutor", None)
+    monkeypatch.setattr(sys, "argv", ["divide21x_main", "--date", "2025-07-03"])
+    main_module.main()
+    assert chunks == [0, 1, 2]
+    assert [file.read_text() for file in files] == contents
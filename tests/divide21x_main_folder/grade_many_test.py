@@ -0,0 +1,65 @@
+import json
+import os
+import divide21x.envs.divide21x_main as main_module
+import divide21x.evaluation.evaluator as evaluator_module
+from divide21x.envs.divide21x_main import Divide21X, grade_many
+from divide21x.utils.digits import allow_huge_ints
+
+
+def test_grade_many_matches_the_results_file(monkeypatch):
+    with open("./divide21x/results/2025-12/19.json") as f, allow_huge_ints():
+        results = json.load(f)
+    loads = []
+    load_ground_truth_state = main_module.load_ground_truth_state
+    monkeypatch.setattr(main_module, "load_ground_truth_state", lambda *args: loads.append(args) or load_ground_truth_state(*args))
+
+    answers = [value["answer"] for value in results.values()]
+    graded = grade_many(answers + [None, {}], ("2025-12-19", 0))
+    assert graded[:-2] == [(value["proximity"], value["score"]) for value in results.values()]
+    assert graded[-2:] == [(0.0, 0), (0.0, 0)]
+    # the ground truth is loaded once, and the batch writes a single log file
+    assert loads == [("2025-12-19", 0)]
+    [log_file] = os.listdir(main_module.BASE_DIR)
+    with open(os.path.join(main_module.BASE_DIR, log_file)) as f, allow_huge_ints():
+        episode_log = json.load(f)
+    # one entry per answer, each with its own proximity
+    assert len(episode_log) == len(answers) + 2
+    assert [entry["environment"]["proximity"] for entry in episode_log] == [[proximity] for proximity, score in graded]
+    # with no challenge, every answer gets 0
+    assert grade_many(answers[:2], ("2000-01-01", 0)) == [(0.0, 0), (0.0, 0)]
+
+
+def test_grading_is_lazy():
+    divide21x = Divide21X(state={"s": 1})
+    assert not divide21x.state_inspected and not divide21x.evaluated and not os.path.exists(main_module.BASE_DIR)
+    assert not divide21x.state_passed() and divide21x.state_inspected and not divide21x.evaluated
+    divide21x.start()
+    assert divide21x.evaluated and divide21x.get_proximity() == 0
+
+
+def test_grade_many_with_a_rubric_and_actions(monkeypatch):
+    challenge_action = {"v": False, "g": 4, "r": 10}
+
+    class GroundTruth:
+        def __init__(self, state):
+            pass
+
+        def get_action(self):
+            return challenge_action
+
+    def get_rubric(*args):
+        raise AssertionError("the rubric is read from disk")
+
+    # a solver that plays the action of the challenge, and no rubric but the given one
+    monkeypatch.setattr(evaluator_module, "GroundTruth", GroundTruth)
+    monkeypatch.setattr(evaluator_module, "get_rubric", get_rubric)
+    ground_truth_state = evaluator_module.load_ground_truth_state("2025-12-19", 0)
+    rubric = {"state": {"s": 5, "d": 24, "a": 23, "p": 24, "t": 24}, "action": {"v": 50, "g": 25, "r": 25}}
+    actions = [challenge_action, {**challenge_action, "g": 5}]
+    graded = grade_many([ground_truth_state]*2, ("2025-12-19", 0), rubric=rubric, actions=actions)
+    assert len(graded) == 2
+    [log_file] = os.listdir(main_module.BASE_DIR)
+    with open(os.path.join(main_module.BASE_DIR, log_file)) as f, allow_huge_ints():
+        episode_log = json.load(f)
+    # the actions are scored with the given rubric (60 with the default one)
+    assert [entry["action_comparison"]["score"] for entry in episode_log] == [100, 75]
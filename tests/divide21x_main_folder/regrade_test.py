@@ -0,0 +1,93 @@
+import csv
+import json
+import os
+import divide21x.envs.divide21x_main as main_module
+import divide21x.utils.month_archive as month_archive_module
+import divide21x.utils.util as util_module
+from divide21x.challenge_maker.challenge_maker import make_challenges
+from divide21x.challenge_maker.challenge_store import load_answer
+from divide21x.envs.regrade import get_results_files, regrade
+from divide21x.utils.month_archive import pack_month, pack_past_months, read_results, remove_packed_results
+from divide21x.utils.util import get_challenge_file_name, get_rubric, get_rubric_version, set_rubric_version
+
+
+def read_csv(path):
+    with open(path, newline="") as f:
+        return list(csv.reader(f))
+
+
+def grade_month(tmp_path, monkeypatch, challenges_dir):
+    '''
+    a day with a set of 2 challenges and a day with 1, graded by the daily job, and rubrics v1 and v2 (which only
+    scores the player turn)
+    '''
+    os.makedirs(tmp_path / "rubrics")
+    with open("./divide21x/grading/rubrics/v1.json") as f, open(tmp_path / "rubrics" / "v1.json", "w") as v1:
+        v1.write(f.read())
+    with open(tmp_path / "rubrics" / "v2.json", "w") as f:
+        json.dump({"state": {"s": 0, "d": 0, "a": 0, "p": 0, "t": 100}, "action": {"v": 20, "g": 40, "r": 40}}, f)
+    monkeypatch.setattr(util_module, "RUBRICS_DIR", str(tmp_path / "rubrics"))
+    monkeypatch.setattr(util_module, "RUBRIC_FILE", str(tmp_path / "rubric.json"))
+    set_rubric_version("v1")
+
+    make_challenges("2025-07-03", "2025-07-04", workers=1, size=2)
+    os.makedirs(tmp_path / "results" / "2025-07")
+    for date, size in (("2025-07-03", 2), ("2025-07-04", 1)):
+        for index in range(size):
+            answer = load_answer(challenges_dir, date, index)
+            with open(tmp_path / "results" / "2025-07" / get_challenge_file_name(date, index), "w") as f:
+                json.dump({"right": {"answer": answer}, "wrong": {"answer": {**answer, "d": answer["d"] + 1}}}, f)
+        main_module.grade_day(date)
+
+
+def test_regrade_with_a_rubric_version(tmp_path, monkeypatch, pipeline_dirs):
+    grade_month(tmp_path, monkeypatch, pipeline_dirs)
+    leaderboards = tmp_path / "leaderboards" / "2025-07"
+    original = {name: read_csv(leaderboards / name) for name in ("3.csv", "4.csv", "average_proximity.csv")}
+
+    # the rubric the results were graded with gives the same scores and leaderboards
+    assert regrade("2025-07-01", "2025-07-31", "v1", workers=2) == 3
+    with open(tmp_path / "results" / "2025-07" / "3_1.json") as f:
+        for value in json.load(f).values():
+            assert value["rubrics"]["v1"] == {"proximity": value["proximity"], "score": value["score"]}
+    for name, rows in original.items():
+        assert read_csv(leaderboards / "rubric-v1" / name) == rows
+
+    # another version is written next to the originals
+    assert regrade("2025-07-03", "2025-07-04", "v2", workers=1) == 3
+    with open(tmp_path / "results" / "2025-07" / "4.json") as f:
+        wrong = json.load(f)["wrong"]
+    assert wrong["rubrics"]["v2"] == {"proximity": 100.0, "score": 1} and wrong["score"] == 0
+    assert read_csv(leaderboards / "rubric-v2" / "4.csv")[1:] == [["right", "p1", "100.0", "1"], ["wrong", "p2", "100.0", "1"]]
+    assert read_csv(leaderboards / "4.csv") == original["4.csv"]
+    # and replaces them when promoted, and becomes the current rubric
+    assert get_rubric() == get_rubric("v1")
+    regrade("2025-07-04", "2025-07-04", "v2", workers=1, promote=True)
+    assert get_rubric_version() == "v2" and get_rubric() == get_rubric("v2")
+    assert read_csv(leaderboards / "4.csv") == read_csv(leaderboards / "rubric-v2" / "4.csv")
+    assert read_csv(leaderboards / "3.csv") == original["3.csv"]
+
+
+def test_regrade_a_packed_month(tmp_path, monkeypatch, pipeline_dirs):
+    grade_month(tmp_path, monkeypatch, pipeline_dirs)
+    root = str(tmp_path)
+    pack_month("2025-07", root)
+    remove_packed_results("2025-07", root)
+    assert not os.listdir(tmp_path / "results" / "2025-07")
+
+    # the results are found in the archive, and written back when regraded
+    assert [index for index, _ in get_results_files("2025-07-03")] == [0, 1]
+    assert regrade("2025-07-04", "2025-07-04", "v2", workers=1, promote=True) == 1
+    assert read_results("2025-07-04", "wrong", root=root)["rubrics"]["v2"] == {"proximity": 100.0, "score": 1}
+    assert "rubrics" not in read_results("2025-07-03", "wrong", root=root)
+    # the averages of the month still count every challenge
+    assert read_csv(tmp_path / "leaderboards" / "2025-07" / "average_score.csv")[1:] == [["right", "p1", "100.0"], ["wrong", "p2", "33.33"]]
+
+    # the month is packed again, with the results that are only in the archive
+    monkeypatch.setattr(month_archive_module, "get_utc_date", lambda: "2025-08-01")
+    assert pack_past_months(root) == ["2025-07"]
+    assert pack_past_months(root) == []
+    remove_packed_results("2025-07", root)
+    assert not os.listdir(tmp_path / "results" / "2025-07")
+    assert read_results("2025-07-04", "wrong", root=root)["rubrics"]["v2"] == {"proximity": 100.0, "score": 1}
+    assert read_results("2025-07-03", index=1, root=root)["right"]["score"] == 1
@@ -0,0 +1,78 @@
+import io
+import json
+import os
+import divide21x.envs.divide21x_main as main_module
+import divide21x.envs.stream_grader as stream_grader_module
+from divide21x.envs.stream_grader import grade_stream, write_records
+from divide21x.utils.digits import allow_huge_ints
+
+
+def test_stream_matches_the_results_file(monkeypatch):
+    loads = []
+    load_ground_truth_state = stream_grader_module.load_ground_truth_state
+    monkeypatch.setattr(stream_grader_module, "load_ground_truth_state", lambda *args: loads.append(args) or load_ground_truth_state(*args))
+    monkeypatch.setattr(stream_grader_module, "LOG_EVERY", 10)
+    with open("./divide21x/results/2025-12/19.json") as f, allow_huge_ints():
+        results = json.load(f)
+    lines = [json.dumps({"model": alias, "answer": value["answer"], "date": "2025-12-19"}) for alias, value in results.items()]
+    lines.insert(1, "")
+    lines.insert(2, "{not json")
+    lines.insert(3, "[1, 2]")
+    out = io.StringIO()
+    assert write_records(grade_stream(iter(lines)), out) == len(results) + 2
+
+    records = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert records[1]["line"] == 3 and records[1]["error"].startswith("invalid JSON")
+    assert records[2] == {"line": 4, "error": "a submission must be a JSON object"}
+    graded = [records[0]] + records[3:]
+    assert [record["model"] for record in graded] == list(results)
+    for record in graded:
+        assert (record["proximity"], record["score"]) == (results[record["model"]]["proximity"], results[record["model"]]["score"])
+    # the ground truth is loaded once, and the log is saved every 10 records
+    assert loads == [("2025-12-19", 0)]
+    assert len(os.listdir(main_module.BASE_DIR)) == -(-len(results) // 10)
+
+
+def test_stream_is_lazy():
+    consumed = []
+
+    def lines():
+        for k in range(3):
+            consumed.append(k)
+            yield json.dumps({"answer": None, "date": "2025-12-19"})
+
+    records = grade_stream(lines())
+    assert next(records)["proximity"] == 0 and consumed == [0]
+    assert next(records)["score"] == 0 and consumed == [0, 1]
+
+
+def test_bad_records_do_not_end_the_stream(monkeypatch):
+    answer = {"answer": None, "date": "2025-12-19"}
+    lines = [
+        json.dumps({**answer, "date": 12345}),
+        json.dumps({**answer, "date": "not-a-date"}),
+        json.dumps({**answer, "date": "2025-02-30"}),
+        json.dumps({**answer, "index": "0"}),
+        json.dumps({**answer, "date": "2099-01-01"}),
+        json.dumps(answer),
+    ]
+    original_grade = stream_grader_module.SubmissionGrader.grade
+
+    def grade(self, answer, date=None, index=0):
+        if answer == "crash":
+            raise RuntimeError("grading failed")
+        return original_grade(self, answer, date, index)
+
+    monkeypatch.setattr(stream_grader_module.SubmissionGrader, "grade", grade)
+    lines.insert(5, json.dumps({**answer, "answer": "crash"}))
+    records = list(grade_stream(iter(lines)))
+    assert records[:6] == [
+        {"line": 1, "error": "'date' must be a YYYY-MM-DD string"},
+        {"line": 2, "error": "'date' must be a YYYY-MM-DD string"},
+        {"line": 3, "error": "'date' is not a date: 2025-02-30"},
+        {"line": 4, "error": "'index' must be a non-negative integer"},
+        {"line": 5, "error": "no challenge 2099-01-01"},
+        {"line": 6, "error": "grading failed"},
+    ]
+    # the records after them are still graded
+    assert records[6] == {**answer, "proximity": 0.0, "score": 0}
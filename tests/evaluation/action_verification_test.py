@@ -0,0 +1,80 @@
+import random
+import divide21x.evaluation.action_verification as action_verification_module
+from divide21x.evaluation.action_verification import verify_actions
+from divide21x.evaluation.evaluator import Evaluator
+from divide21x.simulator.state_codec import PackedState
+from divide21x.simulator.transition_kernel import apply_action
+from tests.generators import answer_to, random_action, random_state
+
+
+def odd_state(rng, state):
+    '''
+    a state the batch simulator cannot hold as it is (compare_states and the kernel still read some of them)
+    '''
+    kind = rng.randint(0, 3)
+    if kind == 0:
+        state["a"] = {str(key): digits for key, digits in state["a"].items()}
+    elif kind == 1:
+        state["a"].pop(rng.choice(list(state["a"])))
+    elif kind == 2:
+        state["p"][0]["c"] = 10**30
+    else:
+        state["s"] = 0
+    return state
+
+
+def test_verify_actions_matches_compare_states():
+    rng = random.Random(23)
+    evaluator = Evaluator()
+    triples = []
+    expected = []
+    for _ in range(600):
+        state = random_state(rng, strict=True)
+        action = random_action(rng, state) if rng.random() < 0.9 else {"v": rng.choice([2, None]), "g": 10**20, "r": -1}
+        try:
+            truth = apply_action(state, action)[0]
+        except ValueError:
+            truth = random_state(rng, strict=True)
+        if rng.random() < 0.1:
+            state = odd_state(rng, state)
+        generated_state = truth if rng.random() < 0.4 else answer_to(rng, truth)
+        triples.append((state, action, generated_state))
+        try:
+            expected.append(evaluator.compare_states(generated_state, apply_action(state, action)[0]))
+        except (ValueError, IndexError, KeyError, TypeError):
+            expected.append((False, 0.0))
+    # packed states are read like their dictionaries
+    state = random_state(random.Random(1), strict=True)
+    action = {"v": False, "g": 1, "r": 0}
+    triples.append((PackedState.from_state(state), action, PackedState.from_state(apply_action(state, action)[0])))
+    expected.append((True, 100.0))
+
+    equivalent, similarity = verify_actions(triples)
+    assert list(zip(equivalent.tolist(), similarity.tolist())) == expected
+    assert 0 < equivalent.sum() < len(triples)
+    assert verify_actions([])[1].shape == (0,)
+
+
+def test_only_the_rows_that_cannot_be_stepped_fall_back(monkeypatch):
+    rng = random.Random(7)
+    triples = []
+    while len(triples) < 50:
+        state = random_state(rng, strict=True)
+        action = random_action(rng, state)
+        try:
+            triples.append((state, action, apply_action(state, action)[0]))
+        except ValueError:
+            pass
+    # a finished game, which the kernel refuses to step
+    finished = {"s": 50, "d": 35, "a": {0: [1], 1: [0, 2]}, "p": [{"i": 0, "c": -18, "m": 1}, {"i": 1, "c": -18, "m": 0}], "t": 0}
+    triples.insert(10, (finished, {"v": False, "g": 1, "r": 0}, finished))
+    one_at_a_time = []
+    verify_one = action_verification_module._verify_one
+    monkeypatch.setattr(
+        action_verification_module, "_verify_one",
+        lambda state, *args: one_at_a_time.append(state) or verify_one(state, *args)
+    )
+    equivalent, similarity = verify_actions(triples)
+    assert one_at_a_time == [finished]
+    assert (equivalent[10], similarity[10]) == (False, 0.0)
+    assert equivalent.sum() == 50
@@ -0,0 +1,40 @@
+import random
+from divide21x.challenge_maker.state_synthesizer import synthesize_state
+from divide21x.evaluation.batch_comparison import TOTAL, compare_states_batch
+from divide21x.evaluation.evaluator import STATE_FIELDS, Evaluator
+from divide21x.simulator.state_codec import PackedState
+from divide21x.utils.util import get_rubric
+from tests.generators import answer_to
+
+
+def test_batch_matches_compare_states():
+    rng = random.Random(20)
+    rubric = get_rubric()
+    evaluator = Evaluator()
+    for players in (1, 4, 33):
+        truth = synthesize_state(rng, rng.randint(3, 40), players)
+        answers = [answer_to(rng, truth) for _ in range(300)] + [None, {}, {"s": 1}]
+        scores = compare_states_batch(answers, truth)
+        packed_truth = PackedState.from_state(truth)
+        for row, answer in enumerate(answers):
+            if answer is None or set(answer) != set(STATE_FIELDS):
+                assert scores[TOTAL][row] == 0
+                continue
+            assert scores[TOTAL][row] == evaluator.compare_states(answer, truth)[1]
+            packed = Evaluator._pack_state(answer)
+            if packed is not None:
+                field_scores = Evaluator.packed_state_field_scores(packed, packed_truth, rubric)
+            else:
+                field_scores = Evaluator._state_dict_field_scores(answer, truth, rubric)
+            assert [scores[field][row] for field in STATE_FIELDS] == [field_scores[field] for field in STATE_FIELDS]
+        # the truth may be given packed, and the exact answer gets every point
+        assert compare_states_batch([truth], packed_truth)[TOTAL].tolist() == [100.0]
+
+
+def test_batch_of_none_and_rubric_cache():
+    truth = synthesize_state(random.Random(1), 8, 3)
+    assert compare_states_batch([], truth)[TOTAL].shape == (0,)
+    rubric = {"state": {"s": 0, "d": 0, "a": 0, "p": 0, "t": 100}}
+    scores = compare_states_batch([truth, {**truth, "t": truth["t"] + 1}], truth, rubric)
+    assert scores[TOTAL].tolist() == [100.0, 0.0] and scores["t"].tolist() == [100.0, 0.0]
+    assert get_rubric() is get_rubric()
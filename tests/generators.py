@@ -0,0 +1,81 @@
+'''
+random states, actions and answers for the tests (each test seeds its own random.Random)
+'''
+import copy
+import json
+
+
+ODD_VALUES = [None, True, 3.0, 2.5, "3", [], {}, -1, 10, 10**30]
+
+
+def random_state(rng, strict=False):
+    '''
+    a state that passes inspection, but is not necessarily reachable, with between 1 and 12 digits and 1 and 6 players.
+    Some rindexes of 'a' are strings and the leading digit may have 0 available, unless strict is True (the states
+    the batch simulator holds as they are).
+    '''
+    static_number = rng.randint(1, 10**rng.randint(1, 8))
+    dynamic_number = rng.randint(2, 10**rng.randint(1, 12))
+    digits = len(str(dynamic_number))
+    number_of_players = rng.randint(1, 6)
+    score_bound = 9*len(str(static_number)) - 1
+    available = {}
+    for k in range(digits):
+        digit_list = rng.sample(range(1 if strict and k == digits-1 else 0, 10), rng.choice([0, 1, 2, rng.randint(0, 9)]))
+        available[str(k) if not strict and rng.random() < 0.5 else k] = digit_list
+    return {
+        "s": static_number,
+        "d": dynamic_number,
+        "a": available,
+        "p": [{"i": i, "c": rng.randint(-score_bound, score_bound), "m": 0} for i in range(number_of_players)],
+        "t": rng.randint(0, number_of_players-1)
+    }
+
+
+def random_action(rng, state):
+    '''
+    an action on the state, which picks one of the available digits half the time (when the rindex has some)
+    '''
+    division = bool(rng.randint(0, 1))
+    rindex = rng.randint(0, len(str(state["d"])))
+    available_digits = state["a"].get(rindex, [])
+    return {
+        "v": division,
+        "g": rng.choice(available_digits) if available_digits and rng.random() < 0.5 else rng.randint(0, 9),
+        "r": rindex if not division else None
+    }
+
+
+def answer_to(rng, truth):
+    '''
+    an answer close to the truth, with a few mistakes (some of which compare_states only reads as a dictionary)
+    '''
+    answer = json.loads(json.dumps(truth)) if rng.random() < 0.7 else copy.deepcopy(truth)
+    # plain mistakes first, then at most one odd one
+    kinds = [rng.randint(0, 4) for _ in range(rng.randint(0, 4))] + [rng.randint(5, 9)]*(rng.random() < 0.4)
+    for kind in kinds:
+        keys = list(answer["a"])
+        if kind == 0 and keys:
+            answer["a"][rng.choice(keys)] = sorted(rng.sample(range(10), rng.randint(0, 10)), reverse=rng.random() < 0.5)
+        elif kind == 1 and keys:
+            del answer["a"][rng.choice(keys)]
+        elif kind == 2 and answer["p"]:
+            rng.choice(answer["p"])[rng.choice("icm")] += rng.choice([-1, 1])
+        elif kind == 3:
+            rng.shuffle(answer["p"])
+        elif kind == 4:
+            answer[rng.choice("sdt")] += 1
+        elif kind == 5 and keys:
+            # a digit that is not one, or is there twice (compare_states sorts the lists, so only numbers)
+            digit_list = answer["a"][rng.choice(keys)]
+            digit_list.append(rng.choice([True, 3.0, 2.5, -1, 10, 10**30] + (digit_list[:1] or [0])))
+        elif kind == 6 and answer["p"]:
+            rng.choice(answer["p"])[rng.choice("icm")] = rng.choice(ODD_VALUES)
+        elif kind == 7:
+            # a key outside the dynamic number, the same rindex twice, or a key that is not a rindex
+            answer["a"][rng.choice([len(str(answer["d"])), "0" if 0 in answer["a"] else 0, "01", -1, 1.0])] = [1]
+        elif kind == 8:
+            answer["p"].append(rng.choice([{"i": 0, "c": 0, "m": 0}, {"i": 0, "c": 0}, [0, 0, 0], None]))
+        elif kind == 9:
+            answer[rng.choice("sdatp")] = rng.choice(ODD_VALUES)
+    return answer
@@ -0,0 +1,97 @@
+import copy
+import random
+import pytest
+from divide21x.challenge_maker.state_synthesizer import random_action, synthesize_state
+from divide21x.inspection.inspector import Inspector
+from divide21x.inspection.schema_validator import (
+    ACTION, STATE, STATE_ACTION_SCHEMA, SUBMISSION_SCHEMA, SchemaError, compile_validator, generate_source,
+    parse_schema
+)
+
+
+ODD_VALUES = [None, True, False, -1, 0, 1, 2, 9, 10, 3.0, 2.5, "3", [], [1], {}, {"i": 0}, 10**80]
+
+
+def mutate(rng, value):
+    '''
+    a copy of the state or action with a few random mistakes
+    '''
+    value = copy.deepcopy(value)
+    for _ in range(rng.randint(1, 3)):
+        kind = rng.randint(0, 6)
+        if kind == 0 and value:
+            value[rng.choice(list(value))] = rng.choice(ODD_VALUES)
+        elif kind == 1 and value:
+            del value[rng.choice(list(value))]
+        elif kind == 2:
+            value["x"] = 0
+        elif kind == 3 and isinstance(value.get("a"), dict) and value["a"]:
+            digit_list = value["a"][rng.choice(list(value["a"]))]
+            if isinstance(digit_list, list):
+                digit_list.append(rng.choice([digit_list[0] if digit_list else 0, 10, -1, 3.0, True, "1"]))
+        elif kind == 4 and isinstance(value.get("a"), dict) and value["a"]:
+            value["a"][rng.choice(list(value["a"]))] = rng.choice(ODD_VALUES[:12])
+        elif kind == 5 and isinstance(value.get("p"), list) and value["p"]:
+            player = rng.choice(value["p"])
+            if isinstance(player, dict) and player:
+                if rng.random() < 0.2:
+                    del player[rng.choice(list(player))]
+                else:
+                    player[rng.choice(list(player))] = rng.choice(ODD_VALUES + [500, -500, 44, -45])
+        elif kind == 6 and isinstance(value.get("p"), list):
+            value["p"] = rng.choice([[], value["p"] + value["p"], "p"])
+    return value
+
+
+def test_compiled_validator_matches_the_inspector():
+    validator = compile_validator(STATE_ACTION_SCHEMA)
+    rng = random.Random(18)
+    submissions = []
+    for k in range(3000):
+        state = synthesize_state(rng, rng.randint(2, 12), rng.randint(1, 5))
+        action = random_action(rng, len(str(state["d"])))
+        if k % 3:
+            state = mutate(rng, state)
+        if k % 5 == 0:
+            action = mutate(rng, action)
+        submissions.append({"action": action, "state": state})
+    submissions += [{"action": None, "state": None}, {"action": 3, "state": []}, None]
+    results = validator.validate_many(submissions)
+    assert len(results) == len(submissions)
+    for submission, (scores, messages) in zip(submissions, results):
+        inspector = Inspector(
+            action=submission["action"] if submission else None, state=submission["state"] if submission else None
+        )
+        inspector.inspect_action()
+        state = inspector.get_state()
+        players = state.get("p") if isinstance(state, dict) else None
+        if isinstance(players, list) and not all(isinstance(player, dict) for player in players):
+            # the Inspector raises on a player that is not a dictionary, the validator deducts it like wrong keys
+            with pytest.raises(AttributeError):
+                inspector.inspect_state()
+            assert any(message[2].startswith("player must have exactly these keys") for message in messages)
+            continue
+        inspector.inspect_state()
+        assert scores == {ACTION: inspector.get_action_score(), STATE: inspector.get_state_score()}
+        assert (len(messages) == 0) == (scores == {ACTION: 10, STATE: 40})
+
+
+def test_submission_schema_and_cache():
+    validator = compile_validator(SUBMISSION_SCHEMA)
+    assert compile_validator(SUBMISSION_SCHEMA) is validator
+    state = synthesize_state(random.Random(1), 8, 3)
+    assert validator.validate({"o": state}) == ({"o": 40}, [])
+    scores, messages = validator.validate({"o": {**state, "t": 7}})
+    assert scores == {"o": 33} and messages[0][:2] == (STATE, "critical")
+
+
+def test_schemas_that_drift_are_refused():
+    schema = parse_schema('{"state": {"s": int, "d": int, "a": {int: [int, ...]}, "p": [{"i": int, "c": int, "m": int}, ...], "t": int}}')
+    assert schema[1]["state"][1]["a"] == ("map", ("int",), ("list", ("int",)))
+    generate_source(schema)
+    with pytest.raises(SchemaError):
+        generate_source(parse_schema('{"state": {"s": int, "d": int, "a": int, "p": int, "t": int}}'))
+    with pytest.raises(SchemaError):
+        generate_source(parse_schema('{"state": {"s": int, "d": int}}'))
+    with pytest.raises(SchemaError):
+        parse_schema('{"action": {"v": bool}}')
@@ -0,0 +1,82 @@
+import random
+from divide21x.simulator.batch_simulator import Divide21BatchSimulator
+from divide21x.simulator.transition_kernel import apply_action, state_passes_inspection
+from tests.generators import random_action, random_state
+
+
+def test_decode():
+    rng = random.Random(2)
+    states = [random_state(rng, strict=True) for _ in range(50)]
+    batch_simulator = Divide21BatchSimulator(states)
+    assert len(batch_simulator) == 50
+    assert [apply_action(state, {"v": True, "g": 0, "r": None}) for state in batch_simulator.decode()] == \
+        [apply_action(state, {"v": True, "g": 0, "r": None}) for state in states]
+
+
+def test_steps_match_kernel():
+    rng = random.Random(21)
+    states = []
+    while len(states) < 500:
+        state = random_state(rng, strict=True)
+        if state_passes_inspection(state):
+            states.append(state)
+    batch_simulator = Divide21BatchSimulator(states)
+    for _ in range(5):
+        actions = [random_action(rng, state) for state in states]
+        expected = [apply_action(state, action) for state, action in zip(states, actions)]
+        rewards, terminated = batch_simulator.step(actions)
+        assert batch_simulator.decode() == [state for state, reward, done in expected]
+        assert rewards.tolist() == [reward for state, reward, done in expected]
+        assert terminated.tolist() == [done for state, reward, done in expected]
+        # carry on with the games that are not over
+        states = [state for state, reward, done in expected if not done and state_passes_inspection(state)]
+        batch_simulator = Divide21BatchSimulator(states)
+
+
+def test_leading_zero():
+    state = {"s": 50, "d": 35, "a": {0: [1], 1: [0, 2]}, "p": [{"i": 0, "c": 0, "m": 1}], "t": 0}
+    action = {"v": False, "g": 0, "r": 1}
+    batch_simulator = Divide21BatchSimulator([state])
+    rewards, terminated = batch_simulator.step([action])
+    next_state, reward, done = apply_action(state, action)
+    assert batch_simulator.decode() == [next_state]
+    assert rewards.tolist() == [reward]
+    assert terminated.tolist() == [done]
+
+
+def test_rows_that_cannot_be_stepped_do_not_stop_the_batch():
+    # a finished game: both players are out of points, so no one is left to take the turn
+    finished = {"s": 50, "d": 35, "a": {0: [1], 1: [0, 2]}, "p": [{"i": 0, "c": -18, "m": 1}, {"i": 1, "c": -18, "m": 0}], "t": 0}
+    rng = random.Random(4)
+    states = [random_state(rng, strict=True) for _ in range(20)]
+    states = [state for state in states if state_passes_inspection(state)]
+    actions = [random_action(rng, state) for state in states]
+    # a bad division, a digit change and a leading zero (the kernel fallback) on the finished game
+    finished_actions = [{"v": True, "g": 4, "r": None}, {"v": False, "g": 1, "r": 0}, {"v": False, "g": 0, "r": 1}]
+    for finished_action in finished_actions:
+        try:
+            apply_action(finished, finished_action)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("the kernel steps a finished game")
+    batch_simulator = Divide21BatchSimulator(states[:5] + [finished]*3 + states[5:])
+    rewards, terminated = batch_simulator.step(actions[:5] + finished_actions + actions[5:])
+    expected = [apply_action(state, action) for state, action in zip(states, actions)]
+    # the finished games are left as they were, reported terminated with a reward of 0
+    assert batch_simulator.failed.tolist() == [False]*5 + [True]*3 + [False]*(len(states) - 5)
+    decoded = batch_simulator.decode()
+    assert decoded[5:8] == [finished]*3
+    assert rewards[5:8].tolist() == [0, 0, 0] and terminated[5:8].all()
+    # and every other row is stepped like the kernel does
+    others = [n for n in range(len(decoded)) if not 5 <= n < 8]
+    assert [decoded[n] for n in others] == [state for state, reward, done in expected]
+    assert rewards[others].tolist() == [reward for state, reward, done in expected]
+    assert terminated[others].tolist() == [done for state, reward, done in expected]
+
+
+if __name__ == "__main__":
+    test_decode()
+    test_steps_match_kernel()
+    test_leading_zero()
+    test_rows_that_cannot_be_stepped_do_not_stop_the_batch()
@@ -0,0 +1,80 @@
+import copy
+import random
+from divide21x.challenge_maker.state_synthesizer import synthesize_state
+from divide21x.evaluation.evaluator import STATE_FIELDS, Evaluator
+from divide21x.simulator.fingerprint import (
+    ANONYMOUS_PLAYERS, ORDERED_PLAYERS, SORTED_PLAYERS, fingerprint_action, fingerprint_json, fingerprint_pair, fingerprint_results,
+    fingerprint_state
+)
+from divide21x.simulator.state_codec import PackedState
+from divide21x.utils.util import get_rubric
+
+
+def test_fingerprints_are_canonical():
+    rng = random.Random(22)
+    for _ in range(50):
+        state = synthesize_state(rng, rng.randint(3, 30), rng.randint(1, 6))
+        fingerprint = fingerprint_state(state)
+        assert len(fingerprint) == 16 and fingerprint == fingerprint_state(PackedState.from_state(state))
+        # key types, digit list order and player order do not matter
+        same = copy.deepcopy(state)
+        same["a"] = {str(key): digits[::-1] for key, digits in reversed(list(state["a"].items()))}
+        rng.shuffle(same["p"])
+        assert fingerprint_state(same) == fingerprint
+        # the values do
+        for field in ("s", "d", "t"):
+            assert fingerprint_state({**state, field: state[field] + 1}) != fingerprint
+        changed = copy.deepcopy(state)
+        changed["p"][0]["c"] += 1
+        assert fingerprint_state(changed) != fingerprint
+
+        action = {"v": 1, "g": rng.randint(0, 9), "r": rng.choice([None, 0])}
+        assert fingerprint_action(action) == fingerprint_action({**action, "v": True})
+        assert fingerprint_action(action) != fingerprint_action({**action, "v": 0})
+        assert fingerprint_pair(same, {**action, "v": True}) == fingerprint_pair(state, action)
+        assert fingerprint_pair(state, action) not in (fingerprint, fingerprint_action(action))
+    assert fingerprint_state({"s": 1}) is None and fingerprint_pair(None, {}) is None
+
+
+def test_views_of_the_players():
+    state = {"s": 19, "d": 59, "a": {0: [1, 2], 1: [3]}, "p": [{"i": 0, "c": -13, "m": 1}, {"i": 1, "c": 0, "m": 0}], "t": 0}
+    reversed_players = {**state, "p": state["p"][::-1]}
+    # the turn follows its player, with other ids
+    renamed = {**state, "p": [{"i": 5, "c": 0, "m": 0}, {"i": 7, "c": -13, "m": 1}], "t": 1}
+    assert fingerprint_state(reversed_players) == fingerprint_state(state)
+    assert fingerprint_state(reversed_players, players=ORDERED_PLAYERS) != fingerprint_state(state, players=ORDERED_PLAYERS)
+    assert fingerprint_state(renamed, players=ANONYMOUS_PLAYERS) == fingerprint_state(state, players=ANONYMOUS_PLAYERS)
+    assert fingerprint_state(renamed) != fingerprint_state(state)
+    # no two views share a fingerprint
+    action = {"v": True, "g": 3, "r": None}
+    views = (SORTED_PLAYERS, ORDERED_PLAYERS, ANONYMOUS_PLAYERS)
+    fingerprints = {fingerprint_state(state, players=view) for view in views}
+    fingerprints |= {fingerprint_pair(state, action, players=view) for view in views}
+    assert len(fingerprints) == 6
+
+
+def test_exact_match_fast_path():
+    rng = random.Random(3)
+    rubric = get_rubric()
+    for players in (0, 1, 5):
+        state = synthesize_state(rng, 12, max(players, 1))
+        state["p"] = state["p"][:players]
+        shuffled = copy.deepcopy(state)
+        shuffled["p"] = shuffled["p"][::-1]
+        scores = Evaluator.packed_state_field_scores(PackedState.from_state(state), PackedState.from_state(shuffled), rubric)
+        # the same points, in the same order, as scoring each field
+        expected = Evaluator._state_dict_field_scores(state, shuffled, rubric)
+        assert list(scores.items()) == list(expected.items())
+        assert sum(scores.values()) == sum(expected.values())
+    assert list(scores) == list(STATE_FIELDS)
+
+
+def test_results_hash_is_canonical():
+    state = {"s": 19, "d": 59, "a": {0: [1, 2], 1: [3]}, "p": [{"i": 0, "c": -13, "m": 1}, {"i": 1, "c": 0, "m": 0}], "t": 0}
+    same = {"s": 19, "d": 59, "a": {"1": [3], "0": [2, 1]}, "p": state["p"][::-1], "t": 0}
+    results = {"m1": {"answer": state}, "m2": {"answer": "not a state"}, "m3": {"answer": {0: 1, "1": 2}}}
+    reordered = {"m3": {"answer": {"1": 2, 0: 1}}, "m2": {"answer": "not a state"}, "m1": {"answer": same}}
+    assert fingerprint_results("id", results) == fingerprint_results("id", reordered)
+    assert fingerprint_results("id", results) != fingerprint_results("id2", results)
+    assert fingerprint_results("id", results) != fingerprint_results("id", {**results, "m2": {"answer": None}})
+    assert fingerprint_json({"a": [1, 2]}) != fingerprint_json({"a": [2, 1]})
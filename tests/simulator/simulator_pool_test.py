@@ -0,0 +1,58 @@
+import copy
+import random
+from divide21x.evaluation.evaluator import Evaluator
+from divide21x.simulator.simulator_pool import SimulatorPool
+from divide21x.simulator.transition_kernel import apply_action
+from tests.generators import random_action
+
+
+def test_simulators_are_reused_per_shape():
+    simulator_pool = SimulatorPool()
+    with simulator_pool.checkout(3, 2) as divide21env_simulator:
+        first = divide21env_simulator
+    with simulator_pool.checkout(3, 2) as divide21env_simulator:
+        assert divide21env_simulator is first
+        # a second simulator of the same shape while the first one is checked out
+        with simulator_pool.checkout(3, 2) as other_simulator:
+            assert other_simulator is not first
+    with simulator_pool.checkout(4, 2) as divide21env_simulator:
+        assert divide21env_simulator is not first
+    assert simulator_pool.created == 3
+    simulator_pool.close()
+
+
+def test_step_from_state_matches_kernel():
+    rng = random.Random(5)
+    random.seed(5)
+    simulator_pool = SimulatorPool()
+    with simulator_pool.checkout(6, 3) as divide21env_simulator:
+        obs, info = divide21env_simulator.reset()
+        state = divide21env_simulator._decode_state(obs)
+    for _ in range(200):
+        action = random_action(rng, state)
+        state_before = copy.deepcopy(state)
+        next_state, reward, terminated, truncated, info = simulator_pool.step_from_state(state, action)
+        assert state == state_before
+        assert (next_state, reward, terminated) == apply_action(state, action)
+        state = next_state
+        if terminated:
+            with simulator_pool.checkout(6, 3) as divide21env_simulator:
+                obs, info = divide21env_simulator.reset()
+                state = divide21env_simulator._decode_state(obs)
+    assert simulator_pool.created <= 6
+    simulator_pool.close()
+
+
+def test_action_generates_state():
+    state = {"s": 19, "d": 59, "a": {0: [0, 1, 2, 3, 4, 5, 6, 7, 8], 1: [2, 3, 4, 6, 7, 8, 9]}, "p": [{"i": 0, "c": -13, "m": 1}], "t": 0}
+    action = {"v": 0, "g": 2, "r": 1}
+    evaluator = Evaluator(action=action, state=state)
+    states_are_equivalent, states_similarity_score = evaluator.action_generates_state()
+    assert evaluator.generated_state == apply_action(state, action)[0]
+    assert not states_are_equivalent
+
+
+if __name__ == "__main__":
+    test_simulators_are_reused_per_shape()
+    test_step_from_state_matches_kernel()
+    test_action_generates_state()
@@ -0,0 +1,53 @@
+import random
+from concurrent.futures import ThreadPoolExecutor
+from divide21x.simulator.divide21env_simulator import Divide21EnvSimulator
+from divide21x.simulator.transition_kernel import apply_action
+from tests.generators import random_action
+
+
+def test_branching_from_a_snapshot():
+    rng = random.Random(7)
+    random.seed(7)
+    divide21env_simulator = Divide21EnvSimulator(digits=6, players=3, record='off')
+    obs, info = divide21env_simulator.reset()
+    root = divide21env_simulator.snapshot()
+    root_state = divide21env_simulator._decode_state(obs)
+    for _ in range(50):
+        # every branch starts from the same root, whatever the previous branch did
+        obs = divide21env_simulator.restore(root)
+        assert divide21env_simulator._decode_state(obs) == root_state
+        state = root_state
+        for _ in range(10):
+            action = random_action(rng, state)
+            obs, reward, terminated, truncated, info = divide21env_simulator.step(action)
+            expected_state, expected_reward, expected_terminated = apply_action(state, action)
+            state = divide21env_simulator._decode_state(obs)
+            assert (state, reward, terminated) == (expected_state, expected_reward, expected_terminated)
+            if terminated:
+                break
+
+
+def test_snapshots_are_shared_across_threads():
+    random.seed(8)
+    divide21env_simulator = Divide21EnvSimulator(digits=5, players=2, record='off')
+    divide21env_simulator.reset()
+    snapshot = divide21env_simulator.snapshot()
+    action = {"v": 0, "g": 1, "r": 0}
+
+    def branch(_):
+        # a fresh simulator that was never reset can restore the snapshot directly
+        other_simulator = Divide21EnvSimulator(digits=2, players=1, record='off')
+        other_simulator.restore(snapshot)
+        obs, reward, terminated, truncated, info = other_simulator.step(action)
+        return other_simulator._decode_state(obs), reward
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(branch, range(8)))
+    assert all(result == results[0] for result in results)
+    # restoring never mutates the snapshot
+    assert divide21env_simulator.snapshot() == snapshot
+
+
+if __name__ == "__main__":
+    test_branching_from_a_snapshot()
+    test_snapshots_are_shared_across_threads()
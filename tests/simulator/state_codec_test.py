@@ -0,0 +1,96 @@
+import copy
+import random
+import pytest
+from divide21x.evaluation.evaluator import Evaluator
+from divide21x.simulator.batch_simulator import Divide21BatchSimulator
+from divide21x.simulator.divide21env_simulator import Divide21EnvSimulator
+from divide21x.simulator.state_codec import PackedState
+from divide21x.simulator.transition_kernel import apply_action
+from divide21x.utils.util import get_rubric
+from tests.generators import random_action, random_state
+
+
+def test_round_trips():
+    rng = random.Random(4)
+    random.seed(4)
+    divide21env_simulator = Divide21EnvSimulator(record='off')
+    for _ in range(200):
+        obs, info = divide21env_simulator.reset(options={'obs': random_state(rng)})
+        state = divide21env_simulator._decode_state(obs)
+        # dictionary form
+        packed = PackedState.from_state(state)
+        assert packed.to_state() == state
+        # observation form
+        assert PackedState.from_observation(obs) == packed
+        assert divide21env_simulator._decode_state(packed.to_observation()) == state
+        # string keys (as read back from JSON) pack the same way
+        json_state = copy.deepcopy(state)
+        json_state["a"] = {str(k): v[::-1] for k, v in state["a"].items()}
+        assert PackedState.from_state(json_state) == packed
+        assert hash(PackedState.from_state(json_state)) == hash(packed)
+        assert packed.passes_inspection()
+
+
+def test_rejects_unpackable_states():
+    state = {"s": 19, "d": 59, "a": {0: [1, 2], 1: [3]}, "p": [{"i": 0, "c": -13, "m": 1}], "t": 0}
+    PackedState.from_state(state)
+    for key, value in [("s", "19"), ("d", -1), ("a", {0: [1, 1]}), ("a", {2: [1]}), ("a", {"01": [1]}), ("p", [{"i": 0}]), ("t", None)]:
+        with pytest.raises(ValueError):
+            PackedState.from_state({**state, key: value})
+
+
+def test_packed_comparison_matches_dictionary_comparison():
+    rng = random.Random(40)
+    rubric = get_rubric()
+    compared = 0
+    for _ in range(2000):
+        state1 = random_state(rng)
+        state2 = copy.deepcopy(state1) if rng.random() < 0.5 else random_state(rng)
+        # a few edits so that the states are close but not equal
+        if rng.random() < 0.5:
+            state2["d"] = rng.choice([state1["d"], state2["d"] + 1])
+        if rng.random() < 0.5 and state2["p"]:
+            state2["p"][0]["c"] += 1
+        if rng.random() < 0.5:
+            state2["a"].pop(rng.choice(list(state2["a"])))
+        if rng.random() < 0.5:
+            state2["p"] = state2["p"][::-1]
+        packed1 = Evaluator._pack_state(state1)
+        packed2 = Evaluator._pack_state(state2)
+        if packed1 is None or packed2 is None:
+            # e.g. a key of 'a' outside the dynamic number: compared as dictionaries
+            continue
+        compared += 1
+        assert Evaluator.compare_packed_states(packed1, packed2, rubric) == Evaluator._compare_state_dicts(state1, state2, rubric)
+    assert compared > 1000
+
+
+def test_batch_simulator_packed_states():
+    rng = random.Random(44)
+    states = []
+    while len(states) < 300:
+        state = random_state(rng)
+        state["a"] = {k: v or [1] for k, v in state["a"].items()}
+        states.append(state)
+    packed_states = [PackedState.from_state(state) for state in states]
+    batch = Divide21BatchSimulator()
+    batch.load_packed(packed_states)
+    assert batch.decode() == [packed.to_state() for packed in batch.get_packed()]
+    actions = [random_action(rng, state) for state in states]
+    expected = []
+    for state, action in zip(states, actions):
+        try:
+            expected.append(apply_action(state, action)[0])
+        except (ValueError, IndexError):
+            expected.append(None)
+    rows = [n for n, state in enumerate(expected) if state is not None]
+    batch.load_packed([packed_states[n] for n in rows])
+    batch.step([actions[n] for n in rows])
+    assert batch.get_packed() == [PackedState.from_state(expected[n]) for n in rows]
+
+
+if __name__ == "__main__":
+    test_round_trips()
+    test_rejects_unpackable_states()
+    test_packed_comparison_matches_dictionary_comparison()
+    test_batch_simulator_packed_states()
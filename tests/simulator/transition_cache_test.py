@@ -0,0 +1,76 @@
+import copy
+import random
+import pytest
+from divide21x.simulator.state_codec import PackedState
+from divide21x.simulator.transition_cache import TransitionCache, transition_key
+from divide21x.simulator.transition_kernel import apply_action
+from tests.generators import random_action, random_state
+
+
+def test_memory_tier():
+    rng = random.Random(6)
+    transition_cache = TransitionCache(maxsize=1000)
+    pairs = []
+    for _ in range(300):
+        state = random_state(rng)
+        pairs.append((state, random_action(rng, state)))
+    for _ in range(2):
+        for state, action in pairs:
+            try:
+                expected = apply_action(state, action)
+            except (ValueError, IndexError) as e:
+                with pytest.raises(type(e)):
+                    transition_cache.apply_action(state, action)
+                continue
+            next_state, reward, terminated = transition_cache.apply_action(state, action)
+            assert (next_state, reward, terminated) == expected
+            # callers get their own copy
+            next_state["p"].clear()
+    stats = transition_cache.stats()
+    assert stats["hits"] == stats["misses"] > 0
+
+
+def test_keys_are_canonical():
+    state = {"s": 19, "d": 59, "a": {0: [0, 1, 2], 1: [2, 3]}, "p": [{"i": 0, "c": -13, "m": 1}], "t": 0}
+    json_state = copy.deepcopy(state)
+    json_state["a"] = {"1": [3, 2], "0": [2, 1, 0]}
+    assert transition_key(state, {"v": 1, "g": 2, "r": None}) == transition_key(json_state, {"v": True, "g": 2, "r": None})
+    assert transition_key(state, {"v": 1, "g": 2, "r": None}) != transition_key(state, {"v": 1, "g": 2, "r": 0})
+    # states that cannot be packed are not cached
+    assert transition_key({**state, "a": {5: [1]}}, {"v": 1, "g": 2, "r": None}) is None
+
+
+def test_lru_eviction():
+    transition_cache = TransitionCache(maxsize=2)
+    packed = PackedState.from_state({"s": 19, "d": 59, "a": {0: [0], 1: [2]}, "p": [{"i": 0, "c": 0, "m": 1}], "t": 0})
+    for key in (b"a", b"b", b"c"):
+        transition_cache.put(key, packed, 1.0, False)
+    assert transition_cache.get(b"a") is None
+    assert transition_cache.get(b"c") is not None
+
+
+def test_disk_tier(tmp_path):
+    db_path = str(tmp_path / "transitions.sqlite")
+    state = {"s": 19, "d": 59, "a": {0: [0, 1, 2], 1: [2, 3]}, "p": [{"i": 0, "c": -13, "m": 1}], "t": 0}
+    action = {"v": 0, "g": 3, "r": 1}
+    expected = apply_action(state, action)
+
+    writer = TransitionCache(db_path=db_path)
+    assert writer.apply_action(state, action) == expected
+    writer.close()
+    # another process (or a later run) reads it from disk
+    reader = TransitionCache(db_path=db_path)
+    assert reader.apply_action(state, action) == expected
+    assert reader.stats()["disk_hits"] == 1
+    reader.close()
+    # a different divide21env version never sees it
+    upgraded = TransitionCache(db_path=db_path, version="upgraded")
+    assert upgraded.apply_action(state, action) == expected
+    assert upgraded.stats()["misses"] == 1
+    upgraded.close()
+
+
+if __name__ == "__main__":
+    test_memory_tier()
+    test_keys_are_canonical()
+    test_lru_eviction()
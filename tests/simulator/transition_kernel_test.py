@@ -0,0 +1,73 @@
+import copy
+import random
+from divide21x.challenge_maker.challenge_maker import ChallengeMaker
+from divide21x.simulator.divide21env_simulator import Divide21EnvSimulator
+from divide21x.simulator.transition_kernel import apply_action
+from tests.generators import random_action, random_state
+
+
+def env_apply_action(divide21env_simulator, state, action):
+    '''
+    applies the action through the base env: manual reset -> step -> decode
+    '''
+    divide21env_simulator.reset(options={'obs': copy.deepcopy(state)})
+    obs, reward, terminated, truncated, info = divide21env_simulator.base_env.step(copy.deepcopy(action))
+    return divide21env_simulator._decode_state(obs), reward, terminated
+
+
+def test_examples():
+    challenge_maker = ChallengeMaker()
+    examples = [
+        (challenge_maker.digit_change_example_1_state_1, challenge_maker.digit_change_example_1_action, challenge_maker.digit_change_example_1_state_2),
+        (challenge_maker.digit_change_example_2_state_1, challenge_maker.digit_change_example_2_action, challenge_maker.digit_change_example_2_state_2),
+        (challenge_maker.good_division_example_state_1, challenge_maker.good_division_example_action, challenge_maker.good_division_example_state_2),
+        (challenge_maker.bad_division_example_state_1, challenge_maker.bad_division_example_action, challenge_maker.bad_division_example_state_2),
+    ]
+    for state, action, expected_state in examples:
+        state_before = copy.deepcopy(state)
+        next_state, reward, terminated = apply_action(state, action)
+        assert next_state == expected_state
+        # the given state is never mutated
+        assert state == state_before
+
+
+def test_rollouts_match_base_env():
+    rng = random.Random(21)
+    # the base env draws its numbers from the global random module
+    random.seed(21)
+    for _ in range(100):
+        digits = rng.randint(2, 12)
+        divide21env_simulator = Divide21EnvSimulator(digits=digits, players=rng.randint(1, digits))
+        obs, info = divide21env_simulator.reset(seed=rng.randint(0, 10**8))
+        state = divide21env_simulator._decode_state(obs)
+        for _ in range(30):
+            action = random_action(rng, state)
+            expected = env_apply_action(divide21env_simulator, state, action)
+            assert apply_action(state, action) == expected
+            state, reward, terminated = expected
+            if terminated:
+                break
+
+
+def test_random_states_match_base_env():
+    rng = random.Random(12)
+    divide21env_simulator = Divide21EnvSimulator()
+    for _ in range(2000):
+        state = random_state(rng)
+        action = random_action(rng, state)
+        try:
+            expected = env_apply_action(divide21env_simulator, state, action)
+        except Exception as e:
+            # the base env fails on some inconsistent states, so must the kernel
+            try:
+                apply_action(state, action)
+            except type(e):
+                continue
+            assert False, f"Expected {type(e).__name__} for {state} and {action}"
+        assert apply_action(state, action) == expected
+
+
+if __name__ == "__main__":
+    test_examples()
+    test_rollouts_match_base_env()
+    test_random_states_match_base_env()
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+from divide21x.simulator.transition_kernel import apply_action
+from divide21x.simulator.vector_env import Divide21FixedShapeEnv, decode_observations, make_vector_env, sample_actions
+
+
+def to_action(actions, n):
+    division = bool(actions["v"][n])
+    return {"v": division, "g": int(actions["g"][n]), "r": int(actions["r"][n]) if not division else None}
+
+
+def test_rollouts_match_kernel():
+    num_envs, digits = 4, 6
+    vector_env = make_vector_env(num_envs, digits=digits, players=3)
+    rng = np.random.default_rng(8)
+    obs, info = vector_env.reset(seed=8)
+    states = decode_observations(obs)
+    resetting = np.zeros(num_envs, dtype=bool)
+    for _ in range(200):
+        actions = sample_actions(rng, num_envs, digits)
+        obs, rewards, terminated, truncated, info = vector_env.step(actions)
+        next_states = decode_observations(obs)
+        for n in range(num_envs):
+            # autoreset: the step after the last one of an episode resets the env
+            if not resetting[n]:
+                expected_state, expected_reward, expected_terminated = apply_action(states[n], to_action(actions, n))
+                assert (next_states[n], rewards[n], terminated[n]) == (expected_state, expected_reward, expected_terminated)
+        states = next_states
+        resetting = terminated | truncated
+    vector_env.close()
+
+
+def test_seeding_is_per_env():
+    def first_states(num_envs, asynchronous=False):
+        vector_env = make_vector_env(num_envs, digits=5, players=2, asynchronous=asynchronous)
+        obs, info = vector_env.reset(seed=21)
+        vector_env.close()
+        return decode_observations(obs)
+
+    states = first_states(3)
+    # env k is seeded with seed + k: the same states, whatever the number of envs or processes
+    assert first_states(1) == states[:1]
+    assert first_states(3) == states
+    assert first_states(2, asynchronous=True) == states[:2]
+    assert states[0] != states[1]
+
+
+def test_reset_from_a_state_that_does_not_fit():
+    env = Divide21FixedShapeEnv(digits=2, players=1)
+    every_digit = list(range(10))
+    state = {"s": 1234, "d": 56, "a": {0: every_digit, 1: every_digit}, "p": [{"i": 0, "c": 0, "m": 1}], "t": 0}
+    # a state of the fixed shape, left-padded
+    obs, info = env.reset(options={"obs": {**state, "s": 12}})
+    assert obs["s"].tolist() == [1, 2] and obs["d"].tolist() == [5, 6]
+    with pytest.raises(ValueError, match="4 digits"):
+        env.reset(options={"obs": state})
+    with pytest.raises(ValueError, match="2 players"):
+        env.reset(options={"obs": {**state, "s": 12, "p": [{"i": 0, "c": 0, "m": 1}, {"i": 1, "c": 0, "m": 0}]}})
+    env.close()
+
+
+if __name__ == "__main__":
+    test_rollouts_match_kernel()
+    test_seeding_is_per_env()
+    test_reset_from_a_state_that_does_not_fit()
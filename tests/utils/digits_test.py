@@ -0,0 +1,102 @@
+import copy
+import json
+import random
+import sys
+import threading
+from divide21x.inspection.inspector import Inspector
+from divide21x.simulator.divide21env_simulator import Divide21EnvSimulator
+from divide21x.simulator.state_codec import PackedState
+from divide21x.simulator.transition_kernel import apply_action
+from divide21x.utils.digits import allow_huge_ints, digits_to_int, int_to_digits, int_to_string, number_length, string_to_int
+
+
+def random_digits(rng, length):
+    return str(rng.randint(1, 9)) + "".join(rng.choice("0123456789") for _ in range(length - 1))
+
+
+def test_conversions():
+    rng = random.Random(9)
+    for length in [1, 2, 17, 18, 19, 999, 4000, 4001, 4300, 4301, 12345, 200000]:
+        number_string = random_digits(rng, length)
+        number = string_to_int(number_string)
+        with allow_huge_ints():
+            assert number == int(number_string)
+        assert number_length(number) == length
+        assert int_to_string(number) == number_string
+        assert digits_to_int(int_to_digits(number)) == number
+    for number in [0, 9, 10, 10**4000 - 1, 10**4000, 10**10000 - 1, 10**10000]:
+        with allow_huge_ints():
+            assert number_length(number) == len(str(number))
+    # same as len(str(.)) for anything else
+    assert [number_length(x) for x in (True, None, -12, "abc")] == [4, 4, 3, 3]
+    # the digit limit is put back
+    if hasattr(sys, "get_int_max_str_digits"):
+        limit = sys.get_int_max_str_digits()
+        with allow_huge_ints():
+            pass
+        assert sys.get_int_max_str_digits() == limit
+
+
+def test_allow_huge_ints_across_threads():
+    if not hasattr(sys, "get_int_max_str_digits"):
+        return
+    limit = sys.get_int_max_str_digits()
+    entered, second_entered, first_left, limits = threading.Event(), threading.Event(), threading.Event(), []
+
+    def first():
+        with allow_huge_ints():
+            entered.set()
+            second_entered.wait()
+        first_left.set()
+
+    def second():
+        entered.wait()
+        with allow_huge_ints():
+            second_entered.set()
+            first_left.wait()
+            # the first thread left its block, this one is still inside its own
+            limits.append(sys.get_int_max_str_digits())
+            number_string = "7"*5000
+            assert int_to_string(int(number_string)) == number_string
+
+    threads = [threading.Thread(target=second), threading.Thread(target=first)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert limits == [0] and sys.get_int_max_str_digits() == limit
+
+
+def test_huge_state_pipeline():
+    rng = random.Random(10)
+    number_string = random_digits(rng, 10000)
+    dynamic_number = string_to_int(number_string)
+    state = {
+        "s": dynamic_number,
+        "d": dynamic_number,
+        "a": {k: sorted(rng.sample(range(10), 3)) for k in range(10000)},
+        "p": [{"i": 0, "c": 0, "m": 1}, {"i": 1, "c": -5, "m": 0}],
+        "t": 0
+    }
+    # inspector bounds
+    inspector = Inspector(state=state)
+    inspector.inspect_state()
+    assert inspector.state_passed()
+    # kernel vs env
+    divide21env_simulator = Divide21EnvSimulator(record='off')
+    for action in [{"v": 1, "g": 2, "r": None}, {"v": 0, "g": state["a"][5][0], "r": 5}]:
+        next_state, reward, terminated = apply_action(state, action)
+        obs, info = divide21env_simulator.reset(options={'obs': copy.deepcopy(state)})
+        obs, env_reward, env_terminated, truncated, info = divide21env_simulator.step(action)
+        assert divide21env_simulator._decode_state(obs) == next_state
+        assert (env_reward, env_terminated) == (reward, terminated)
+    # packed form and JSON I/O
+    assert PackedState.from_state(state).to_state() == state
+    with allow_huge_ints():
+        assert json.loads(json.dumps(state))["d"] == dynamic_number
+
+
+if __name__ == "__main__":
+    test_conversions()
+    test_allow_huge_ints_across_threads()
+    test_huge_state_pipeline()
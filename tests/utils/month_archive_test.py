@@ -0,0 +1,64 @@
+import json
+import os
+import shutil
+import divide21x.utils.month_archive as month_archive_module
+from divide21x.utils.month_archive import (
+    MonthArchive, get_archive_path, open_archive, pack_month, pack_past_months, read_challenge, read_leaderboard,
+    read_results, remove_packed_results
+)
+
+
+ROOT_DIR = './divide21x'
+
+
+def copy_month(root, year_month):
+    for directory in ("challenges", "results", "leaderboards"):
+        shutil.copytree(os.path.join(ROOT_DIR, directory, year_month), root / directory / year_month)
+
+
+def test_archive_reads_back_the_loose_files(tmp_path):
+    copy_month(tmp_path, "2025-11")
+    root = str(tmp_path)
+    # before packing, the readers read the loose files
+    with open(tmp_path / "results" / "2025-11" / "20.json") as f:
+        results = json.load(f)
+    assert read_results("2025-11-20", root=root) == results
+    assert open_archive(get_archive_path("2025-11", root)) is None
+
+    path = pack_month("2025-11", root)
+    assert pack_month("2025-10", root) is None
+    with MonthArchive(path) as archive:
+        assert archive.challenge_ids() == [f"2025-11-{day}" for day in range(19, 31)]
+        for day in range(19, 31):
+            date = f"2025-11-{day}"
+            with open(tmp_path / "challenges" / "2025-11" / f"{day}.json") as f:
+                assert json.loads(json.dumps(archive.challenge(date))) == json.load(f)
+            with open(tmp_path / "results" / "2025-11" / f"{day}.json") as f:
+                results = json.load(f)
+            assert archive.results(date) == results and archive.models(date) == list(results)
+            # any (date, model) on its own
+            for alias, entry in results.items():
+                assert archive.result(date, alias) == entry
+            with open(tmp_path / "leaderboards" / "2025-11" / f"{day}.csv", newline="") as f:
+                assert archive.leaderboard(f"{day}.csv") == f.read()
+        assert archive.challenge("2025-11-18") is None and archive.result("2025-11-19", "unknown") is None
+
+    # the loose results can go, the readers now read the archive
+    assert remove_packed_results("2025-11", root) == 12 + 14
+    assert not os.listdir(tmp_path / "results" / "2025-11")
+    alias = next(iter(results))
+    assert read_results("2025-11-30", alias, root=root) == results[alias]
+    with open(tmp_path / "challenges" / "2025-11" / "30.json") as f:
+        assert json.loads(json.dumps(read_challenge("2025-11-30", root=root))) == json.load(f)
+    assert read_leaderboard("2025-11", "average_score.csv", root=root).startswith("Model,Provider")
+
+
+def test_only_past_months_are_packed(tmp_path, monkeypatch):
+    copy_month(tmp_path, "2025-11")
+    copy_month(tmp_path, "2025-12")
+    monkeypatch.setattr(month_archive_module, "get_utc_date", lambda: "2025-12-19")
+    assert pack_past_months(str(tmp_path)) == ["2025-11"]
+    assert pack_past_months(str(tmp_path)) == []
+    # the current month is read from its loose files
+    with open(tmp_path / "results" / "2025-12" / "19.json") as f:
+        assert read_results("2025-12-19", root=str(tmp_path)) == json.load(f)
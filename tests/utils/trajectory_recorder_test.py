@@ -0,0 +1,93 @@
+import random
+from divide21x.simulator.divide21env_simulator import Divide21EnvSimulator
+from divide21x.utils.trajectory_recorder import (
+    GrowableArray, RECORD_ACTIONS, RECORD_OFF, RECORD_STATES, get_observations, load_episode
+)
+
+
+def play(divide21env_simulator, rng, steps=50):
+    '''
+    plays random actions, and returns the decoded observations (the one from reset first)
+    '''
+    obs, info = divide21env_simulator.reset(seed=rng.randint(0, 10**8))
+    decoded_observations = [divide21env_simulator._decode_state(obs)]
+    for _ in range(steps):
+        division = bool(rng.randint(0, 1))
+        action = {
+            "v": division,
+            "g": rng.randint(2, 9),
+            "r": rng.randint(0, len(str(decoded_observations[-1]["d"]))-1) if not division else None
+        }
+        obs, reward, terminated, truncated, info = divide21env_simulator.step(action)
+        decoded_observations.append(divide21env_simulator._decode_state(obs))
+        if terminated:
+            break
+    return decoded_observations
+
+
+def test_growable_array():
+    array = GrowableArray(int, capacity=1)
+    for i in range(100):
+        array.append(i)
+    array.extend(range(100, 250))
+    assert array.array().tolist() == list(range(250))
+
+
+def test_states_in_memory():
+    rng = random.Random(3)
+    random.seed(3)
+    divide21env_simulator = Divide21EnvSimulator(digits=8, players=3, record=RECORD_STATES, record_dir=None)
+    decoded_observations = play(divide21env_simulator, rng)
+    divide21env_simulator.close()
+    episode = divide21env_simulator.recorder.episodes[-1]
+    assert len(episode["v"]) == len(decoded_observations) - 1
+    assert [divide21env_simulator._decode_state(obs) for obs in get_observations(episode)] == decoded_observations
+
+
+def test_states_on_disk(tmp_path):
+    rng = random.Random(4)
+    random.seed(4)
+    divide21env_simulator = Divide21EnvSimulator(digits=5, players=2, record=RECORD_STATES, record_dir=str(tmp_path))
+    decoded_observations = play(divide21env_simulator, rng)
+    # starting a new episode flushes the previous one
+    divide21env_simulator.reset(seed=0)
+    files = list(tmp_path.glob("*.npz"))
+    assert len(files) == 1
+    episode = load_episode(files[0])
+    assert [divide21env_simulator._decode_state(obs) for obs in get_observations(episode)] == decoded_observations
+
+
+def test_levels(tmp_path):
+    rng = random.Random(5)
+    divide21env_simulator = Divide21EnvSimulator(digits=4, players=2, record=RECORD_ACTIONS, record_dir=None)
+    decoded_observations = play(divide21env_simulator, rng)
+    divide21env_simulator.close()
+    episode = divide21env_simulator.recorder.episodes[-1]
+    assert set(episode.keys()) == {"v", "g", "r", "reward", "terminated", "truncated"}
+    assert len(episode["reward"]) == len(decoded_observations) - 1
+
+    divide21env_simulator = Divide21EnvSimulator(digits=4, players=2, record=RECORD_OFF, record_dir=str(tmp_path / "off"))
+    play(divide21env_simulator, rng)
+    divide21env_simulator.close()
+    assert divide21env_simulator.recorder.episodes == []
+    assert not (tmp_path / "off").exists()
+    # nothing is recorded by default
+    assert Divide21EnvSimulator().recorder.level == RECORD_OFF
+
+
+def test_recorders_sharing_a_dir(tmp_path):
+    rng = random.Random(6)
+    divide21env_simulators = [
+        Divide21EnvSimulator(digits=4, players=2, record=RECORD_ACTIONS, record_dir=str(tmp_path)) for _ in range(2)
+    ]
+    for divide21env_simulator in divide21env_simulators:
+        play(divide21env_simulator, rng)
+    # flushed together, the first episode of each recorder still gets its own file
+    with divide21env_simulators[0], divide21env_simulators[1]:
+        pass
+    assert len(list(tmp_path.glob("episode_0_*.npz"))) == 2
+
+
+if __name__ == "__main__":
+    test_growable_array()
+    test_states_in_memory()